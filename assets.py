@@ -0,0 +1,70 @@
+import streamlit as st #type: ignore
+from PIL import Image #type: ignore
+
+import base64
+import functools
+import hashlib
+import io
+import os
+
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Streamlit serves <main script dir>/static at app/static/ when
+# server.enableStaticServing is on (see .streamlit/config.toml)
+STATIC_DIR = os.path.join(APP_DIR, 'static')
+
+BACKGROUND_SOURCE = os.path.join(APP_DIR, 'bg.png')
+BACKGROUND_MAX_WIDTH = int(os.environ.get('VITAL_BG_MAX_WIDTH', '1600'))
+BACKGROUND_QUALITY = int(os.environ.get('VITAL_BG_QUALITY', '70'))
+
+
+@functools.lru_cache(maxsize=None)
+def encode_background():
+    """Resize and recompress the login background once per process; returns (bytes, digest)"""
+    with Image.open(BACKGROUND_SOURCE) as image:
+        image = image.convert('RGB')
+        if image.width > BACKGROUND_MAX_WIDTH:
+            height = round(image.height * BACKGROUND_MAX_WIDTH / image.width)
+            image = image.resize((BACKGROUND_MAX_WIDTH, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, 'WEBP', quality=BACKGROUND_QUALITY, method=6)
+    data = buffer.getvalue()
+    return data, hashlib.sha256(data).hexdigest()[:16]
+
+def publish_static(name, data):
+    """Write an asset into the static folder (once) and return its app URL"""
+    path = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    return f"app/static/{name}"
+
+@functools.lru_cache(maxsize=None)
+def background_url():
+    """URL for the login background: a cacheable static file when possible, else a data URI"""
+    data, digest = encode_background()
+    if st.get_option('server.enableStaticServing'):
+        try:
+            # Content-hashed name, so a changed image never hits a stale browser cache
+            return publish_static(f"login-bg.{digest}.webp", data)
+        except OSError:
+            pass
+    return "data:image/webp;base64," + base64.b64encode(data).decode()
+
+def login_background_css():
+    """CSS rule that puts the background behind the login/signup pages, or None if the image is missing"""
+    try:
+        url = background_url()
+    except FileNotFoundError:
+        return None
+    return f"""
+        <style>
+        .stApp {{
+            background: url("{url}") no-repeat center center fixed;
+            background-size: 100% auto;
+        }}
+        </style>
+    """
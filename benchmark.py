@@ -0,0 +1,258 @@
+"""Latency benchmarks for the data-access functions and page renders.
+
+    python benchmark.py --scales 1k 100k --iterations 50
+    python benchmark.py --compare benchmark-results/old.json benchmark-results/new.json
+
+Each scale gets its own database (<name>_bench_<scale> on MySQL, a
+<file>_bench_<scale>.sqlite3 file on SQLite), migrated and seeded on
+first use and reused afterwards. Rows scanned are only reported on MySQL. Results are written as JSON
+so runs from different commits can be compared.
+"""
+import numpy as np #type: ignore
+from streamlit.testing.v1 import AppTest #type: ignore
+
+import argparse
+import json
+import os
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+
+import db
+import migrations
+import seed
+from cache import vitals_cache
+
+
+# Scale -> (users, daily readings per user)
+SCALES = {
+    '1k': (1, 1000),
+    '100k': (100, 1000),
+    '10m': (10000, 1000),
+}
+
+RESULTS_DIR = 'benchmark-results'
+
+PAGES = {
+    'dashboard_main': ("import dashboard\ndashboard.dashboard_main()", {}),
+    'heart_results_tab': ("import heart\nheart.run_heart_page()", {'heart_tab': 'Results'}),
+    'heart_history_tab': ("import heart\nheart.run_heart_page()", {'heart_tab': 'History'}),
+    'heart_diagnosis_tab': ("import heart\nheart.run_heart_page()", {'heart_tab': 'Diagnosis'}),
+    'run_med_page': ("import medications\nmedications.run_med_page()", {}),
+}
+
+
+def data_functions(user_id, email):
+    """Data-access calls to time, by name"""
+    import dashboard
+    import heart
+    import login
+    import medications
+    import reminders
+    from vital_series import load_vital_series
+
+    today = date.today()
+    return {
+        'get_user_profile': lambda: dashboard.get_user_profile(user_id),
+        'get_latest_vital_results': lambda: dashboard.get_latest_vital_results(user_id),
+        'get_bp_history_7d': lambda: dashboard.get_bp_history(user_id, 7),
+        'get_bp_history_365d': lambda: dashboard.get_bp_history(user_id, 365),
+        'get_latest_heart_results': lambda: heart.get_latest_heart_results(user_id),
+        'get_vital_history_page': lambda: heart.get_vital_history_page(user_id),
+        'load_vital_series_365d': lambda: load_vital_series(user_id, today - timedelta(days=365)),
+        'get_vital_trend_1y': lambda: dashboard.get_vital_trend(user_id, 365),
+        'get_vital_trend_all': lambda: dashboard.get_vital_trend(user_id, None),
+        'get_medications': lambda: medications.get_medications(user_id),
+        'upcoming_doses': lambda: reminders.upcoming_doses(user_id),
+        'login_user': lambda: login.login_user(email, "password"),
+    }
+
+
+class RowsScanned:
+    """Reads InnoDB's global rows-read counter over a connection outside the pool"""
+
+    def __init__(self):
+        self._connection = db.get_backend().connect()
+
+    def read(self):
+        cursor = self._connection.cursor()
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Innodb_rows_read'")
+        value = int(cursor.fetchone()[1])
+        cursor.close()
+        return value
+
+    def close(self):
+        self._connection.close()
+
+
+def use_scale_database(base, scale):
+    """Point the pool at the scale's own database, creating it if needed"""
+    if db.get_backend().name == 'mysql':
+        import mysql.connector #type: ignore
+        database = f"{base}_bench_{scale}"
+        server_config = {k: v for k, v in db.DB_CONFIG.items() if k != 'database'}
+        server = mysql.connector.connect(**server_config)
+        server.cursor().execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+        server.close()
+        db.configure(database=database)
+    else:
+        db.configure(sqlite_path=f"{os.path.splitext(base)[0]}_bench_{scale}.sqlite3")
+
+def prepare_scale(base, scale):
+    """Create, migrate and seed the database for a scale; returns (user_id, email) to benchmark"""
+    users, days = SCALES[scale]
+    use_scale_database(base, scale)
+    connection = db.connect()
+    try:
+        migrations.run_migrations(connection)
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM vital_results")
+        existing = cursor.fetchone()[0]
+        cursor.close()
+        if existing < users * days:
+            print(f"[{scale}] seeding {users} users x {days} days ...")
+            rng = np.random.default_rng(42)
+            user_ids = seed.seed_users(connection, rng, users, 5000)
+            seed.seed_vitals(connection, rng, user_ids, days, 20000)
+            seed.seed_medications(connection, rng, user_ids, 3, 5000)
+
+        cursor = connection.cursor()
+        cursor.execute("SELECT id, email FROM users WHERE email LIKE 'seed-%' ORDER BY id LIMIT 1")
+        user_id, email = cursor.fetchone()
+        cursor.close()
+    finally:
+        connection.close()
+    return user_id, email
+
+def summarize(latencies, queries, rows_fetched, rows_scanned):
+    latencies = np.asarray(latencies) * 1000
+    p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99])
+    return {
+        'iterations': len(latencies),
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(p50),
+        'p90_ms': float(p90),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(latencies.max()),
+        'queries_per_call': float(np.mean(queries)),
+        'rows_fetched_per_call': float(np.mean(rows_fetched)),
+        'rows_scanned_per_call': float(np.mean(rows_scanned)) if rows_scanned else None,
+    }
+
+def measure(call, iterations, rows_counter, warm=False):
+    """Time a call, counting the queries it issues and the rows it touches"""
+    latencies, queries, rows_fetched, rows_scanned = [], [], [], []
+    if warm:
+        call()
+    for _ in range(iterations):
+        if not warm:
+            vitals_cache.clear()
+        before = db.query_stats.snapshot()
+        scanned_before = rows_counter.read() if rows_counter else None
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+        if rows_counter:
+            rows_scanned.append(rows_counter.read() - scanned_before)
+        after = db.query_stats.snapshot()
+        queries.append(after['queries'] - before['queries'])
+        rows_fetched.append(after['rows_fetched'] - before['rows_fetched'])
+    return summarize(latencies, queries, rows_fetched, rows_scanned)
+
+def page_call(script, state, user_id):
+    """Render one page through AppTest as a logged-in user"""
+    def render():
+        app = AppTest.from_string(script, default_timeout=60)
+        app.session_state.logged_in = True
+        app.session_state.user_id = user_id
+        app.session_state.username = "Benchmark"
+        for key, value in state.items():
+            app.session_state[key] = value
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+        # Pages report most failures with st.error, and a failed page renders fast
+        if app.error:
+            raise RuntimeError(f"{script!r} showed an error: {app.error[0].value}")
+    return render
+
+def run_scale(scale, user_id, email, iterations, rows_counter):
+    results = {}
+    for name, call in data_functions(user_id, email).items():
+        results[name] = measure(call, iterations, rows_counter)
+        print(f"[{scale}] {name:<26} p50 {results[name]['p50_ms']:8.2f} ms  "
+              f"p95 {results[name]['p95_ms']:8.2f} ms  {results[name]['queries_per_call']:.1f} queries")
+
+    for name, (script, state) in PAGES.items():
+        for warm in (False, True):
+            key = f"page:{name}:{'warm' if warm else 'cold'}"
+            results[key] = measure(page_call(script, state, user_id), iterations, rows_counter, warm=warm)
+            print(f"[{scale}] {key:<26} p50 {results[key]['p50_ms']:8.2f} ms  "
+                  f"p95 {results[key]['p95_ms']:8.2f} ms  {results[key]['queries_per_call']:.1f} queries")
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(old_path, new_path):
+    """Print p50 and query-count changes between two result files"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    for scale, results in new['results'].items():
+        for name, stats in results.items():
+            before = old['results'].get(scale, {}).get(name)
+            if not before:
+                continue
+            change = (stats['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+            print(f"[{scale}] {name:<34} p50 {before['p50_ms']:8.2f} -> {stats['p50_ms']:8.2f} ms "
+                  f"({change:+6.1f}%)  queries {before['queries_per_call']:.1f} -> {stats['queries_per_call']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data-access functions and page renders")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=['1k', '100k'])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--output", help=f"result file (default {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # Pages load images by relative path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    base = db.DB_CONFIG['database'] if db.get_backend().name == 'mysql' else db.SQLITE_PATH
+    report = {
+        'commit': git_commit(),
+        'backend': db.get_backend().name,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'iterations': args.iterations,
+        'results': {},
+    }
+    for scale in args.scales:
+        user_id, email = prepare_scale(base, scale)
+        rows_counter = RowsScanned() if db.get_backend().name == 'mysql' else None
+        try:
+            report['results'][scale] = run_scale(scale, user_id, email, args.iterations, rows_counter)
+        finally:
+            if rows_counter:
+                rows_counter.close()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
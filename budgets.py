@@ -0,0 +1,186 @@
+"""Per-run query budgets for every page.
+
+    python budgets.py                        # ceilings from budgets.toml
+    python budgets.py --config other.toml
+
+Renders each page through Streamlit's AppTest against a throwaway SQLite
+database holding one seeded account, and compares what metrics recorded
+for every run of the page with its ceilings. Exits non-zero when a run
+goes over, a page has no budget, or a page fails to render (raises, shows
+an error, or lacks its landmarks), so a change that adds a query to a
+page, or a query per row, fails here before it ships.
+
+Pages render with the query cache cleared, in a process that has already
+migrated and loaded the reminder schedule: the cost of a user's first view
+of a page, not of process start-up.
+"""
+import numpy as np #type: ignore
+from streamlit.testing.v1 import AppTest #type: ignore
+
+import argparse
+import os
+import sys
+import tempfile
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib #type: ignore
+
+import db
+import metrics
+import migrations
+import seed
+from cache import vitals_cache
+from reminders import reminder_scheduler
+
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'budgets.toml')
+# What the seeded account holds; more than a page shows, so per-row queries add up
+BUDGET_DAYS = 90
+BUDGET_MEDICATIONS = 15
+LIMITS = ('queries', 'connections', 'rows_fetched', 'bytes_fetched')
+
+SCRIPT = "import login\nlogin.main()"
+
+# Page -> session state it renders with; logged-in pages also get the account
+PAGES = {
+    'login': {'logged_in': False, 'current_page': 'login'},
+    'signup': {'logged_in': False, 'current_page': 'signup'},
+    'dashboard': {'dashboard_page': 'Dashboard'},
+    'heart_results': {'dashboard_page': 'Heart', 'heart_tab': 'Results'},
+    'heart_history': {'dashboard_page': 'Heart', 'heart_tab': 'History'},
+    'heart_diagnosis': {'dashboard_page': 'Heart', 'heart_tab': 'Diagnosis'},
+    'medications': {'dashboard_page': 'Medications'},
+}
+
+# Page -> widget keys or element types its main area must show. A page that
+# fails early can fit any budget, so a render without them does not count.
+LANDMARKS = {
+    'login': ('login_btn',),
+    'signup': ('signup_btn',),
+    'dashboard': ('vega_lite_chart', 'edit_profile_button'),
+    'heart_results': ('image',),
+    'heart_history': ('history_page_older', 'edit_vital_record'),
+    'heart_diagnosis': ('submit_diagnosis',),
+    'medications': ('med_page_next',),
+}
+
+
+def load_budgets(path):
+    """{page: {limit: ceiling}} from a TOML file, with [defaults] filled in"""
+    with open(path, 'rb') as f:
+        config = tomllib.load(f)
+    defaults = config.get('defaults', {})
+    budgets = {}
+    for page, limits in config.get('pages', {}).items():
+        budgets[page] = {**defaults, **limits}
+        unknown = set(budgets[page]) - set(LIMITS)
+        if unknown:
+            raise ValueError(f"Unknown limits for {page}: {', '.join(sorted(unknown))}; expected {', '.join(LIMITS)}")
+    return budgets
+
+def prepare():
+    """Migrate and seed the database; returns the account's user id"""
+    connection = db.connect()
+    try:
+        migrations.run_migrations(connection)
+        rng = np.random.default_rng(42)
+        user_ids = seed.seed_users(connection, rng, 1, 100)
+        seed.seed_vitals(connection, rng, user_ids, BUDGET_DAYS, 5000)
+        seed.seed_medications(connection, rng, user_ids, BUDGET_MEDICATIONS, 100)
+    finally:
+        connection.close()
+    # Once-per-process work the first page of a fresh process would otherwise pay for
+    migrations.ensure_schema()
+    reminder_scheduler.ensure_loaded()
+    return user_ids[0]
+
+def _elements(node):
+    for child in getattr(node, 'children', {}).values():
+        yield child
+        yield from _elements(child)
+
+def render(name, user_id):
+    """Run the app once as this page; returns the runs metrics recorded.
+
+    Raises RuntimeError when the page raised, showed an error or is missing
+    one of its landmarks.
+    """
+    state = PAGES[name]
+    vitals_cache.clear()
+    app = AppTest.from_string(SCRIPT, default_timeout=60)
+    if state.get('logged_in', True):
+        app.session_state.logged_in = True
+        app.session_state.user_id = user_id
+        app.session_state.username = "Budget"
+    for key, value in state.items():
+        app.session_state[key] = value
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    if app.error:
+        raise RuntimeError(f"page showed an error: {app.error[0].value}")
+    shown = {marker for element in _elements(app.main) for marker in (element.type, getattr(element, 'key', None))}
+    missing = [landmark for landmark in LANDMARKS[name] if landmark not in shown]
+    if missing:
+        raise RuntimeError(f"page did not render {', '.join(missing)}")
+    return list(app.session_state[metrics.RECENT_RUNS_KEY])
+
+def check(name, runs, budget):
+    """Lines describing the page's worst run against its budget, and whether it is within it"""
+    worst = {limit: max(run[limit] for run in runs) for limit in LIMITS}
+    over = [limit for limit, ceiling in budget.items() if worst[limit] > ceiling]
+    shown = ', '.join(f"{limit} {worst[limit]:,}/{budget[limit]:,}" if limit in budget else f"{limit} {worst[limit]:,}"
+                      for limit in LIMITS)
+    lines = [f"{'FAIL' if over else 'PASS'} {name} ({len(runs)} run{'s' if len(runs) != 1 else ''}): {shown}"]
+    if over:
+        # The traced functions behind the worst run, most queries first
+        run = max(runs, key=lambda run: run['queries'])
+        for function, stats in sorted(run['functions'].items(), key=lambda item: -item[1]['queries'])[:8]:
+            lines.append(f"    {stats['queries']:4} queries {stats['calls']:4} calls  {function}")
+    return lines, not over
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check each page's queries, connections and bytes per run against budgets")
+    parser.add_argument("--config", default=CONFIG, help="TOML file of per-page ceilings")
+    args = parser.parse_args()
+
+    budgets = load_budgets(args.config)
+    temp_dir = tempfile.TemporaryDirectory()
+    db.configure(backend='sqlite', sqlite_path=os.path.join(temp_dir.name, 'budgets.sqlite3'))
+    metrics.configure(measure_bytes=True)
+
+    # Pages load images by relative path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    within, failures = 0, 0
+    try:
+        user_id = prepare()
+        for name in PAGES:
+            if name not in budgets:
+                failures += 1
+                print(f"FAIL {name}: no budget in {args.config}")
+                continue
+            try:
+                runs = render(name, user_id)
+            except RuntimeError as e:
+                failures += 1
+                print(f"FAIL {name}: {e}")
+                continue
+            lines, passed = check(name, runs, budgets[name])
+            within += passed
+            failures += not passed
+            print('\n'.join(lines))
+        for name in sorted(set(budgets) - set(PAGES)):
+            failures += 1
+            print(f"FAIL {name}: budgeted page does not exist; expected one of {', '.join(PAGES)}")
+        print(f"{within}/{len(PAGES)} pages within budget")
+    finally:
+        db.configure()  # drop pooled connections before the temp file goes
+        temp_dir.cleanup()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+VITALS_CACHE_MAX_ENTRIES = int(os.environ.get('VITAL_CACHE_MAX_ENTRIES', '2048'))
+VITALS_CACHE_TTL = float(os.environ.get('VITAL_CACHE_TTL', '300'))
+
+
+class QueryCache:
+    """Process-wide read-through cache keyed by user and query shape, with TTL and LRU eviction"""
+
+    def __init__(self, max_entries=VITALS_CACHE_MAX_ENTRIES, ttl=VITALS_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (user_id, query, args) -> (expires_at, value)
+        self._keys_by_user = {}
+        # Bumped by every invalidation, so a load that raced one is not stored
+        self._generations = {}  # user_id -> invalidation count
+        self._epoch = 0  # bumped by clear()
+        self._instance = secrets.token_hex(8)  # versions from another process never match
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+
+    def get_or_load(self, loader, user_id, *args):
+        """Return loader(user_id, *args), serving it from memory while fresh.
+
+        Exceptions from the loader propagate and nothing is cached, so a
+        failed query is retried on the next call. A value whose user was
+        invalidated while it loaded is returned but not cached.
+        """
+        key = (user_id, loader.__name__, args)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                self._remove(key)
+                self._stats['expired'] += 1
+            self._stats['misses'] += 1
+            generation = self._generation(user_id)
+
+        value = loader(user_id, *args)
+        with self._lock:
+            if self._generation(user_id) == generation:
+                self._store(key, value)
+        return value
+
+    def peek(self, loader, user_id, *args):
+        """Fresh cached value for a query, or None; never loads and is not counted"""
+        with self._lock:
+            entry = self._entries.get((user_id, loader.__name__, args))
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def version(self, user_id):
+        """Opaque token that changes whenever the user's entries are invalidated"""
+        with self._lock:
+            return (self._instance, *self._generation(user_id))
+
+    def prime(self, loader, value, user_id, *args, version=None):
+        """Seed the entry get_or_load(loader, user_id, *args) would create; True if stored.
+
+        Never replaces a fresh entry, and stores nothing when version is
+        given and the user has been invalidated since it was taken.
+        """
+        key = (user_id, loader.__name__, args)
+        with self._lock:
+            if version is not None and version != (self._instance, *self._generation(user_id)):
+                return False
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return False
+            self._store(key, value)
+            return True
+
+    def put(self, key, value):
+        """Store a value under a (user_id, query, args) key"""
+        with self._lock:
+            self._store(key, value)
+
+    def invalidate_user(self, user_id):
+        """Drop every cached query for a user; call after any write to their data"""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def _generation(self, user_id):
+        return (self._epoch, self._generations.get(user_id, 0))
+
+    def _store(self, key, value):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._keys_by_user.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        del self._entries[key]
+        user_keys = self._keys_by_user.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._keys_by_user[key[0]]
+
+    def stats(self):
+        """Snapshot of hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['users'] = len(self._keys_by_user)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+# Shared by the dashboard and heart pages
+vitals_cache = QueryCache()
@@ -0,0 +1,294 @@
+"""Data-access contract every storage backend must satisfy.
+
+    python contract.py --backend sqlite          # throwaway database file
+    python contract.py --backend mysql           # uses DB_CONFIG; cleans up after itself
+
+Exercises the data functions the pages call, through the shared pool,
+and exits non-zero if any check fails.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import db
+import migrations
+from cache import vitals_cache
+
+
+CHECKS = []
+
+def check(function):
+    CHECKS.append(function)
+    return function
+
+
+def vital_records(user_id, start_date=date(1900, 1, 1), end_date=None):
+    """A user's vital records between two dates, newest first, walked a history page at a time"""
+    import heart
+    end_date = end_date or date.today()
+    found, before = [], None
+    while True:
+        records, before = heart.get_vital_history_page(user_id, before, limit=50)
+        found += [record for record in records if start_date <= record[8] <= end_date]
+        if before is None or before[0] < start_date:
+            return found
+
+
+class Context:
+    """Account shared by the checks, created by the first one"""
+    email = f"contract-{int(time.time() * 1000)}@example.com"
+    password = "contract-password"
+    user_id = None
+
+
+@check
+def migrations_are_idempotent(ctx):
+    connection = db.connect()
+    try:
+        migrations.run_migrations(connection)
+        assert migrations.run_migrations(connection) == [], "second run applied migrations again"
+    finally:
+        connection.close()
+
+@check
+def register_and_login(ctx):
+    import login
+    assert login.register_user("Contract User", ctx.password, ctx.email, 40, 70.5, 175, "O+", "", ""), "register_user failed"
+    assert not login.register_user("Duplicate", ctx.password, ctx.email, 40, 70, 175, "O+", "", ""), "duplicate email accepted"
+    assert not login.login_user(ctx.email, "wrong-password"), "wrong password accepted"
+    assert login.login_user(ctx.email, ctx.password), "login_user rejected the right password"
+    import streamlit as st #type: ignore
+    ctx.user_id = st.session_state.user_id
+    assert ctx.user_id, "login_user did not set user_id"
+
+@check
+def legacy_hash_upgraded_on_login(ctx):
+    import hashlib
+    import login
+    email = f"legacy-{ctx.email}"
+    connection = db.connect()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("INSERT INTO users (username, email, password) VALUES (%s, %s, %s)",
+                       ("Legacy User", email, hashlib.sha256(b"legacy-password").hexdigest()))
+        connection.commit()
+        assert login.login_user(email, "legacy-password"), "legacy SHA-256 hash rejected"
+        cursor.execute("SELECT password FROM users WHERE email = %s", (email,))
+        assert cursor.fetchone()[0].startswith("scrypt$"), "legacy hash not upgraded"
+        assert login.login_user(email, "legacy-password"), "upgraded hash rejected"
+        cursor.execute("DELETE FROM users WHERE email = %s", (email,))
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+@check
+def profile_round_trip(ctx):
+    import dashboard
+    profile = dashboard.get_user_profile(ctx.user_id)
+    assert profile[0] == "Contract User" and profile[1] == ctx.email, profile
+    assert dashboard.update_user(ctx.user_id, "Renamed", ctx.email, ctx.password, 41, 71, 176, "A+", "Pollen", ""), "update_user failed"
+    assert dashboard.get_user_profile(ctx.user_id)[0] == "Renamed"
+    # A blank password on profile save keeps the current one
+    assert dashboard.update_user(ctx.user_id, "Renamed", ctx.email, "", 41, 71, 176, "A+", "Pollen", "")
+    import login
+    assert login.login_user(ctx.email, ctx.password), "blank password save changed the password"
+
+@check
+def signup_seeds_a_demo_week(ctx):
+    history = vital_records(ctx.user_id, date.today() - timedelta(days=30))
+    assert len(history) == 7, f"expected 7 demo readings, got {len(history)}"
+    dates = [row[8] for row in history]
+    assert all(isinstance(d, date) for d in dates), "date_recorded is not a date"
+    assert dates == sorted(dates, reverse=True), "history is not newest first"
+
+@check
+def save_invalidates_latest(ctx):
+    import dashboard
+    import heart
+    heart.get_latest_heart_results(ctx.user_id)
+    assert heart.save_heart_results(ctx.user_id, "150/95", 99, 150, 95, 140, 9, 37.2), "save_heart_results failed"
+    latest = heart.get_latest_heart_results(ctx.user_id)
+    assert latest[0] == "150/95" and latest[1] == 99, latest
+    assert dashboard.get_latest_vital_results(ctx.user_id)[0] == 150
+
+@check
+def one_reading_per_day(ctx):
+    import io
+    import heart
+    import importer
+    today = vital_records(ctx.user_id, date.today())
+    assert heart.save_heart_results(ctx.user_id, "131/84", 77, 131, 84, 101, 6, 36.9), "second save failed"
+    saved = vital_records(ctx.user_id, date.today())
+    assert len(saved) == 1 and saved[0][0] == today[0][0] and saved[0][2] == 77, saved
+
+    day = date.today() - timedelta(days=2)
+    csv = ("date_recorded,systolic_bp,diastolic_bp,heart_rate,glucose_level,temperature,water_balance\n"
+           f"{day},121,81,61,91,36.6,4\n{day},122,82,62,92,36.7,5\n")
+    report = importer.import_file(io.StringIO(csv), 'csv', user_id=ctx.user_id)
+    assert report['imported'] == 1 and report['duplicates'] == 1, report
+    rows = vital_records(ctx.user_id, day, day)
+    assert len(rows) == 1 and rows[0][2] == 62, rows
+
+@check
+def update_and_delete_are_scoped_to_owner(ctx):
+    import heart
+    record = vital_records(ctx.user_id, date.today() - timedelta(days=30))[0]
+    record_id = record[0]
+    assert heart.update_vital_record(ctx.user_id, record_id, "111/77", 66, 111, 77, 90, 4, 36.6), "update failed"
+    updated = vital_records(ctx.user_id, date.today() - timedelta(days=30))[0]
+    assert updated[0] == record_id and updated[1] == "111/77" and float(updated[7]) == 36.6, updated
+
+    heart.update_vital_record(ctx.user_id + 1_000_000, record_id, "0/0", 1, 1, 1, 1, 1, 1)
+    vitals_cache.clear()
+    assert vital_records(ctx.user_id, date.today() - timedelta(days=30))[0][1] == "111/77", "another user's update applied"
+
+    assert heart.delete_vital_record(ctx.user_id, record_id), "delete failed"
+    ids = [row[0] for row in vital_records(ctx.user_id, date.today() - timedelta(days=30))]
+    assert record_id not in ids, "record still present after delete"
+
+@check
+def history_windows(ctx):
+    import dashboard
+    from vital_series import load_vital_series
+    bp = dashboard.get_bp_history(ctx.user_id, 7)
+    assert bp and [row[0] for row in bp] == sorted(row[0] for row in bp), "BP history is not oldest first"
+    assert all(row[0] >= date.today() - timedelta(days=7) for row in bp), "BP history outside window"
+    series = load_vital_series(ctx.user_id, date.today() - timedelta(days=30))
+    assert len(series) == len(vital_records(ctx.user_id, date.today() - timedelta(days=30)))
+
+@check
+def history_pages_cover_everything(ctx):
+    import heart
+    walked, before = [], None
+    while True:
+        records, before = heart.get_vital_history_page(ctx.user_id, before, limit=3)
+        walked += [record[0] for record in records]
+        if before is None:
+            break
+    connection = db.connect()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT id FROM vital_results WHERE user_id = %s ORDER BY date_recorded DESC, id DESC", (ctx.user_id,))
+        expected = [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        connection.close()
+    assert walked == expected, (walked, expected)
+
+@check
+def medications_round_trip(ctx):
+    import medications
+    name = f"Contractol {ctx.email}"
+    assert medications.add_medication(ctx.user_id, name, 8, 2.5, "Tablet", "", "", "7 days", "None"), "add_medication failed"
+    rows, _ = medications.get_medications(ctx.user_id)
+    rows = [m for m in rows if m['medication_name'] == name]
+    assert len(rows) == 1 and rows[0]['time_hour'] == 8 and float(rows[0]['dose']) == 2.5, rows
+    other_rows, _ = medications.get_medications(ctx.user_id + 1000000)
+    assert not other_rows, "another user sees this user's medications"
+    medications.delete_medication(ctx.user_id + 1000000, rows[0]['id'])
+    assert medications.count_medications(ctx.user_id) == 1, "another user deleted this user's medication"
+    assert medications.delete_medication(ctx.user_id, rows[0]['id']), "delete_medication failed"
+    assert medications.count_medications(ctx.user_id) == 0
+
+@check
+def medications_paginate(ctx):
+    import medications
+    for i in range(7):
+        assert medications.add_medication(ctx.user_id, f"Pagitol {i}", i, 1.0, "Tablet", "", "", "", "None")
+    seen, after, pages = [], None, 0
+    while True:
+        rows, after = medications.get_medications(ctx.user_id, after, limit=3)
+        seen += [row['id'] for row in rows]
+        pages += 1
+        if after is None:
+            break
+    assert pages == 3 and len(seen) == len(set(seen)) == 7, (pages, seen)
+    assert seen == sorted(seen, reverse=True), "pages are not newest first"
+
+@check
+def reminders_follow_medications(ctx):
+    import medications
+    from reminders import upcoming_doses
+    upcoming_doses(ctx.user_id)  # loads the schedule before the add below
+    name = f"Remindol {ctx.email}"
+    assert medications.add_medication(ctx.user_id, name, 8, 1.0, "Tablet", "", "", "", "None")
+    doses = [d for d in upcoming_doses(ctx.user_id, 24) if d['medication_name'] == name]
+    assert len(doses) == 1 and doses[0]['due'].hour == 8, doses
+    assert medications.delete_medication(ctx.user_id, doses[0]['medication_id'])
+    assert not [d for d in upcoming_doses(ctx.user_id, 24) if d['medication_name'] == name], "deleted medication still scheduled"
+
+@check
+def named_queries_reuse_cursors(ctx):
+    from queries import named_queries
+    before = named_queries.stats().get('user_profile', {}).get('executions', 0)
+    cursors = set()
+    for _ in range(3):
+        with db.connect() as connection:
+            assert named_queries.fetchone(connection, 'user_profile', (ctx.user_id,)), "profile not found"
+            cursors.add(id(connection.prepared_cursor('user_profile')))
+    assert named_queries.stats()['user_profile']['executions'] == before + 3, named_queries.stats()
+    assert len(cursors) <= db.get_pool().stats()['created'], "prepared cursor not kept across checkouts"
+
+@check
+def history_export_downloads(ctx):
+    import io
+    import exporter
+    import pyarrow.parquet as pq #type: ignore
+    from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime #type: ignore
+    expected = len(vital_records(ctx.user_id))
+    for fmt in exporter.FORMATS:
+        # What the History tab's download button does with its callable's result
+        data, _ = convert_data_to_bytes_and_infer_mime(exporter.export_user_vitals(ctx.user_id, fmt),
+                                                       unsupported_error=TypeError(f"{fmt} export is not downloadable"))
+        if fmt == 'csv':
+            rows = len(data.decode().splitlines()) - 1
+        else:
+            rows = pq.read_table(io.BytesIO(data)).num_rows
+        assert rows == expected, f"{fmt} export has {rows} rows, expected {expected}"
+
+@check
+def delete_user_cascades(ctx):
+    import dashboard
+    import medications
+    assert dashboard.delete_user(ctx.user_id), "delete_user failed"
+    assert dashboard.get_user_profile(ctx.user_id) is None
+    assert vital_records(ctx.user_id) == [], "vitals survived delete_user"
+    assert medications.count_medications(ctx.user_id) == 0, "medications survived delete_user"
+    from reminders import upcoming_doses
+    assert upcoming_doses(ctx.user_id, 48) == [], "reminders survived delete_user"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a storage backend against the data-access contract")
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], default=db.DB_BACKEND)
+    args = parser.parse_args()
+
+    temp_dir = None
+    if args.backend == 'sqlite':
+        temp_dir = tempfile.TemporaryDirectory()
+        db.configure(backend='sqlite', sqlite_path=os.path.join(temp_dir.name, 'contract.sqlite3'))
+    else:
+        db.configure(backend='mysql')
+
+    ctx, failures = Context(), 0
+    for function in CHECKS:
+        try:
+            function(ctx)
+            print(f"PASS {function.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"FAIL {function.__name__}: {type(e).__name__}: {e}")
+    print(f"{len(CHECKS) - failures}/{len(CHECKS)} checks passed on {args.backend}")
+
+    db.configure()  # drop pooled connections before the temp file goes
+    if temp_dir:
+        temp_dir.cleanup()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
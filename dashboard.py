@@ -1,126 +1,81 @@
 import streamlit as st #type: ignore
-import mysql.connector #type: ignore
-from mysql.connector import Error #type: ignore
 
-from datetime import datetime, date, timedelta #type: ignore
+from datetime import date, timedelta #type: ignore
 
-import random #type: ignore
+import os
 import numpy as np #type: ignore
-import hashlib
+import pandas as pd #type: ignore
 
 import heart
 import medications
 
+from db import connect, create_connection, Error
+from cache import vitals_cache
+from fetch import fetch_all
+from passwords import password_engine
+from queries import named_queries
+from reminders import reminder_scheduler
+from vital_series import METRICS, downsample
+import fragments
+import metrics
+import vital_series
+import rollups
+import sessions
+import styles
 
 
+# Trend chart range -> days back (None for everything)
+TREND_RANGES = {'7 days': 7, '30 days': 30, '90 days': 90, '1 year': 365, '5 years': 5 * 365, 'All time': None}
+# Points sent per line whatever the range, so the chart costs the same for any history length
+TREND_POINTS = int(os.environ.get('VITAL_TREND_POINTS', '300'))
+TREND_SERIES = {'systolic_bp': 'Systolic', 'diastolic_bp': 'Diastolic', 'heart_rate': 'Heart rate', 'glucose_level': 'Glucose'}
 
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'vital_signs_db',
-    'user': 'root',
-    'password': '1234'
-}
 
-def create_connection():
-    """Create database connection"""
+@metrics.traced
+def get_user_profile(user_id):
+    """Get user profile information"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
+        return vitals_cache.get_or_load(_fetch_user_profile, user_id)
     except Error as e:
-        st.error(f"Error connecting to database: {e}")
-        return None
-
-def create_tables():
-    """Create necessary database tables if they don't exist"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        
-        # Create users table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(100) NOT NULL,
-            email VARCHAR(100) UNIQUE NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            age INT,
-            weight FLOAT,
-            height FLOAT,
-            blood_type VARCHAR(5),
-            allergies TEXT,
-            diseases TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        
+        st.error(f"Error fetching user profile: {e}")
+    return None
 
-        # Create vital_results table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS vital_results (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT NOT NULL,
-            date_recorded DATE NOT NULL,
-            systolic_bp INT,
-            diastolic_bp INT,
-            heart_rate INT,
-            temperature DECIMAL(4,1),
-            glucose_level INT,
-            blood_status VARCHAR(20),
-            water_balance INT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-        """)
-        
-        connection.commit()
-        cursor.close()
+def _fetch_user_profile(user_id):
+    connection = connect()
+    try:
+        return named_queries.fetchone(connection, 'user_profile', (user_id,))
+    finally:
         connection.close()
-        return True
-    return False
 
-def get_user_profile(user_id):
-    """Get user profile information"""
+@metrics.traced
+def update_user(user_id, username, email, password, age, weight, height, blood_type, allergies, diseases):
+    """Update user profile information; a blank password keeps the current one"""
+    # Only a new password is hashed, so ordinary profile saves skip the KDF
+    hashed_password = password_engine.hash(password) if password else None
     connection = create_connection()
     if connection:
         cursor = connection.cursor()
         try:
+            # Update user with specific id
             cursor.execute("""
-            SELECT username, email, age, weight, height, blood_type, allergies, diseases, created_at 
-            FROM users WHERE id = %s
-            """, (user_id,))
-            profile = cursor.fetchone()
-            cursor.close()
-            connection.close()
-            return profile
+            UPDATE users SET username=%s, email=%s, password=COALESCE(%s, password), age=%s, weight=%s, height=%s, 
+            blood_type=%s, allergies=%s, diseases=%s WHERE id = %s
+            """, (username, email, hashed_password, age, weight, height, blood_type, allergies, diseases, user_id))
+            connection.commit()
+            vitals_cache.invalidate_user(user_id)
+            if password:
+                # Whoever else holds a session may be who the password is being changed to keep out
+                sessions.revoke_user(user_id, keep_current=True)
+            return True
         except Error as e:
-            st.error(f"Error fetching user profile: {e}")
+            st.error(f"Error updating profile: {e}")
+            return False
+        finally:
             cursor.close()
             connection.close()
-    return None
-
-def hash_password(password):
-    """Hash password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def update_user(user_id, username, email, password, age, weight, height, blood_type, allergies, diseases):
-    """Update user profile information"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        hashed_password = hash_password(password)
-            
-        # Update user with specific id
-        cursor.execute("""
-        UPDATE users SET username=%s, email=%s, password=%s, age=%s, weight=%s, height=%s, 
-        blood_type=%s, allergies=%s, diseases=%s WHERE id = %s
-        """, (username, email, hashed_password, age, weight, height, blood_type, allergies, diseases, user_id))
-            
-        connection.commit()
-        cursor.close()
-        connection.close()
-        return True
     return False
 
+@metrics.traced
 def delete_user(user_id):
     """Delete user account and all associated data"""
     connection = create_connection()
@@ -133,419 +88,88 @@ def delete_user(user_id):
         connection.commit()
         cursor.close()
         connection.close()
+        vitals_cache.invalidate_user(user_id)
+        reminder_scheduler.remove_user(user_id)
+        sessions.revoke_user(user_id)
         return True
         
     return False
 
+@metrics.traced
 def get_latest_vital_results(user_id):
     """Get latest vital results for dashboard"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        try:
-            cursor.execute("""
-            SELECT systolic_bp, diastolic_bp, heart_rate, temperature, glucose_level, blood_status, water_balance
-            FROM vital_results WHERE user_id = %s ORDER BY date_recorded DESC LIMIT 1
-            """, (user_id,))
-            
-            result = cursor.fetchone()
-            cursor.close()
-            connection.close()
-            return result
-        except Error as e:
-            st.error(f"Error fetching vital results: {e}")
-            cursor.close()
-            connection.close()
+    try:
+        return vitals_cache.get_or_load(_fetch_latest_vital_results, user_id)
+    except Error as e:
+        st.error(f"Error fetching vital results: {e}")
     return None
 
+def _fetch_latest_vital_results(user_id):
+    connection = connect()
+    try:
+        return named_queries.fetchone(connection, 'latest_vitals', (user_id,))
+    finally:
+        connection.close()
+
+@metrics.traced
 def get_bp_history(user_id, days=7):
     """Get blood pressure history for the last N days"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        try:
-            cursor.execute("""
-            SELECT date_recorded, systolic_bp, diastolic_bp
-            FROM vital_results 
-            WHERE user_id = %s AND date_recorded >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
-            ORDER BY date_recorded ASC
-            """, (user_id, days))
-            
-            records = cursor.fetchall()
-            cursor.close()
-            connection.close()
-            return records
-        except Error as e:
-            st.error(f"Error fetching BP history: {e}")
-            cursor.close()
-            connection.close()
+    try:
+        return vitals_cache.get_or_load(_fetch_bp_history, user_id, days)
+    except Error as e:
+        st.error(f"Error fetching BP history: {e}")
     return []
 
-def generate_sample_data(user_id):
-    """Generate sample vital results data for demo purposes"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        
-        try:
-            # Checks if data already exists
-            cursor.execute("SELECT COUNT(*) FROM vital_results WHERE user_id = %s", (user_id,))
-            count = cursor.fetchone()[0]
-            
-            if count == 0:  # Only generate if no data exists
-                # Generate data for last 7 days
-                for i in range(7):
-                    date_record = date.today() - timedelta(days=6-i)
-                    systolic = random.randint(110, 140)
-                    diastolic = random.randint(70, 90)
-                    heart_rate = random.randint(60, 100)
-                    temperature = round(random.uniform(36.0, 37.5), 1)
-                    glucose = random.randint(80, 120)
-                    blood_status = f"{systolic}/{diastolic}"
-                    water_balance = random.randint(1, 10)
-                    
-                    cursor.execute("""
-                    INSERT INTO vital_results (user_id, date_recorded, systolic_bp, diastolic_bp, 
-                    heart_rate, temperature, glucose_level, blood_status, water_balance)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (user_id, date_record, systolic, diastolic, heart_rate, temperature, 
-                         glucose, blood_status, water_balance))
-                
-                connection.commit()
-        except Error as e:
-            st.error(f"Error generating sample data: {e}")
-        finally:
-            cursor.close()
-            connection.close()
-
-def load_dashboard_css():
-    """Load custom CSS for dashboard"""
-    st.markdown("""
-    <style>
-    /* Main dashboard background */
-    .stApp {
-        background: #f8fafc !important;
-    }
-                
-    /* Global heading colors - make all black */
-    h1, h2, h3, h4, h5, h6,
-    .stSubheader,
-    [data-testid="stSubheader"] {
-        color: black !important;
-    }
-    
-    /* Make input labels black */
-    .stTextInput label,
-    .stNumberInput label,
-    .stSelectbox label,
-    label {
-        color: black !important;
-        font-weight: 500 !important;
-    }
-
-    /* Also target the label text specifically */
-    .stTextInput > label > div,
-    .stNumberInput > label > div,
-    .stSelectbox > label > div {
-        color: black !important;
-    }
+def _fetch_bp_history(user_id, days):
+    connection = connect()
+    try:
+        return named_queries.fetchall(connection, 'bp_history', (user_id, date.today() - timedelta(days=days)))
+    finally:
+        connection.close()
 
-    /* Target Streamlit's label spans */
-    [data-testid="stWidgetLabel"] {
-        color: black !important;
-    }
+@metrics.traced
+def get_vital_trend(user_id, days):
+    """Long (date, series, value) frame for the trend chart, at most TREND_POINTS per series
 
-    /* Make sure placeholder text is visible but lighter */
-    .stTextInput input::placeholder,
-    .stNumberInput input::placeholder {
-        color: #64748b !important;
-    }
-    
-    /* Sidebar styling */
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #07635b 0%, #0a4d47 100%) !important;
-    }
-    
-    [data-testid="stSidebar"] * {
-        color: white !important;
-    }
-    
-    /* Sidebar buttons */
-    [data-testid="stSidebar"] .stButton > button {
-        background: rgba(255, 255, 255, 0.1) !important;
-        color: white !important;
-        border: 1px solid rgba(255, 255, 255, 0.2) !important;
-        border-radius: 50px !important;
-        padding: 12px 20px !important;
-        font-size: 1rem !important;
-        font-weight: 500 !important;
-        width: 100% !important;
-        transition: all 0.3s ease !important;
-        margin: 5px 0 !important;
-    }
-    
-    [data-testid="stSidebar"] .stButton > button:hover {
-        background: rgba(255, 255, 255, 0.2) !important;
-        transform: translateX(5px) !important;
-    }
-    
-    
-    /* Button styling */
-    .stButton > button {
-        background: linear-gradient(135deg, #1F5675, #44A08D) !important;
-        color: white !important;
-        border: none !important;
-        padding: 12px 32px !important;
-        border-radius: 25px !important;
-        font-size: 1rem !important;
-        font-weight: 600 !important;
-        width: 100% !important;
-        box-shadow: 0 4px 15px rgba(76, 205, 196, 0.4) !important;
-        transition: all 0.3s ease !important;
-        letter-spacing: 0.5px !important;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 6px 20px rgba(76, 205, 196, 0.6) !important;
-    }
-    
-    /* Deploy Bar Color */
-    .est0q592 {
-        background: #17a2b8 !important;
-    }
-    
-    /* Header section */
-    .dashboard-header {
-        background: white !important;
-        border-radius: 16px !important;
-        padding: 2rem !important;
-        margin-bottom: 2rem !important;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1) !important;
-        border: 1px solid #e2e8f0 !important;
-    }
-    
-    .welcome-section {
-        display: flex;
-        justify-content: space-between;
-        align-items: flex-start;
-    }
-    
-    .welcome-text h1 {
-        color: #1e293b !important;
-        font-size: 2rem !important;
-        font-weight: 600 !important;
-        margin: 0 0 0.5rem 0 !important;
-    }
-    
-    .welcome-text .username {
-        color: #3b82f6 !important;
-        font-weight: 600 !important;
-    }
-    
-    .welcome-text p {
-        color: #64748b !important;
-        font-size: 1rem !important;
-        margin: 0 0 1rem 0 !important;
-    }
-    
-    /* Metrics cards */
-    .metric-card {
-        background: white !important;
-        border-radius: 16px !important;
-        padding: 1.5rem !important;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1) !important;
-        border: 1px solid #e2e8f0 !important;
-        transition: transform 0.2s ease, box-shadow 0.2s ease !important;
-        margin-bottom: 20px !important;
-        min-height: 250px !important;
-        max-height: 250px !important;
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15) !important;
-    }
-    
-    .metric-card.heart-rate {
-        border-left: 4px solid #ef4444 !important;
-    }
-    
-    .metric-card.temperature {
-        border-left: 4px solid #06b6d4 !important;
-    }
-    
-    .metric-card.blood-pressure {
-        border-left: 4px solid #8C1007 !important;
-    }
-    
-    .metric-card.glucose {
-        border-left: 4px solid #eab308 !important;
-    }
-    
-    .metric-card.water {
-        min-height: 460px !important;
-        border-left: 4px solid #262657 !important;
-    }
-    
-    .metric-card.blood-status {
-        border-left: 4px solid #eab308 !important;
-    }
-    
-    .metric-card.glucose-level {
-        border-left: 4px solid #eab308 !important;
-    }
-    
-    .metric-card.waterbalance {
-        min-height: 100px !important;
-        border-left: 4px solid #06b6d4 !important;
-    }
-    
-    .metric-card.medication-card {
-        border-left: 4px solid #3b82f6 !important;
-    }
-                
-    .metric-header {
-        display: flex;
-        align-items: center;
-        margin-bottom: 0.5rem;
-    }
-    
-    .metric-icon {
-        font-size: 1.5rem;
-        margin-right: 8px;
-    }
-    
-    .metric-title {
-        color: black !important;
-        font-size: 1.5rem !important;
-        margin: 0 !important;
-    }
-    
-    .metric-value {
-        font-size: 1.75rem !important;
-        font-weight: 600 !important;
-        color: #1e293b !important;
-        margin: 0.25rem 0 !important;
-    }
+    Up to a year is drawn from the raw readings; longer ranges use weekly
+    rollup means, and all-time uses monthly ones. Both loaders cache their
+    rows and report their own errors, so only the downsampling repeats.
+    """
+    start = date.today() - timedelta(days=days) if days else date(1900, 1, 1)
+    lines = {}
+    if days and days <= 365:
+        series = vital_series.load_vital_series(user_id, start)
+        lines = {column: (series.dates, series.column(metric))
+                 for metric, column in METRICS.items() if column in TREND_SERIES}
+    else:
+        bucket = 'week' if days else 'month'
+        rows = rollups.get_rollups(user_id, bucket, start)
+        for column in TREND_SERIES:
+            means = [(bucket, float(total) / n) for bucket, metric, n, _, _, total, _ in rows if metric == column and n]
+            if means:
+                bucket_dates, values = zip(*means)
+                lines[column] = (np.array(bucket_dates, dtype='datetime64[D]'), np.array(values))
 
-    .metric-subtitle {
-        color: #64748b !important;
-        font-size: 0.8rem !important;
-        margin: 0 !important;
-    }
-    
-    .metric-subtitle.water {
-        color: #64748b !important;
-        font-size: 1.25rem !important;
-        margin: 0 !important;
-    }
-    
-    .metric-detail {
-        color: #64748b !important;
-        font-size: 0.875rem !important;
-        margin: 0.25rem 0 !important;
-    }
-    
-    .divider-line {
-        height: 1px;   
-        background: #64748b;  
-        margin: 0.5rem 0;        
-    }
-    
-    /* Profile section */
-    .profile-section {
-        background: white !important;
-        border-radius: 16px !important;
-        padding: 2rem !important;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1) !important;
-        border: 1px solid #e2e8f0 !important;
-    }
-    
-    .profile-icon {
-        font-size: 1.5rem;
-        margin-right: 8px;
-    }
-    
-    .profile-header {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin-bottom: 2rem;
-    }
-                
-    .profile-title {
-        color: #1e293b !important;
-        font-size: 1.5rem !important;
-        font-weight: 600 !important;
-        margin: 0 !important;
-    }
-    
-    .profile-value {
-        font-size: 1.75rem !important;
-        font-weight: 600 !important;
-        color: #1e293b !important;
-        margin: 0.25rem 0 !important;
-    }
-    
-    .profile-subtitle {
-        color: #64748b !important;
-        font-size: 0.8rem !important;
-        margin: 0 !important;
-    }
-    
-    .profile-details p {
-        margin: 6px 0 !important;
-        font-size: 20px !important;
-        color: #444 !important;
-    }
-                
-    /* Form sections */
-    .form-section {
-        margin-bottom: 1.5rem;
-    }
-    
-    .form-section h4 {
-        color: #2c3e50 !important;
-        font-size: 1.1rem !important;
-        margin-bottom: 1rem !important;
-        padding-bottom: 0.5rem !important;
-        border-bottom: 2px solid #4ECDC4 !important;
-        font-weight: 600 !important;
-    }
-    
-
-    /* Input fields styling */
-    .stTextInput > div > div > input,
-    .stNumberInput > div > div > input,
-    .stSelectbox > div > div > select {
-        border-radius: 8px !important;
-        border: 1px solid #e2e8f0 !important;
-        padding: 10px 12px !important;
-    }
-    
-    .stTextInput > div > div > input:focus,
-    .stNumberInput > div > div > input:focus,
-    .stSelectbox > div > div > select:focus {
-        border-color: #17a2b8 !important;
-        box-shadow: 0 0 0 3px rgba(23, 162, 184, 0.1) !important;
-    }
-    
-    
-    
-    /* Mobile responsive */
-    @media (max-width: 768px) {
-        .main-content {
-            padding: 0 1rem;
-        }
-        
-        .metrics-grid {
-            grid-template-columns: 1fr;
-        }
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    frames = []
+    for column, (dates, values) in lines.items():
+        dates, values = downsample(dates, values, TREND_POINTS)
+        frames.append(pd.DataFrame({'date': dates, 'series': TREND_SERIES[column], 'value': values}))
+    if not frames:
+        return pd.DataFrame(columns=['date', 'series', 'value'])
+    return pd.concat(frames, ignore_index=True)
 
+@st.fragment
+@metrics.rerun_entry
+def vital_trend_panel():
+    """Range picker and trend chart; changing the range reruns only this panel"""
+    st.markdown("### 📈 Trends")
+    label = st.radio("Range", list(TREND_RANGES), index=1, horizontal=True, key="trend_range", label_visibility="collapsed")
+    # A cache hit on full runs, where dashboard_main has already fetched it
+    trend = get_vital_trend(st.session_state.user_id, TREND_RANGES[label])
+    if trend.empty:
+        st.info("No readings in this range yet.")
+        return
+    st.line_chart(trend, x='date', y='value', color='series', x_label='', y_label='')
 
 def dashboard_sidebar():
     """Create dashboard sidebar"""
@@ -572,6 +196,7 @@ def dashboard_sidebar():
     
     if st.button("Logout", key="logout_btn", use_container_width=True):
         # Clear session state for logout
+        sessions.end()
         for key in list(st.session_state.keys()):
             del st.session_state[key]
         st.success("Logged out successfully!")
@@ -586,7 +211,7 @@ def show_edit_profile_form(user_data):
     col_form1, col_form2 = st.columns(2)
     with col_form1:
         new_username = st.text_input("Name", value=username, placeholder="Full name", key="edit_username")
-        new_password = st.text_input("New Password", type="password", placeholder="Enter new password", key="edit_password")
+        new_password = st.text_input("New Password", type="password", placeholder="Leave blank to keep current password", key="edit_password")
     
     with col_form2:
         new_email = st.text_input("Email", value=email, placeholder="Email address", key="edit_email")
@@ -619,15 +244,15 @@ def show_edit_profile_form(user_data):
         cancel_button = st.button("Cancel", key="cancel_edit_button")
     
     if save_button:
-        if not new_username or not new_email or not new_password:
-            st.error("Please fill in all required fields (Name, Email, Password)")
+        if not new_username or not new_email:
+            st.error("Please fill in all required fields (Name, Email)")
             return False
         
         if new_password != confirm_password:
             st.error("Passwords do not match!")
             return False
         
-        if len(new_password) < 6:
+        if new_password and len(new_password) < 6:
             st.error("Password must be at least 6 characters long!")
             return False
         
@@ -637,6 +262,7 @@ def show_edit_profile_form(user_data):
             st.success("Profile updated successfully!")
             st.session_state.username = new_username
             st.session_state.edit_mode = False #clears edit mode
+            # Full rerun: the header shows the name
             st.rerun()
         else:
             st.error("Failed to update profile. Please try again.")
@@ -644,7 +270,7 @@ def show_edit_profile_form(user_data):
     
     if cancel_button:
         st.session_state.edit_mode = False
-        st.rerun()
+        fragments.rerun()
         return False
     
     return False
@@ -664,6 +290,7 @@ def show_delete_confirmation():
         if delete_user(st.session_state.user_id):
             st.success("Account deleted successfully!")
             # Clear all session state
+            sessions.end()
             for key in list(st.session_state.keys()):
                 del st.session_state[key]
             st.rerun()
@@ -672,10 +299,14 @@ def show_delete_confirmation():
     
     if cancel_delete:
         st.session_state.delete_mode = False
-        st.rerun()
+        fragments.rerun()
 
+@metrics.traced
 def dashboard_main():
     """Main dashboard content"""
+    # Style bundle is sent once per session, not on every rerun
+    styles.inject('dashboard')
+    
     # ensures user is logged in (have to log in to access dashboard)
     if 'user_id' not in st.session_state or 'username' not in st.session_state:
         st.error("Please log in to access the dashboard")
@@ -687,11 +318,15 @@ def dashboard_main():
     if 'delete_mode' not in st.session_state:
         st.session_state.delete_mode = False
     
-    # sample data 
-    generate_sample_data(st.session_state.user_id)
-    
-    # Get latest vital results
-    vital_results = get_latest_vital_results(st.session_state.user_id)
+    # Latest vitals, the profile and the trend are independent; fetch them together.
+    # The profile and trend fragments then read theirs from the cache.
+    trend_days = TREND_RANGES[st.session_state.get('trend_range', '30 days')]
+    data = fetch_all(
+        vital_results=(get_latest_vital_results, st.session_state.user_id),
+        user=(get_user_profile, st.session_state.user_id),
+        trend=(get_vital_trend, st.session_state.user_id, trend_days),
+    )
+    vital_results = data['vital_results']
     
     # Default values if no data
     if vital_results:
@@ -764,6 +399,10 @@ def dashboard_main():
     
     st.markdown("---")
 
+    vital_trend_panel()
+
+    st.markdown("---")
+
     # Bottom section
     col_left, col_right = st.columns([1, 2])
     
@@ -781,51 +420,59 @@ def dashboard_main():
         """, unsafe_allow_html=True)
     
     with col_right:
-        #get user details
-        user=get_user_profile(st.session_state.user_id)
-
-        if user:
-            # Check if we're in edit or delete mode
-            if st.session_state.edit_mode:
-                show_edit_profile_form(user)
-            elif st.session_state.delete_mode:
-                show_delete_confirmation()
-            else:
-                username, email, age, weight, height, blood_type, allergies, diseases, created_at = user
-                
-                # Normal profile display
-                st.markdown(f"""
-                <div class="profile-section">
-                    <div class="profile-header">
-                        <h3 class="profile-title">👤 Profile</h3>
-                    </div>
-                    <div class="profile-details">
-                            <p><b>Patient Name:</b> {username}</p>
-                            <p><b>Email:</b> {email}</p>
-                            <p><b>Age:</b> {age}</p>  
-                            <p><b>Weight:</b> {weight}</p>
-                            <p><b>Height:</b> {height}</p>
-                            <p><b>Blood type:</b> {blood_type}</p>
-                            <p><b>Allergies:</b> {allergies if allergies else 'None'}</p>
-                            <p><b>Diseases:</b> {diseases if diseases else 'None'}</p>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                st.markdown("---")
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    if st.button("Edit Profile", key="edit_profile_button", type="primary"):
-                        st.session_state.edit_mode = True
-                        st.rerun()
-                
-                with col2:
-                    if st.button("Delete Account", key="delete_account_button", type="secondary"):
-                        st.session_state.delete_mode = True
-                        st.rerun()
+        profile_panel()
         
         
+@st.fragment
+@metrics.rerun_entry
+def profile_panel():
+    """Profile card with its edit and delete flows; their buttons rerun only this panel"""
+    # A cache hit on full runs, where dashboard_main has already fetched it
+    user = get_user_profile(st.session_state.user_id)
+
+    if user:
+        # Check if we're in edit or delete mode
+        if st.session_state.edit_mode:
+            show_edit_profile_form(user)
+        elif st.session_state.delete_mode:
+            show_delete_confirmation()
+        else:
+            username, email, age, weight, height, blood_type, allergies, diseases, created_at = user
+            
+            # Normal profile display
+            st.markdown(f"""
+            <div class="profile-section">
+                <div class="profile-header">
+                    <h3 class="profile-title">👤 Profile</h3>
+                </div>
+                <div class="profile-details">
+                        <p><b>Patient Name:</b> {username}</p>
+                        <p><b>Email:</b> {email}</p>
+                        <p><b>Age:</b> {age}</p>  
+                        <p><b>Weight:</b> {weight}</p>
+                        <p><b>Height:</b> {height}</p>
+                        <p><b>Blood type:</b> {blood_type}</p>
+                        <p><b>Allergies:</b> {allergies if allergies else 'None'}</p>
+                        <p><b>Diseases:</b> {diseases if diseases else 'None'}</p>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            st.markdown("---")
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                if st.button("Edit Profile", key="edit_profile_button", type="primary"):
+                    st.session_state.edit_mode = True
+                    fragments.rerun()
+            
+            with col2:
+                if st.button("Delete Account", key="delete_account_button", type="secondary"):
+                    st.session_state.delete_mode = True
+                    fragments.rerun()
+
+
+@metrics.traced
 def run_dashboard():
     """Main function to run the dashboard"""
     # Check if user is logged in
@@ -833,14 +480,6 @@ def run_dashboard():
         st.error("Please log in to access the dashboard")
         st.stop()
     
-    # Create necessary tables
-    if not create_tables():
-        st.error("Failed to create database tables. Please check your database connection.")
-        st.stop()
-    
-    # Load custom CSS
-    load_dashboard_css()
-    
     # Sidebar
     with st.sidebar:
         dashboard_sidebar()
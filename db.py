@@ -0,0 +1,315 @@
+import streamlit as st #type: ignore
+
+import os
+import queue
+import threading
+import time
+
+from storage import DatabaseError, DRIVER_ERRORS, create_backend
+import metrics
+
+
+# Catch this in data functions: it covers every backend's driver errors
+Error = DRIVER_ERRORS
+
+# 'mysql' (server in DB_CONFIG) or 'sqlite' (embedded file at SQLITE_PATH)
+DB_BACKEND = os.environ.get('VITAL_DB_BACKEND', 'mysql')
+SQLITE_PATH = os.environ.get('VITAL_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vital_signs.sqlite3'))
+
+DB_CONFIG = {
+    'host': os.environ.get('VITAL_DB_HOST', 'localhost'),
+    'database': os.environ.get('VITAL_DB_NAME', 'vital_signs_db'),
+    'user': os.environ.get('VITAL_DB_USER', 'root'),
+    'password': os.environ.get('VITAL_DB_PASSWORD', '1234')
+}
+
+# One pool per Streamlit process, shared by every session's script thread
+POOL_SIZE = int(os.environ.get('VITAL_DB_POOL_SIZE', '8'))
+CHECKOUT_TIMEOUT = float(os.environ.get('VITAL_DB_CHECKOUT_TIMEOUT', '5'))
+# Idle connections older than this are pinged before being handed out
+HEALTH_CHECK_AFTER = float(os.environ.get('VITAL_DB_HEALTH_CHECK_AFTER', '30'))
+
+
+class PoolError(DatabaseError):
+    """No pooled connection could be handed out"""
+
+
+class QueryStats:
+    """Process-wide counters of statements executed and rows fetched"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {'queries': 0, 'rows_fetched': 0}
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+query_stats = QueryStats()
+
+
+class CountingCursor:
+    """Cursor wrapper that records statements and fetched rows in query_stats, and the time they took in metrics"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            query_stats.count('rows_fetched')
+            metrics.record_rows((row,), 0.0)
+            yield row
+
+    def execute(self, operation, *args, **kwargs):
+        query_stats.count('queries')
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, *args, **kwargs)
+        finally:
+            metrics.record(queries=1, db_seconds=time.perf_counter() - started)
+
+    def executemany(self, operation, *args, **kwargs):
+        # The driver sends batched INSERTs as one multi-row statement
+        query_stats.count('queries')
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, *args, **kwargs)
+        finally:
+            metrics.record(queries=1, db_seconds=time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        if row is not None:
+            query_stats.count('rows_fetched')
+        metrics.record_rows((row,) if row is not None else (), time.perf_counter() - started)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        query_stats.count('rows_fetched', len(rows))
+        metrics.record_rows(rows, time.perf_counter() - started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        query_stats.count('rows_fetched', len(rows))
+        metrics.record_rows(rows, time.perf_counter() - started)
+        return rows
+
+
+class PooledConnection:
+    """Connection checked out of a ConnectionPool; close() hands it back"""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def cursor(self, *args, **kwargs):
+        if self._connection is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return CountingCursor(self._connection.cursor(*args, **kwargs))
+
+    def prepared_cursor(self, key):
+        """Cursor for one named statement, kept on this connection across checkouts"""
+        if self._connection is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return self._pool._prepared_cursor(self._connection, key)
+
+    def close(self):
+        """Return the connection to the pool"""
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self._pool._release(connection)
+
+    def __del__(self):
+        # A caller that forgot close() must not leak its pool slot
+        connection, self._connection = getattr(self, '_connection', None), None
+        if connection is not None:
+            self._pool._release(connection, discard=True)
+
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of database connections"""
+
+    def __init__(self, size=POOL_SIZE, timeout=CHECKOUT_TIMEOUT, health_check_after=HEALTH_CHECK_AFTER, connect=None):
+        self.size = size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._connect = connect or get_backend().connect
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._prepared = {}  # id(connection) -> {statement key: cursor}
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'health_checks': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def connect(self):
+        """Check out a connection, waiting up to `timeout` seconds for a free slot"""
+        if not self._slots.acquire(blocking=False):
+            self._count('waits')
+            if not self._slots.acquire(timeout=self.timeout):
+                self._count('timeouts')
+                raise PoolError(f"No database connection available after {self.timeout}s (pool size {self.size})")
+
+        try:
+            connection = self._checkout_idle() or self._new_connection()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+        metrics.record(connections=1)
+        return PooledConnection(self, connection)
+
+    def _checkout_idle(self):
+        """Pop a healthy idle connection, or None if there is none"""
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+
+            if time.monotonic() - last_used < self.health_check_after:
+                return connection
+
+            self._count('health_checks')
+            try:
+                connection.ping(reconnect=False)
+                return connection
+            except Error:
+                self._discard(connection)
+
+    def _new_connection(self):
+        connection = self._connect()
+        self._count('created')
+        return connection
+
+    def _prepared_cursor(self, connection, key):
+        # Only the thread holding the connection touches its cursors
+        with self._lock:
+            cursors = self._prepared.setdefault(id(connection), {})
+        cursor = cursors.get(key)
+        if cursor is None:
+            cursor = cursors[key] = CountingCursor(connection.cursor(prepared=True))
+        return cursor
+
+    def _discard(self, connection):
+        self._count('discarded')
+        with self._lock:
+            self._prepared.pop(id(connection), None)
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def _release(self, connection, discard=False):
+        with self._lock:
+            self._stats['in_use'] -= 1
+        try:
+            if not discard:
+                try:
+                    # Never hand an open transaction to the next caller
+                    if connection.in_transaction:
+                        connection.rollback()
+                except Error:
+                    discard = True
+            if discard:
+                self._discard(connection)
+            else:
+                self._idle.put((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        """Snapshot of pool counters, including how many connections are idle"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['idle'] = self._idle.qsize()
+        stats['size'] = self.size
+        return stats
+
+
+_backend = None
+_pool = None
+_pool_lock = threading.RLock()
+
+def get_backend():
+    """Return the configured storage backend"""
+    global _backend
+    if _backend is None:
+        with _pool_lock:
+            if _backend is None:
+                _backend = create_backend(DB_BACKEND, DB_CONFIG, SQLITE_PATH)
+    return _backend
+
+def configure(backend=None, sqlite_path=None, **settings):
+    """Switch backend, SQLite file or DB_CONFIG entries; the next checkout opens a fresh pool"""
+    global DB_BACKEND, SQLITE_PATH, _backend, _pool
+    with _pool_lock:
+        DB_BACKEND = backend or DB_BACKEND
+        SQLITE_PATH = sqlite_path or SQLITE_PATH
+        DB_CONFIG.update(settings)
+        _backend = None
+        _pool = None
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+def connect():
+    """Check a database connection out of the shared pool, raising Error on failure"""
+    return get_pool().connect()
+
+def create_connection():
+    """Check a database connection out of the shared pool"""
+    try:
+        return connect()
+    except Error as e:
+        st.error(f"Error connecting to database: {e}")
+        return None
+
+def pool_stats():
+    """Get connection pool counters for this process"""
+    return get_pool().stats()
@@ -0,0 +1,213 @@
+"""Streaming export of vital readings and medications to CSV or Parquet.
+
+    python exporter.py vitals --user-id 1 2 3 -o vitals.parquet
+    python exporter.py vitals --all-users --since 2024-01-01 -o vitals.csv
+    python exporter.py medications -o medications.csv
+    python exporter.py medications --user-id 42 -o medications.parquet
+
+Rows are pulled with fetchmany in fixed-size batches (mysql.connector's
+default cursor is unbuffered, so the server streams them) and written as
+they arrive, so memory stays flat however long the history is.
+"""
+import pyarrow as pa #type: ignore
+import pyarrow.parquet as pq #type: ignore
+
+import argparse
+import csv
+import io
+import os
+import tempfile
+import time
+from datetime import date
+
+from db import connect
+
+
+BATCH_ROWS = 10000
+FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+# Export columns and their Parquet types
+VITAL_COLUMNS = [
+    ('id', pa.int64()),
+    ('user_id', pa.int64()),
+    ('date_recorded', pa.date32()),
+    ('systolic_bp', pa.int32()),
+    ('diastolic_bp', pa.int32()),
+    ('heart_rate', pa.int32()),
+    ('glucose_level', pa.int32()),
+    ('temperature', pa.float64()),
+    ('water_balance', pa.int32()),
+    ('blood_status', pa.string()),
+    ('created_at', pa.timestamp('s')),
+]
+MEDICATION_COLUMNS = [
+    ('id', pa.int64()),
+    ('user_id', pa.int64()),
+    ('medication_name', pa.string()),
+    ('time_hour', pa.int32()),
+    ('dose', pa.float64()),
+    ('medication_type', pa.string()),
+    ('start_day', pa.string()),
+    ('end_day', pa.string()),
+    ('duration', pa.string()),
+    ('comments', pa.string()),
+    ('created_at', pa.timestamp('s')),
+    ('updated_at', pa.timestamp('s')),
+]
+
+
+def stream_rows(sql, params=(), batch_rows=BATCH_ROWS):
+    """Yield lists of at most batch_rows rows from one query"""
+    connection = connect()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+        connection.close()
+
+def vital_batches(user_ids=None, start_date=None, end_date=None, batch_rows=BATCH_ROWS):
+    """Batches of vital readings, by user then date; every user when user_ids is None"""
+    columns = ', '.join(name for name, _ in VITAL_COLUMNS)
+    conditions, params = [], []
+    if start_date or end_date:
+        conditions.append("date_recorded BETWEEN %s AND %s")
+        params += [start_date or date.min, end_date or date.max]
+
+    if user_ids is None:
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        yield from stream_rows(f"""
+        SELECT {columns} FROM vital_results {where}
+        ORDER BY user_id, date_recorded, id
+        """, tuple(params), batch_rows)
+        return
+    # One indexed range scan per patient
+    for user_id in user_ids:
+        where = ' AND '.join(["user_id = %s"] + conditions)
+        yield from stream_rows(f"""
+        SELECT {columns} FROM vital_results WHERE {where}
+        ORDER BY date_recorded, id
+        """, (user_id, *params), batch_rows)
+
+def medication_batches(user_ids=None, batch_rows=BATCH_ROWS):
+    """Batches of medications, oldest first; every user's (and unowned ones) when user_ids is None"""
+    columns = ', '.join(name for name, _ in MEDICATION_COLUMNS)
+    if user_ids is None:
+        yield from stream_rows(f"SELECT {columns} FROM medications ORDER BY created_at, id", (), batch_rows)
+        return
+    for user_id in user_ids:
+        yield from stream_rows(f"""
+        SELECT {columns} FROM medications WHERE user_id = %s
+        ORDER BY created_at, id
+        """, (user_id,), batch_rows)
+
+
+class CSVSink:
+    def __init__(self, out, columns):
+        self._text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+        self._writer = csv.writer(self._text)
+        self._writer.writerow([name for name, _ in columns])
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._text.flush()
+        self._text.detach()  # leave the caller's file open
+
+
+class ParquetSink:
+    def __init__(self, out, columns):
+        self._schema = pa.schema(columns)
+        self._writer = pq.ParquetWriter(out, self._schema, compression='zstd')
+
+    def write(self, rows):
+        arrays = []
+        for values, field in zip(zip(*rows), self._schema):
+            if pa.types.is_floating(field.type):
+                # DECIMAL columns arrive as Decimal from MySQL
+                values = [None if v is None else float(v) for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+SINKS = {'csv': CSVSink, 'parquet': ParquetSink}
+
+
+def write_export(out, fmt, columns, batches):
+    """Write batches of rows to a binary file object; returns the row count"""
+    sink = SINKS[fmt](out, columns)
+    written = 0
+    try:
+        for rows in batches:
+            sink.write(rows)
+            written += len(rows)
+    finally:
+        sink.close()
+    return written
+
+def export_user_vitals(user_id, fmt):
+    """A user's full history as a file open for reading, for st.download_button.
+
+    Streamlit takes a BufferedReader but not a SpooledTemporaryFile or
+    BufferedRandom, so the export goes to a named temporary file that is
+    then reopened read-only.
+    """
+    with tempfile.NamedTemporaryFile(suffix=f'.{fmt}', delete=False) as out:
+        path = out.name
+        try:
+            write_export(out, fmt, VITAL_COLUMNS, vital_batches([user_id]))
+        except BaseException:
+            out.close()
+            os.unlink(path)
+            raise
+    result = open(path, 'rb')
+    try:
+        # The open handle keeps the data readable; the name goes now (POSIX)
+        os.unlink(path)
+    except OSError:
+        pass
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export vital readings or medications to CSV or Parquet")
+    parser.add_argument("table", choices=["vitals", "medications"])
+    parser.add_argument("-o", "--output", required=True, help="file to write; .csv or .parquet")
+    parser.add_argument("--format", choices=list(FORMATS), help="default: from the output extension")
+    parser.add_argument("--user-id", type=int, nargs="+", help="patients to export")
+    parser.add_argument("--all-users", action="store_true", help="export every patient (vitals; the default for medications)")
+    parser.add_argument("--since", type=date.fromisoformat, help="first date, YYYY-MM-DD (vitals)")
+    parser.add_argument("--until", type=date.fromisoformat, help="last date, YYYY-MM-DD (vitals)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="rows fetched and written at a time")
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        parser.error("cannot tell the format from the output name; pass --format")
+    if args.table == 'vitals':
+        if not args.user_id and not args.all_users:
+            parser.error("vitals needs --user-id or --all-users")
+        columns = VITAL_COLUMNS
+        batches = vital_batches(None if args.all_users else args.user_id, args.since, args.until, args.batch_rows)
+    else:
+        columns = MEDICATION_COLUMNS
+        batches = medication_batches(None if args.all_users else args.user_id, args.batch_rows)
+
+    started = time.perf_counter()
+    with open(args.output, 'wb') as out:
+        written = write_export(out, fmt, columns, batches)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {written:,} rows to {args.output} in {elapsed:.1f}s ({written / elapsed if elapsed else 0:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Concurrent data fetching for page assembly.
+
+A page declares the independent reads it needs up front,
+
+    data = fetch_all(profile=(get_user_profile, user_id),
+                     vitals=(get_latest_vital_results, user_id))
+
+and gets every result back together, so render waits for the slowest
+round trip instead of the sum of them. prefetch() starts a cached read a
+later rerun is likely to want, without waiting for it.
+"""
+import contextvars
+import os
+import threading
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx #type: ignore
+
+from cache import vitals_cache
+
+
+# Fetch threads running at once across all sessions. Each holds a pooled
+# connection while it runs, so keep this below VITAL_DB_POOL_SIZE.
+FETCH_WORKERS = int(os.environ.get('VITAL_FETCH_WORKERS', '4'))
+
+_slots = threading.BoundedSemaphore(FETCH_WORKERS)
+
+
+class _Fetch(threading.Thread):
+    def __init__(self, fetch_name, function, args):
+        super().__init__(name=f"fetch-{fetch_name}", daemon=True)
+        self.fetch_name = fetch_name
+        self.function = function
+        self.args = args
+        self.result = None
+        self.error = None
+        self.context = None
+
+    def run(self):
+        try:
+            if self.context is not None:
+                self.result = self.context.run(self.function, *self.args)
+            else:
+                self.result = self.function(*self.args)
+        except BaseException as e:
+            self.error = e
+        finally:
+            _slots.release()
+
+
+def fetch_all(**requests):
+    """Run name=(function, *args) requests concurrently; returns {name: result} once all finish.
+
+    The first request, and any that find every slot taken, run on the
+    calling thread rather than queueing. The script's context is attached
+    to each fetch thread so data functions can still report with st.error.
+    An exception from any request is re-raised after all have finished.
+    """
+    inline, threads = [], []
+    for index, (name, (function, *args)) in enumerate(requests.items()):
+        if index and _slots.acquire(blocking=False):
+            thread = add_script_run_ctx(_Fetch(name, function, args))
+            # The run being recorded in metrics is charged for the thread's queries too
+            thread.context = contextvars.copy_context()
+            try:
+                thread.start()
+            except BaseException:
+                _slots.release()
+                raise
+            threads.append(thread)
+        else:
+            inline.append((name, function, args))
+
+    results = {}
+    try:
+        for name, function, args in inline:
+            results[name] = function(*args)
+    finally:
+        for thread in threads:
+            thread.join()
+
+    for thread in threads:
+        if thread.error is not None:
+            raise thread.error
+        results[thread.fetch_name] = thread.result
+    return results
+
+
+def prefetch(loader, user_id, *args):
+    """Load vitals_cache's entry for loader(user_id, *args) in the background; returns whether it started.
+
+    Best effort: skipped when the entry is already cached or every slot is
+    busy, and a failed load is dropped, since the rerun that needs the
+    result will load it again.
+    """
+    if vitals_cache.peek(loader, user_id, *args) is not None:
+        return False
+    if not _slots.acquire(blocking=False):
+        return False
+    thread = _Fetch(f"prefetch-{loader.__name__}", vitals_cache.get_or_load, (loader, user_id, *args))
+    try:
+        thread.start()
+    except BaseException:
+        _slots.release()
+        raise
+    return True
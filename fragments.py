@@ -0,0 +1,20 @@
+"""Partial reruns for page regions wrapped in @st.fragment.
+
+A click inside a fragment normally reruns just that fragment, skipping
+login.main, the sidebar and every other region's queries. Handlers call
+rerun() here instead of st.rerun() to stay within it.
+"""
+import streamlit as st #type: ignore
+from streamlit.errors import StreamlitAPIException #type: ignore
+
+
+def rerun():
+    """Rerun the enclosing fragment; the whole app when this run is not a fragment rerun.
+
+    Streamlit runs a fragment's widgets as part of a full run when one is
+    already pending, and only accepts scope="fragment" during fragment reruns.
+    """
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
@@ -1,142 +1,85 @@
 import streamlit as st #type: ignore
-import mysql.connector #type: ignore
-from mysql.connector import Error #type: ignore
 
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
 
-import random
-import numpy as np #type: ignore
+from db import connect, create_connection, Error
+from cache import vitals_cache
+from queries import named_queries, vitals_upsert
+from fetch import fetch_all, prefetch
+from vital_series import VITAL_BOUNDS
+import importer
+import exporter
+import rollups
+import fragments
+import metrics
+import sessions
+import styles
 
 
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'vital_signs_db',
-    'user': 'root',
-    'password': '1234'
-}
+# Vital records per page in the History tab
+HISTORY_PAGE_SIZE = 10
 
-def create_connection():
-    """Create database connection"""
+@metrics.traced
+def get_latest_heart_results(user_id):
+    """Get latest heart results from vital_results table"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
+        return vitals_cache.get_or_load(_fetch_latest_heart_results, user_id)
     except Error as e:
-        st.error(f"Error connecting to database: {e}")
-        return None
+        st.error(f"Error fetching heart results: {e}")
+    return None
 
-def create_vital_results_table():
-    """Create vital_results table if it doesn't exist"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        
-        # Create vital_results table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS vital_results (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT NOT NULL,
-            date_recorded DATE NOT NULL,
-            systolic_bp INT,
-            diastolic_bp INT,
-            heart_rate INT,
-            temperature DECIMAL(4,1),
-            glucose_level INT,
-            blood_status VARCHAR(20),
-            water_balance INT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-        """)
-        
-        connection.commit()
-        cursor.close()
+def _fetch_latest_heart_results(user_id):
+    connection = connect()
+    try:
+        return named_queries.fetchone(connection, 'latest_heart_results', (user_id,))
+    finally:
         connection.close()
-        return True
-    return False
 
-def get_latest_heart_results(user_id):
-    """Get latest heart results from vital_results table"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        try:
-            cursor.execute("""
-            SELECT blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, date_recorded
-            FROM vital_results WHERE user_id = %s ORDER BY date_recorded DESC LIMIT 1
-            """, (user_id,))
-            
-            result = cursor.fetchone()
-            cursor.close()
-            connection.close()
-            return result
-        except Error as e:
-            st.error(f"Error fetching heart results: {e}")
-            cursor.close()
-            connection.close()
-    return None
+@metrics.traced
+def get_vital_history_page(user_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """One page of complete vital records, newest first, as (records, next_before).
 
-def get_heart_history(user_id, days=30):
-    """Get heart history from vital_results table"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        try:
-            cursor.execute("""
-            SELECT blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, date_recorded
-            FROM vital_results 
-            WHERE user_id = %s AND date_recorded >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
-            ORDER BY date_recorded DESC
-            """, (user_id, days))
-            
-            records = cursor.fetchall()
-            cursor.close()
-            connection.close()
-            return records
-        except Error as e:
-            st.error(f"Error fetching heart history: {e}")
-            cursor.close()
-            connection.close()
-    return []
+    before is the (date_recorded, id) the page starts below, or None for the
+    newest; next_before is the following page's, or None on the last page.
+    """
+    try:
+        return vitals_cache.get_or_load(_fetch_vital_history_page, user_id, before, limit)
+    except Error as e:
+        st.error(f"Error fetching vital history: {e}")
+    return [], None
 
-def get_complete_vital_record(user_id, date_recorded):
-    """Get temperature and water_balance for a specific date"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        try:
-            cursor.execute("""
-            SELECT temperature, water_balance
-            FROM vital_results 
-            WHERE user_id = %s AND date_recorded = %s
-            LIMIT 1
-            """, (user_id, date_recorded))
-            
-            result = cursor.fetchone()
-            cursor.close()
-            connection.close()
-            return result
-        except Error as e:
-            st.error(f"Error fetching complete vital record: {e}")
-            cursor.close()
-            connection.close()
-    return None
+def _fetch_vital_history_page(user_id, before, limit):
+    connection = connect()
+    try:
+        # Keyset pagination: a range scan on (user_id, date_recorded) however old the page
+        if before is None:
+            records = named_queries.fetchall(connection, 'vital_history_first_page', (user_id, limit + 1))
+        else:
+            day, record_id = before
+            records = named_queries.fetchall(connection, 'vital_history_next_page', (user_id, day, day, record_id, limit + 1))
+        if len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        return records, (records[-1][8], records[-1][0])
+    finally:
+        connection.close()
 
+@metrics.traced
 def save_heart_results(user_id, blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, water_balance, temperature):
-    """Save heart results to vital_results table"""
+    """Save today's heart results to vital_results, replacing any saved earlier today"""
     connection = create_connection()
     if connection:
         cursor = connection.cursor()
         try:
-            cursor.execute("""
-            INSERT INTO vital_results (user_id, blood_status, heart_rate, systolic_bp, diastolic_bp, 
-            glucose_level, water_balance, temperature, date_recorded)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (user_id, blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, 
-                 water_balance, temperature, date.today()))
+            # In VITALS_COLUMNS order
+            cursor.execute(vitals_upsert(), (user_id, date.today(), systolic_bp, diastolic_bp, heart_rate,
+                                             temperature, glucose_level, blood_status, water_balance))
+            rollups.refresh_dates(cursor, user_id, date.today())
             
             connection.commit()
             cursor.close()
             connection.close()
+            vitals_cache.invalidate_user(user_id)
             return True
         except Error as e:
             st.error(f"Error saving heart results: {e}")
@@ -144,32 +87,15 @@ def save_heart_results(user_id, blood_status, heart_rate, systolic_bp, diastolic
             connection.close()
     return False
 
-def get_vital_record_by_date(user_id, date_recorded):
-    """Get vital record for a specific date"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        try:
-            cursor.execute("""
-            SELECT id, blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, 
-            water_balance, temperature, date_recorded
-            FROM vital_results 
-            WHERE user_id = %s AND date_recorded = %s
-            LIMIT 1
-            """, (user_id, date_recorded))
-            
-            result = cursor.fetchone()
-            cursor.close()
-            connection.close()
-            return result
-        except Error as e:
-            st.error(f"Error fetching vital record: {e}")
-            cursor.close()
-            connection.close()
-    return None
+def record_date(cursor, user_id, record_id):
+    """date_recorded of one of the user's records, or None"""
+    cursor.execute("SELECT date_recorded FROM vital_results WHERE id = %s AND user_id = %s", (record_id, user_id))
+    row = cursor.fetchone()
+    return row[0] if row else None
 
-def update_vital_record(record_id, blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, water_balance, temperature):
-    """Update vital record"""
+@metrics.traced
+def update_vital_record(user_id, record_id, blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, water_balance, temperature):
+    """Update one of the user's vital records"""
     connection = create_connection()
     if connection:
         cursor = connection.cursor()
@@ -177,13 +103,15 @@ def update_vital_record(record_id, blood_status, heart_rate, systolic_bp, diasto
             cursor.execute("""
             UPDATE vital_results SET blood_status=%s, heart_rate=%s, systolic_bp=%s, 
             diastolic_bp=%s, glucose_level=%s, water_balance=%s, temperature=%s
-            WHERE id = %s
+            WHERE id = %s AND user_id = %s
             """, (blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, 
-                 water_balance, temperature, record_id))
+                 water_balance, temperature, record_id, user_id))
+            rollups.refresh_dates(cursor, user_id, record_date(cursor, user_id, record_id))
             
             connection.commit()
             cursor.close()
             connection.close()
+            vitals_cache.invalidate_user(user_id)
             return True
         except Error as e:
             st.error(f"Error updating vital record: {e}")
@@ -191,16 +119,20 @@ def update_vital_record(record_id, blood_status, heart_rate, systolic_bp, diasto
             connection.close()
     return False
 
-def delete_vital_record(record_id):
-    """Delete vital record"""
+@metrics.traced
+def delete_vital_record(user_id, record_id):
+    """Delete one of the user's vital records"""
     connection = create_connection()
     if connection:
         cursor = connection.cursor()
         try:
-            cursor.execute("DELETE FROM vital_results WHERE id = %s", (record_id,))
+            day = record_date(cursor, user_id, record_id)
+            cursor.execute("DELETE FROM vital_results WHERE id = %s AND user_id = %s", (record_id, user_id))
+            rollups.refresh_dates(cursor, user_id, day)
             connection.commit()
             cursor.close()
             connection.close()
+            vitals_cache.invalidate_user(user_id)
             return True
         except Error as e:
             st.error(f"Error deleting vital record: {e}")
@@ -208,311 +140,6 @@ def delete_vital_record(record_id):
             connection.close()
     return False
 
-def generate_heart_sample_data(user_id):
-    """Generate sample heart data for demo"""
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        
-        try:
-            # Checks if vital_results  exists
-            cursor.execute("SELECT COUNT(*) FROM vital_results WHERE user_id = %s", (user_id,))
-            results_count = cursor.fetchone()[0]
-            
-            if results_count == 0:
-                for i in range(4):
-                    date_record = date.today() - timedelta(days=3-i)
-                    systolic = random.randint(110, 130)
-                    diastolic = random.randint(70, 85)
-                    blood_status = f"{systolic}/{diastolic}"
-                    heart_rate = random.randint(110, 130)
-                    glucose_level = random.randint(155, 170)
-                    water_balance = random.randint(3, 8)
-                    temperature = round(random.uniform(36.0, 37.5), 1)
-                    
-                    cursor.execute("""
-                    INSERT INTO vital_results (user_id, blood_status, heart_rate, systolic_bp, diastolic_bp,
-                    glucose_level, water_balance, temperature, date_recorded)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (user_id, blood_status, heart_rate, systolic, diastolic, glucose_level, 
-                         water_balance, temperature, date_record))
-                         
-            connection.commit()
-
-        except Error as e:
-            st.error(f"Error generating heart sample data: {e}")
-        finally:
-            cursor.close()
-            connection.close()
-
-def load_heart_css():
-    """Load custom CSS for heart page"""
-    """Load custom CSS for dashboard"""
-    st.markdown("""
-    <style>
-    /* Main dashboard background */
-    .stApp {
-        background: #f8fafc !important;
-    }
-                
-    /* Global heading colors - make all black */
-    h1, h2, h3, h4, h5, h6,
-    .stSubheader,
-    [data-testid="stSubheader"] {
-        color: black !important;
-    }
-                
-    /* Make input labels black */
-    .stTextInput label,
-    .stNumberInput label,
-    .stSelectbox label,
-    label {
-        color: black !important;
-        font-weight: 500 !important;
-    }
-
-    /* Also target the label text specifically */
-    .stTextInput > label > div,
-    .stNumberInput > label > div,
-    .stSelectbox > label > div {
-        color: black !important;
-    }
-
-    /* Target Streamlit's label spans */
-    [data-testid="stWidgetLabel"] {
-        color: black !important;
-    }
-
-    /* Make sure placeholder text is visible but lighter */
-    .stTextInput input::placeholder,
-    .stNumberInput input::placeholder {
-        color: #64748b !important;
-    }
-                
-    /* Sidebar styling */
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #07635b 0%, #0a4d47 100%) !important;
-    }
-    
-    [data-testid="stSidebar"] * {
-        color: white !important;
-    }
-    
-    /* Sidebar buttons */
-    [data-testid="stSidebar"] .stButton > button {
-        background: rgba(255, 255, 255, 0.1) !important;
-        color: white !important;
-        border: 1px solid rgba(255, 255, 255, 0.2) !important;
-        border-radius: 50px !important;
-        padding: 12px 20px !important;
-        font-size: 1rem !important;
-        font-weight: 500 !important;
-        width: 100% !important;
-        transition: all 0.3s ease !important;
-        margin: 5px 0 !important;
-    }
-    
-    [data-testid="stSidebar"] .stButton > button:hover {
-        background: rgba(255, 255, 255, 0.2) !important;
-        transform: translateX(5px) !important;
-    }
-    
-    /* Main content buttons - Dashboard, Heart, Medications pages */
-    .main .stButton > button {
-        background: linear-gradient(135deg, #17a2b8, #138496) !important;
-        color: white !important;
-        border: none !important;
-        padding: 12px 24px !important;
-        border-radius: 10px !important;
-        font-size: 0.95rem !important;
-        font-weight: 600 !important;
-        transition: all 0.3s ease !important;
-        box-shadow: 0 2px 8px rgba(23, 162, 184, 0.3) !important;
-    }
-    
-    .main .stButton > button:hover {
-        background: linear-gradient(135deg, #138496, #117a8b) !important;
-        transform: translateY(-2px) !important;
-        box-shadow: 0 4px 12px rgba(23, 162, 184, 0.4) !important;
-    }
-    
-    /* Deploy Bar Color */
-    .est0q592 {
-        background: #17a2b8 !important;
-    }
-    
-    
-    /* Metrics cards */
-    .metric-card {
-        background: white !important;
-        border-radius: 16px !important;
-        padding: 1.5rem !important;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1) !important;
-        border: 1px solid #e2e8f0 !important;
-        transition: transform 0.2s ease, box-shadow 0.2s ease !important;
-        margin-bottom: 20px !important;
-        min-height: 100px !important;
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15) !important;
-    }
-    
-    .metric-card.heart-rate {
-        border-left: 4px solid #ef4444 !important;
-        
-    }
-    
-    .metric-card.temperature {
-        border-left: 4px solid #06b6d4 !important;
-        
-    }
-    
-    .metric-card.blood-pressure {
-        border-left: 4px solid #262657 !important;
-    }
-    
-    .metric-card.glucose {
-        border-left: 4px solid #eab308 !important;
-        
-    }
-    
-    .metric-card.water {
-        border-left: 4px solid #262657 !important;
-    }
-    
-    .metric-card.blood-status {
-        border-left: 4px solid #eab308  !important;
-        
-    }
-    
-    .metric-card.glucose-level {
-        border-left: 4px solid #eab308 !important;
-        
-    }
-    
-    .metric-card.waterbalance {
-        min-height: 100px !important;
-        border-left: 4px solid #262657 !important;
-    }
-    
-    .metric-card.medication-card {
-        border-left: 4px solid #3b82f6 !important;
-        
-    }
-                
-    .metric-header {
-        display: flex;
-        align-items: center;
-        margin-bottom: 0.5rem;
-    }
-    
-    .metric-icon {
-        font-size: 1.5rem;
-        margin-right: 8px;
-    }
-    
-    .metric-title {
-        color: black !important;
-        font-size: 1.5rem !important;
-        margin: 0 !important;
-    }
-    
-    .metric-value {
-        font-size: 1.75rem !important;
-        font-weight: 600 !important;
-        color: #1e293b !important;
-        margin: 0.25rem 0 !important;
-    }
-
-    .metric-subtitle {
-        color: #64748b !important;
-        font-size: 0.8rem !important;
-        margin: 0 !important;
-    }
-    
-    .metric-subtitle.water {
-        color: #64748b !important;
-        font-size: 1.25rem !important;
-        margin: 0 !important;
-    }
-    
-    .metric-detail {
-        color: #64748b !important;
-        font-size: 0.875rem !important;
-        margin: 0.25rem 0 !important;
-    }
-    
-    .divider-line {
-        height: 1px;   
-        background: #64748b;  
-        margin: 0.5rem 0;        
-    }
-    
-
-                
-    /* Form sections */
-    .form-section {
-        margin-bottom: 1.5rem;
-    }
-    
-    .stTextInput > div > div > input:focus,
-    .stNumberInput > div > div > input:focus,
-    .stSelectbox > div > div > select:focus {
-        border-color: #17a2b8 !important;
-        box-shadow: 0 0 0 3px rgba(23, 162, 184, 0.1) !important;
-    }
-    
-    /* Tab/Navigation buttons in Heart page */
-    div[data-testid="column"] > div > div > div > div > button {
-        background: #f8fafc !important;
-        color: #64748b !important;
-        border: 1px solid #e2e8f0 !important;
-        border-radius: 25px !important;
-        padding: 12px 24px !important;
-        font-weight: 500 !important;
-        transition: all 0.2s ease !important;
-    }
-    
-    .form-section h4 {
-        color: #2c3e50 !important;
-        font-size: 1.1rem !important;
-        margin-bottom: 1rem !important;
-        padding-bottom: 0.5rem !important;
-        border-bottom: 2px solid #4ECDC4 !important;
-        font-weight: 600 !important;
-    }
-    
-    
-    /* Input fields styling */
-    .stTextInput > div > div > input,
-    .stNumberInput > div > div > input,
-    .stSelectbox > div > div > select {
-        border-radius: 8px !important;
-        border: 1px solid #e2e8f0 !important;
-        padding: 10px 12px !important;
-    }
-    
-    div[data-testid="column"] > div > div > div > div > button:hover {
-        background: #17a2b8 !important;
-        color: white !important;
-        border-color: #17a2b8 !important;
-    }
-    
-    /* Mobile responsive */
-    @media (max-width: 768px) {
-        .main-content {
-            padding: 0 1rem;
-        }
-        
-        .metrics-grid {
-            grid-template-columns: 1fr;
-        }
-    }
-    </style>
-    """, unsafe_allow_html=True)
-    
 def show_edit_vital_form(record_data):
     """Show edit form for vital record"""
     record_id, blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, water_balance, temperature, date_recorded = record_data
@@ -523,31 +150,31 @@ def show_edit_vital_form(record_data):
     
     with col1:
         new_blood_status = st.text_input("Blood Status", value=blood_status, key="edit_blood_status")
-        new_heart_rate = st.number_input("Heart Rate (BPM)", min_value=40, max_value=200, value=heart_rate, key="edit_heart_rate")
-        new_water_balance = st.number_input("Water Balance", min_value=1, max_value=50, value=water_balance, key="edit_water_balance")
+        new_heart_rate = st.number_input("Heart Rate (BPM)", min_value=VITAL_BOUNDS['heart_rate'][0], max_value=VITAL_BOUNDS['heart_rate'][1], value=heart_rate, key="edit_heart_rate")
+        new_water_balance = st.number_input("Water Balance", min_value=VITAL_BOUNDS['water_balance'][0], max_value=VITAL_BOUNDS['water_balance'][1], value=water_balance, key="edit_water_balance")
     
     with col2:
-        new_systolic_bp = st.number_input("Systolic BP", min_value=80, max_value=200, value=systolic_bp, key="edit_systolic")
-        new_diastolic_bp = st.number_input("Diastolic BP", min_value=40, max_value=120, value=diastolic_bp, key="edit_diastolic")
-        new_glucose_level = st.number_input("Glucose Level", min_value=50, max_value=300, value=glucose_level, key="edit_glucose")
-        new_temperature = st.number_input("Temperature (°C)", min_value=30.0, max_value=45.0, value=float(temperature), step=0.1, key="edit_temperature")
+        new_systolic_bp = st.number_input("Systolic BP", min_value=VITAL_BOUNDS['systolic_bp'][0], max_value=VITAL_BOUNDS['systolic_bp'][1], value=systolic_bp, key="edit_systolic")
+        new_diastolic_bp = st.number_input("Diastolic BP", min_value=VITAL_BOUNDS['diastolic_bp'][0], max_value=VITAL_BOUNDS['diastolic_bp'][1], value=diastolic_bp, key="edit_diastolic")
+        new_glucose_level = st.number_input("Glucose Level", min_value=VITAL_BOUNDS['glucose_level'][0], max_value=VITAL_BOUNDS['glucose_level'][1], value=glucose_level, key="edit_glucose")
+        new_temperature = st.number_input("Temperature (°C)", min_value=VITAL_BOUNDS['temperature'][0], max_value=VITAL_BOUNDS['temperature'][1], value=float(temperature), step=0.1, key="edit_temperature")
     
     col_save, col_cancel = st.columns(2)
     
     with col_save:
         if st.button("Save Changes", key="save_vital_changes", type="primary"):
-            if update_vital_record(record_id, new_blood_status, new_heart_rate, new_systolic_bp, 
+            if update_vital_record(st.session_state.user_id, record_id, new_blood_status, new_heart_rate, new_systolic_bp, 
                                  new_diastolic_bp, new_glucose_level, new_water_balance, new_temperature):
                 st.success("Record updated successfully!")
                 st.session_state.edit_vital_mode = False
-                st.rerun()
+                fragments.rerun()
             else:
                 st.error("Failed to update record")
     
     with col_cancel:
         if st.button("Cancel", key="cancel_vital_edit"):
             st.session_state.edit_vital_mode = False
-            st.rerun()
+            fragments.rerun()
 
 def show_delete_vital_confirmation(record_data):
     
@@ -560,25 +187,24 @@ def show_delete_vital_confirmation(record_data):
     
     with col_delete:
         if st.button("Delete Record", key="confirm_vital_delete", disabled=not confirm_delete, type="primary"):
-            if delete_vital_record(record_id):
+            if delete_vital_record(st.session_state.user_id, record_id):
                 st.success("Record deleted successfully!")
                 st.session_state.delete_vital_mode = False
-                st.rerun()
+                fragments.rerun()
             else:
                 st.error("Failed to delete record")
     
     with col_cancel:
         if st.button("Cancel", key="cancel_vital_delete"):
             st.session_state.delete_vital_mode = False
-            st.rerun()
+            fragments.rerun()
 
+@metrics.traced
 def heart_results_tab():
     """Heart Results Tab Content"""
-    # sample data
-    generate_heart_sample_data(st.session_state.user_id)
-    
     # latest results
-    results = get_latest_heart_results(st.session_state.user_id)
+    data = fetch_all(results=(get_latest_heart_results, st.session_state.user_id))
+    results = data['results']
     
     if results:
         blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, date_recorded = results
@@ -643,6 +269,7 @@ def heart_results_tab():
 
 
 
+@metrics.traced
 def heart_diagnosis_tab():
     
     
@@ -650,14 +277,14 @@ def heart_diagnosis_tab():
     
     with col1:
         blood_status = st.text_input("Blood Status (e.g., 120/80)", placeholder="Enter blood pressure", key="diag_blood_status")
-        heart_rate = st.number_input("Heart Rate (BPM)", min_value=40, max_value=200, value=75, key="diag_heart_rate")
-        water_balance = st.number_input("How many glasses of water have you drank today?", min_value=1, max_value=50)
+        heart_rate = st.number_input("Heart Rate (BPM)", min_value=VITAL_BOUNDS['heart_rate'][0], max_value=VITAL_BOUNDS['heart_rate'][1], value=75, key="diag_heart_rate")
+        water_balance = st.number_input("How many glasses of water have you drank today?", min_value=VITAL_BOUNDS['water_balance'][0], max_value=VITAL_BOUNDS['water_balance'][1])
     
     with col2:
-        systolic_bp = st.number_input("Systolic BP", min_value=80, max_value=200, value=120, key="diag_systolic")
-        diastolic_bp = st.number_input("Diastolic BP", min_value=40, max_value=120, value=80, key="diag_diastolic")
-        glucose_level = st.number_input("Glucose Level (/ml)", min_value=50, max_value=300, value=100, key="diag_glucose")
-        temperature = st.number_input("Temperature (°C)", min_value=30.0, max_value=45.0, value=36.8, step=0.1)
+        systolic_bp = st.number_input("Systolic BP", min_value=VITAL_BOUNDS['systolic_bp'][0], max_value=VITAL_BOUNDS['systolic_bp'][1], value=120, key="diag_systolic")
+        diastolic_bp = st.number_input("Diastolic BP", min_value=VITAL_BOUNDS['diastolic_bp'][0], max_value=VITAL_BOUNDS['diastolic_bp'][1], value=80, key="diag_diastolic")
+        glucose_level = st.number_input("Glucose Level (/ml)", min_value=VITAL_BOUNDS['glucose_level'][0], max_value=VITAL_BOUNDS['glucose_level'][1], value=100, key="diag_glucose")
+        temperature = st.number_input("Temperature (°C)", min_value=VITAL_BOUNDS['temperature'][0], max_value=VITAL_BOUNDS['temperature'][1], value=36.8, step=0.1)
 
     
     
@@ -671,37 +298,77 @@ def heart_diagnosis_tab():
                     st.success("✅ Results saved successfully!")
                     st.balloons()
                     
-                    st.rerun()
+                    fragments.rerun()
                 else:
                     st.error("❌ Failed to save results")
             else:
                 st.error("⚠️ Please fill in all required fields")
     
     st.markdown('</div>', unsafe_allow_html=True)
+    
+    heart_import_section()
 
+def heart_import_section():
+    """Bulk import of readings from a device export"""
+    with st.expander("Import readings from a file"):
+        st.caption("CSV, JSON or JSON Lines with date_recorded, systolic_bp, diastolic_bp, heart_rate, "
+                   "glucose_level, temperature and water_balance columns. Days you already have are replaced.")
+        upload = st.file_uploader("Device export", type=["csv", "json", "jsonl", "ndjson"], key="vitals_import_file")
+        
+        if upload and st.button("Import", key="vitals_import_btn"):
+            status = st.empty()
+            
+            def show(report):
+                status.info(f"{report['rows_read']:,} rows read, {report['imported']:,} imported...")
+            
+            try:
+                report = importer.import_file(upload, importer.file_format(upload.name),
+                                              user_id=st.session_state.user_id, progress=show)
+            except ValueError as e:
+                status.error(f"❌ Could not read the file: {e}")
+            except Error as e:
+                status.error(f"❌ Import failed: {e}")
+            else:
+                status.success(f"✅ Imported {report['imported']:,} readings in {report['seconds']:.1f}s "
+                               f"({report['rows_per_sec']:,.0f} rows/s); {report['duplicates']:,} repeated days merged, "
+                               f"{report['rejected']:,} rows rejected")
+                for column, count in sorted(report['rejected_by_column'].items()):
+                    st.caption(f"{count:,} rows with a missing or out-of-range {column}")
+
+@st.fragment
+@metrics.rerun_entry
 def heart_history_tab():
-    """Updated heart history tab with edit and delete functionality"""
+    """History browser with edit and delete; its buttons rerun only this tab"""
     # Initialize modes
     if 'edit_vital_mode' not in st.session_state:
         st.session_state.edit_vital_mode = False
     if 'delete_vital_mode' not in st.session_state:
         st.session_state.delete_vital_mode = False
-    if 'selected_vital_date' not in st.session_state:
-        st.session_state.selected_vital_date = None
+    # Start of each page visited so far; the last one is on screen
+    if 'history_page_starts' not in st.session_state:
+        st.session_state.history_page_starts = [None]
+    user_id = st.session_state.user_id
+
+    # Only the page on screen is read; the next one loads in the background
+    results_history, next_before = get_vital_history_page(user_id, st.session_state.history_page_starts[-1])
+    if next_before is not None:
+        prefetch(_fetch_vital_history_page, user_id, next_before, HISTORY_PAGE_SIZE)
+
+    col1, col2, col3 = st.columns([1, 2, 2])
+    with col2:
+        history_page_buttons(next_before)
+    with col3:
+        history_jump()
 
-    
-    results_history = get_heart_history(st.session_state.user_id, 30)
-    
     if results_history:
-        date_options = [r[5] for r in results_history]  # date_recorded is at index 5
+        date_options = list(dict.fromkeys(r[8] for r in results_history))  # date_recorded is at index 8
         
-        col1, col2, col3 = st.columns([1, 2, 2])
         with col1:
             selected_date = st.selectbox("Choose date", date_options, index=0, key="history_date_select")
-            st.session_state.selected_vital_date = selected_date
         
-        # complete record for selected date
-        vital_record = get_vital_record_by_date(st.session_state.user_id, selected_date)
+        # Filter results for selected date
+        filtered_results = [r for r in results_history if r[8] == selected_date]
+        vital_record = filtered_results[0] if filtered_results else None
         
         # Show edit or delete forms if in those modes
         if st.session_state.edit_vital_mode and vital_record:
@@ -710,11 +377,8 @@ def heart_history_tab():
             show_delete_vital_confirmation(vital_record)
         else:
             # Normal display mode
-            # Filter results for selected date
-            filtered_results = [r for r in results_history if r[5] == selected_date]
-
             for result in filtered_results:
-                blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, date_recorded = result
+                record_id, blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, water_balance, temperature, date_recorded = result
                 blood_count = f"{diastolic_bp}-{systolic_bp}"
                 st.markdown("---")
 
@@ -765,13 +429,10 @@ def heart_history_tab():
             
                 st.markdown("---")
                 
-                
-                temp_water_result = get_complete_vital_record(st.session_state.user_id, date_recorded)
-                
-                if temp_water_result:
-                    temperature, water_balance = temp_water_result
-                else:
-                    temperature, water_balance = 36.8, 3
+                if temperature is None:
+                    temperature = 36.8
+                if water_balance is None:
+                    water_balance = 3
                 
                 temp, water = st.columns(2)
                 with temp:
@@ -803,50 +464,96 @@ def heart_history_tab():
             with col_edit:
                 if st.button("Edit Record", key="edit_vital_record", type="primary"):
                     st.session_state.edit_vital_mode = True
-                    st.rerun()
+                    fragments.rerun()
             
             with col_delete:
                 if st.button("Delete Record", key="delete_vital_record", type="secondary"):
                     st.session_state.delete_vital_mode = True
-                    st.rerun()
+                    fragments.rerun()
 
     else:
         st.info("No results history found.")
     
     st.markdown("---")
+    heart_export_section()
+
+def history_page_buttons(next_before):
+    """Newer/older buttons over the History tab's pages"""
+    starts = st.session_state.history_page_starts
+    col_newer, col_older = st.columns(2)
+    with col_newer:
+        if st.button("← Newer", key="history_page_newer", disabled=len(starts) == 1, width="stretch"):
+            starts.pop()
+            fragments.rerun()
+    with col_older:
+        if st.button("Older →", key="history_page_older", disabled=next_before is None, width="stretch"):
+            starts.append(next_before)
+            fragments.rerun()
+
+def history_jump():
+    """Go straight to the records on or before a date"""
+    col_date, col_go = st.columns([2, 1])
+    with col_date:
+        day = st.date_input("Jump to", value=date.today(), max_value=date.today(), key="history_jump_date",
+                            label_visibility="collapsed")
+    with col_go:
+        if st.button("Go", key="history_jump_go", width="stretch"):
+            # Below (day + 1, 0) is everything recorded on or before day; Newer returns to the latest
+            st.session_state.history_page_starts = [None, (day + timedelta(days=1), 0)]
+            fragments.rerun()
+
+def heart_export_section():
+    """Download of the user's full history"""
+    col_format, col_download = st.columns([1, 2])
+    with col_format:
+        fmt = st.radio("Export format", ["csv", "parquet"], horizontal=True, key="history_export_format",
+                       format_func=str.upper)
+    with col_download:
+        user_id = st.session_state.user_id
+        # The export only runs when the button is clicked, streamed into a temporary file
+        st.download_button(
+            "Export full history",
+            data=lambda: exporter.export_user_vitals(user_id, fmt),
+            file_name=f"vital-history-{date.today().isoformat()}.{fmt}",
+            mime=exporter.FORMATS[fmt],
+            on_click="ignore",
+            key="history_export_btn",
+        )
 
 
+@metrics.traced
 def run_heart_page():
     """Main function to run the heart page"""
-    # Create vital_results table
-    create_vital_results_table()
-    
-    # Load CSS
-    load_heart_css()
+    # Style bundle is sent once per session, not on every rerun
+    styles.inject('heart')
     
     # Initialize heart tab in session state if not exists
     if 'heart_tab' not in st.session_state:
         st.session_state.heart_tab = 'Results'
     
-    
-    
+    heart_tabs()
+
+@st.fragment
+@metrics.rerun_entry
+def heart_tabs():
+    """Tab buttons and the selected tab; switching tabs reruns only this fragment"""
     # Tab navigation buttons
     col1, col2, col3 = st.columns(3)
     
     with col1:
         if st.button("Results", key="heart_results_btn", use_container_width=True):
             st.session_state.heart_tab = 'Results'
-            st.rerun()
+            fragments.rerun()
     
     with col2:
         if st.button("History", key="heart_history_btn", use_container_width=True):
             st.session_state.heart_tab = 'History'
-            st.rerun()
+            fragments.rerun()
     
     with col3:
         if st.button("Diagnosis", key="heart_diagnosis_btn", use_container_width=True):
             st.session_state.heart_tab = 'Diagnosis'
-            st.rerun()
+            fragments.rerun()
     
     
     
@@ -861,6 +568,8 @@ def run_heart_page():
         heart_diagnosis_tab()
     
     st.markdown('</div>', unsafe_allow_html=True)
+    # login.main saves the session at the end of full runs only
+    sessions.save()
 
 # If running this file directly
 if __name__ == "__main__":
@@ -0,0 +1,233 @@
+"""Bulk import of vital readings from device exports.
+
+    python importer.py readings.csv --user-id 42
+    python importer.py export.jsonl                 # rows carry their own user_id
+
+Files need date_recorded (ISO 8601) plus the six metric columns;
+blood_status is optional and defaults to "<systolic>/<diastolic>". CSV
+and JSON Lines are streamed in chunks, so memory stays flat however large
+the file is; a plain JSON array has to be read whole. Each chunk is
+range-checked against the diagnosis form's bounds and upserted on
+(user_id, date_recorded) in one transaction, as the diagnosis form saves:
+the last reading of a day in the file wins, and replaces the day's stored
+reading if there is one.
+"""
+import numpy as np #type: ignore
+import pandas as pd #type: ignore
+
+import argparse
+import os
+import time
+
+from db import connect
+from cache import vitals_cache
+from queries import vitals_upsert
+from vital_series import VITAL_BOUNDS
+import rollups
+
+
+CHUNK_ROWS = 20000   # rows validated and committed together
+BATCH_ROWS = 5000    # rows per multi-row upsert
+FORMATS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+INTEGER_COLUMNS = ['systolic_bp', 'diastolic_bp', 'heart_rate', 'glucose_level', 'water_balance']
+
+# (user_id, day) packed into one int64 so dedupe runs on NumPy arrays
+_DAY_SPAN = 1_000_000
+_EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def file_format(name):
+    """Import format for a file name, from its extension"""
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported file type {extension or name!r}; expected CSV, JSON or JSON Lines")
+    return FORMATS[extension]
+
+def read_chunks(source, fmt, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames of at most chunk_rows rows from a path or file object"""
+    if fmt == 'csv':
+        yield from pd.read_csv(source, chunksize=chunk_rows)
+    elif fmt == 'jsonl':
+        yield from pd.read_json(source, lines=True, chunksize=chunk_rows)
+    else:
+        frame = pd.read_json(source)
+        for start in range(0, len(frame), chunk_rows):
+            yield frame.iloc[start:start + chunk_rows]
+
+def validate(chunk, user_id=None):
+    """Coerce types and apply VITAL_BOUNDS; returns (valid rows, {failed column: rows})
+
+    A fixed user_id overrides any user_id column in the file.
+    """
+    required = ['date_recorded', *VITAL_BOUNDS] + ([] if user_id is not None else ['user_id'])
+    missing = [column for column in required if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    frame = pd.DataFrame(index=chunk.index)
+    bad = pd.Series(False, index=chunk.index)
+    rejected = {}
+
+    def reject(column, mask):
+        nonlocal bad
+        if mask.any():
+            rejected[column] = int(mask.sum())
+            bad |= mask
+
+    if user_id is not None:
+        frame['user_id'] = np.int64(user_id)
+    else:
+        users = pd.to_numeric(chunk['user_id'], errors='coerce')
+        reject('user_id', users.isna() | (users <= 0) | (users != users.round()))
+        frame['user_id'] = users
+
+    dates = pd.to_datetime(chunk['date_recorded'], errors='coerce', format='ISO8601')
+    if getattr(dates.dt, 'tz', None) is not None:
+        dates = dates.dt.tz_localize(None)
+    reject('date_recorded', dates.isna())
+    frame['date_recorded'] = dates.dt.normalize()
+
+    for column, (low, high) in VITAL_BOUNDS.items():
+        values = pd.to_numeric(chunk[column], errors='coerce')
+        reject(column, values.isna() | (values < low) | (values > high))
+        frame[column] = values
+
+    frame = frame[~bad]
+    for column in INTEGER_COLUMNS:
+        frame[column] = frame[column].round().astype(np.int64)
+    frame['user_id'] = frame['user_id'].astype(np.int64)
+    frame['temperature'] = frame['temperature'].round(1)
+
+    derived = frame['systolic_bp'].astype(str) + '/' + frame['diastolic_bp'].astype(str)
+    if 'blood_status' in chunk.columns:
+        given = chunk.loc[frame.index, 'blood_status'].astype('string').str.strip().str.slice(0, 20)
+        frame['blood_status'] = given.mask(given.isna() | (given == ''), derived).astype(object)
+    else:
+        frame['blood_status'] = derived
+    return frame, rejected
+
+def day_keys(user_ids, dates):
+    """Pack (user_id, date) pairs into sortable int64 keys"""
+    days = (np.asarray(dates, dtype='datetime64[D]') - _EPOCH).astype(np.int64)
+    return np.asarray(user_ids, dtype=np.int64) * _DAY_SPAN + days
+
+def known_users(cursor, user_ids, cache):
+    """Subset of user_ids that exist, remembering answers in cache"""
+    unknown = [int(u) for u in user_ids if int(u) not in cache]
+    for start in range(0, len(unknown), 1000):
+        chunk = unknown[start:start + 1000]
+        cursor.execute(f"SELECT id FROM users WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        found = {row[0] for row in cursor.fetchall()}
+        cache.update({u: u in found for u in chunk})
+    return [u for u in user_ids if cache[int(u)]]
+
+def import_file(source, fmt, user_id=None, chunk_rows=CHUNK_ROWS, batch_rows=BATCH_ROWS, progress=None):
+    """Import a file of readings; returns counts and throughput.
+
+    Each chunk is committed on its own, so a failure part-way keeps the
+    chunks before it. Rollups are recomputed once at the end, including
+    after a failure, for each user over the dates they were sent.
+    progress, if given, is called with the running report after every chunk.
+    """
+    report = {'rows_read': 0, 'imported': 0, 'duplicates': 0, 'rejected': 0, 'rejected_by_column': {}}
+    users_exist = {}
+    touched = {}  # user id -> (first day, last day) of committed rows
+    started = time.perf_counter()
+
+    connection = connect()
+    cursor = connection.cursor()
+    try:
+        for chunk in read_chunks(source, fmt, chunk_rows):
+            report['rows_read'] += len(chunk)
+            frame, rejected = validate(chunk, user_id)
+
+            valid_users = known_users(cursor, frame['user_id'].unique().tolist(), users_exist)
+            unknown = ~frame['user_id'].isin(valid_users)
+            if unknown.any():
+                rejected['user_id'] = rejected.get('user_id', 0) + int(unknown.sum())
+                frame = frame[~unknown]
+            for column, count in rejected.items():
+                report['rejected_by_column'][column] = report['rejected_by_column'].get(column, 0) + count
+
+            if len(frame):
+                # Repeats across chunks need no check: the later chunk's upsert replaces the row
+                keys = day_keys(frame['user_id'], frame['date_recorded'])
+                last = ~pd.Series(keys).duplicated(keep='last').to_numpy()
+                report['duplicates'] += int((~last).sum())
+                frame = frame[last]
+
+            if len(frame):
+                rows = list(zip(
+                    frame['user_id'].tolist(),
+                    frame['date_recorded'].dt.date.tolist(),
+                    frame['systolic_bp'].tolist(),
+                    frame['diastolic_bp'].tolist(),
+                    frame['heart_rate'].tolist(),
+                    frame['temperature'].tolist(),
+                    frame['glucose_level'].tolist(),
+                    frame['blood_status'].tolist(),
+                    frame['water_balance'].tolist(),
+                ))
+                try:
+                    upsert = vitals_upsert()
+                    for start in range(0, len(rows), batch_rows):
+                        cursor.executemany(upsert, rows[start:start + batch_rows])
+                    connection.commit()
+                except BaseException:
+                    connection.rollback()
+                    raise
+                report['imported'] += len(rows)
+                spans = frame.groupby('user_id')['date_recorded'].agg(['min', 'max'])
+                for uid, first, last in zip(spans.index.tolist(), spans['min'].dt.date, spans['max'].dt.date):
+                    if uid in touched:
+                        first, last = min(first, touched[uid][0]), max(last, touched[uid][1])
+                    touched[uid] = (first, last)
+                    vitals_cache.invalidate_user(uid)
+
+            report['rejected'] = report['rows_read'] - report['imported'] - report['duplicates']
+            elapsed = time.perf_counter() - started
+            report['seconds'] = elapsed
+            report['rows_per_sec'] = report['rows_read'] / elapsed if elapsed else 0.0
+            if progress:
+                progress(report)
+    finally:
+        try:
+            # Once per user over their own dates: a per-chunk refresh spans every
+            # user in the chunk from its first date to its last, and repeats per chunk
+            if touched:
+                rollups.refresh_spans(cursor, touched)
+                connection.commit()
+                for uid in touched:
+                    vitals_cache.invalidate_user(uid)
+        finally:
+            cursor.close()
+            connection.close()
+
+    report['seconds'] = time.perf_counter() - started
+    report['rows_per_sec'] = report['rows_read'] / report['seconds'] if report['seconds'] else 0.0
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import vital readings from CSV, JSON or JSON Lines files")
+    parser.add_argument("paths", nargs="+", help="files to import")
+    parser.add_argument("--user-id", type=int, help="import every row for this account (default: the file's user_id column)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows validated and committed together")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="rows per multi-row upsert")
+    args = parser.parse_args()
+
+    def show(report):
+        print(f"\r  {report['rows_read']:,} read, {report['imported']:,} imported "
+              f"({report['rows_per_sec']:,.0f} rows/s)", end="", flush=True)
+
+    for path in args.paths:
+        print(path)
+        report = import_file(path, file_format(path), args.user_id, args.chunk_rows, args.batch_rows, show)
+        print(f"\n  {report['imported']:,} imported, {report['duplicates']:,} repeated days merged, "
+              f"{report['rejected']:,} rejected in {report['seconds']:.1f}s ({report['rows_per_sec']:,.0f} rows/s)")
+        for column, count in sorted(report['rejected_by_column'].items()):
+            print(f"    {count:,} rows with a missing or out-of-range {column}")
+
+
+if __name__ == "__main__":
+    main()
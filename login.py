@@ -1,18 +1,15 @@
 import streamlit as st #type: ignore
-import mysql.connector #type: ignore
-from mysql.connector import Error #type: ignore
-import hashlib
-import base64
 import time
 
-
-
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'vital_signs_db',
-    'user': 'root',
-    'password': '1234'
-}
+from db import create_connection, Error
+from queries import named_queries
+import migrations
+import assets
+import styles
+import seed
+import sessions
+import metrics
+from passwords import password_engine
 
 
 # Initialize session state
@@ -26,53 +23,14 @@ if 'current_page' not in st.session_state:
     st.session_state.current_page = 'login'
 
 
-def create_connection():
-    """Create database connection"""
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        st.error(f"Error connecting to database: {e}")
-        return None
-    
-def hash_password(password):
-    """Hash password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def create_user():
-    connection = create_connection()
-    if connection:
-        cursor = connection.cursor()
-        
-        # Create users table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(100) NOT NULL,
-            email VARCHAR(100) UNIQUE NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            age INT,
-            weight FLOAT,
-            height FLOAT,
-            blood_type VARCHAR(5),
-            allergies TEXT,
-            diseases TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-
-        connection.commit()
-        cursor.close()
-        connection.close()
-        return True
-    return False
-
+@metrics.traced
 def register_user(username, password, email, age, weight, height, blood_type, allergies, diseases):
     """Register a new user"""
+    # Hash before taking a connection so the KDF does not hold one
+    hashed_password = password_engine.hash(password)
     connection = create_connection()
     if connection:
         cursor = connection.cursor()
-        hashed_password = hash_password(password)
         
         try:
             cursor.execute("""
@@ -80,231 +38,72 @@ def register_user(username, password, email, age, weight, height, blood_type, al
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (username, hashed_password, email, age, weight, height, blood_type, allergies, diseases))
             
+            # Demo readings are created once here rather than probed for on every page render
+            seed.seed_demo_vitals(cursor, cursor.lastrowid)
+            
             connection.commit()
-            cursor.close()
-            connection.close()
             return True
         except Error as e:
             st.error(f"Registration failed: {e}")
             return False
+        finally:
+            cursor.close()
+            connection.close()
     return False
 
+@metrics.traced
 def login_user(email, password):
     """Authenticate user login"""
     connection = create_connection()
+    if not connection:
+        return False
+    try:
+        user = named_queries.fetchone(connection, 'login_by_email', (email,))
+    except Error as e:
+        st.error(f"Error during login: {e}")
+        return False
+    finally:
+        connection.close()
+    
+    # Verified outside the connection; unknown emails cost the same KDF work
+    if not password_engine.verify(user[2] if user else None, password):
+        return False
+    
+    if password_engine.needs_rehash(user[2]):
+        upgrade_password_hash(user[0], user[2], password)
+    
+    st.session_state.logged_in = True
+    st.session_state.user_id = user[0]
+    st.session_state.username = user[1]
+    return True
+
+def upgrade_password_hash(user_id, old_hash, password):
+    """Replace a legacy or outdated hash after a successful login"""
+    new_hash = password_engine.hash(password)
+    connection = create_connection()
     if connection:
         cursor = connection.cursor()
-        hashed_password = hash_password(password)
-        
-        cursor.execute("SELECT id, username FROM users WHERE email = %s AND password = %s", 
-                      (email, hashed_password))
-        user = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
-        
-        if user:
-            st.session_state.logged_in = True
-            st.session_state.user_id = user[0]
-            st.session_state.username = user[1]
-            return True
-    return False
+        try:
+            # Only if unchanged since it was verified, so a concurrent password change wins
+            cursor.execute("UPDATE users SET password = %s WHERE id = %s AND password = %s",
+                           (new_hash, user_id, old_hash))
+            connection.commit()
+        except Error as e:
+            st.error(f"Error upgrading password hash: {e}")
+        finally:
+            cursor.close()
+            connection.close()
 
 
 def set_background_image():
     """Set background image for login/signup pages"""
-    try:
-        with open("bg.png", "rb") as f:
-            bg_image = base64.b64encode(f.read()).decode()
-        
-        st.markdown(f"""
-            <style>
-            .stApp {{
-                background: url("data:image/png;base64,{bg_image}") no-repeat center center fixed;
-                background-size: 100% auto;
-            }}
-            </style>
-        """, unsafe_allow_html=True)
-    except FileNotFoundError:
-        pass  # Skip if background image not found
-
-
-def load_medical_css():
-    """Load custom CSS for medical theme"""
-    st.markdown("""
-    <style>
-
-    /* Global heading colors - make all black */
-    h1, h2, h3, h4, h5, h6,
-    .stSubheader,
-    [data-testid="stSubheader"] {
-        color: black !important;
-    }
-    
-    /* Make input labels black */
-    .stTextInput label,
-    .stNumberInput label,
-    .stSelectbox label,
-    label {
-        color: black !important;
-        font-weight: 500 !important;
-    }
-
-    /* Also target the label text specifically */
-    .stTextInput > label > div,
-    .stNumberInput > label > div,
-    .stSelectbox > label > div {
-        color: black !important;
-    }
-
-    /* Target Streamlit's label spans */
-    [data-testid="stWidgetLabel"] {
-        color: black !important;
-    }
-
-    /* Make sure placeholder text is visible but lighter */
-    .stTextInput input::placeholder,
-    .stNumberInput input::placeholder {
-        color: #64748b !important;
-    }
-                         
-    /* Main container */
-    .login-main-container {
-        display: flex;
-        min-height: 100vh;
-        width: 100%;
-        position: relative;
-        overflow: hidden;
-    }
-    
-                
-    /* Right side with form */
-    .form-side {
-        flex: 1;
-        background: #f8f9fa;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        padding: 2rem;
-        position: relative;
-    }
-    
-    .form-side::before {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: -50px;
-        width: 100px;
-        height: 100%;
-        background: linear-gradient(90deg, #1f5675, transparent);
-        transform: skewX(-10deg);
-        z-index: 1;
-    }
-    
-    /* Form container */
-    .form-container {
-        background: #ffffff;
-        padding: 3rem 2.5rem;
-        border-radius: 20px;
-        box-shadow: 0 20px 40px rgba(0, 0, 0, 0.1);
-        width: 100%;
-        max-width: 400px;
-        position: relative;
-        z-index: 2;
-        border: 1px solid rgba(76, 205, 196, 0.1);
-    }
-    
-    .form-title {
-        color: #2c3e50;
-        font-size: 2rem;
-        font-weight: 600;
-        margin-bottom: 2rem;
-        text-align: center;
-    }
-    
-    /* Input styling */
-    .stTextInput > div > div > input,
-    .stSelectbox > div > div > select,
-    .stNumberInput > div > div > input {
-        background: #f1f3f4 !important;
-        border: none !important;
-        border-radius: 10px !important;
-        padding: 12px 16px !important;
-        font-size: 1rem !important;
-        color: #2c3e50 !important;
-        box-shadow: inset 0 2px 4px rgba(0,0,0,0.05) !important;
-        transition: all 0.3s ease !important;
-    }
-    
-    .stTextInput > div > div > input:focus,
-    .stSelectbox > div > div > select:focus,
-    .stNumberInput > div > div > input:focus {
-        background: #ffffff !important;
-        box-shadow: 0 0 0 3px rgba(76, 205, 196, 0.2) !important;
-        outline: none !important;
-    }
-    
-    /* Button styling */
-    .stButton > button {
-        background: linear-gradient(135deg, #1F5675, #44A08D) !important;
-        color: white !important;
-        border: none !important;
-        padding: 12px 32px !important;
-        border-radius: 25px !important;
-        font-size: 1rem !important;
-        font-weight: 600 !important;
-        width: 100% !important;
-        box-shadow: 0 4px 15px rgba(76, 205, 196, 0.4) !important;
-        transition: all 0.3s ease !important;
-        letter-spacing: 0.5px !important;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 6px 20px rgba(76, 205, 196, 0.6) !important;
-    }
-    
-    /* Deploy Bar Color */
-    .est0q592 {
-        background: #17a2b8 !important;
-    }
-    
-    
-    /* Form sections for signup */
-    .form-section {
-        margin-bottom: 1.5rem;
-    }
-    
-    .form-section h4 {
-        color: #2c3e50;
-        font-size: 1.1rem;
-        margin-bottom: 1rem;
-        padding-bottom: 0.5rem;
-        border-bottom: 2px solid #4ECDC4;
-        font-weight: 600;
-    }
-    
-    .e1hznt4w0 {
-        color: black;
-    }
-                
-    /* Mobile responsive */
-    @media (max-width: 768px) {
-        
-        .form-side {
-            min-height: 60vh;
-            padding: 1rem;
-        }
-        
-        .form-container {
-            padding: 2rem 1.5rem;
-        }
-        
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    # Encoded once per process; only a short URL is sent when static serving is on
+    css = assets.login_background_css()
+    if css:
+        st.markdown(css, unsafe_allow_html=True)
 
 
+@metrics.traced
 def login_page():
     """Login page UI"""
     col1, col2, col3 = st.columns([0.5, 0.2, 1], gap="large")
@@ -344,6 +143,7 @@ def login_page():
         
             st.markdown("</div></div>", unsafe_allow_html=True)
 
+@metrics.traced
 def signup_page():
     """Signup page UI"""
     
@@ -408,6 +208,7 @@ def signup_page():
         st.markdown("</div></div>", unsafe_allow_html=True)
 
 
+@metrics.rerun_entry
 def main():
     """Main application"""
     # Set page config ONCE at the very beginning - BEFORE any other Streamlit commands
@@ -417,7 +218,13 @@ def main():
         initial_sidebar_state="collapsed"
     )
     
-    create_user()
+    # Apply pending schema migrations (runs once per process)
+    if not migrations.ensure_schema():
+        st.error("Failed to prepare the database. Please check your database connection.")
+        st.stop()
+    
+    # A refresh or reconnect starts a new session; pick up the saved one from the session cookie
+    sessions.restore()
     
     # If logged in, show dashboard
     if st.session_state.logged_in:
@@ -435,7 +242,7 @@ def main():
     else:
         # If not logged in, show login/signup pages with background
         set_background_image()
-        load_medical_css()
+        styles.inject('login')
         st.markdown('<div class="login-main-container">', unsafe_allow_html=True)
         
         if st.session_state.current_page == 'login':
@@ -444,6 +251,9 @@ def main():
             signup_page()
         
         st.markdown('</div>', unsafe_allow_html=True)
+    
+    metrics.debug_panel()
+    sessions.save()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,362 +1,114 @@
 import streamlit as st #type: ignore
-import mysql.connector #type: ignore
-from mysql.connector import Error #type: ignore
 
 from datetime import datetime, date, timedelta
 
 import random
 import numpy as np #type: ignore
 
+from db import create_connection, Error
+from fetch import fetch_all
+from queries import named_queries
+from reminders import reminder_scheduler, upcoming_doses
+import fragments
+import metrics
+import styles
 
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'vital_signs_db',
-    'user': 'root',
-    'password': '1234'
-}
 
-def create_connection():
-    """Create database connection"""
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        st.error(f"Error connecting to database: {e}")
-        return None
-    
+# Medication cards shown per page
+PAGE_SIZE = 10
 
-def create_medications_table():
-    """Create medications table if it doesn't exist"""
-    connection = create_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS medications (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                medication_name VARCHAR(255) NOT NULL,
-                time_hour INT NOT NULL,
-                dose DECIMAL(10,2) NOT NULL,
-                medication_type VARCHAR(100),
-                start_day VARCHAR(50),
-                end_day VARCHAR(50),
-                duration VARCHAR(100),
-                comments VARCHAR(200),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            )
-            """
-            cursor.execute(create_table_query)
-            connection.commit()
-            cursor.close()
-            connection.close()
-        except Error as e:
-            st.error(f"Error creating medications table: {e}")
 
-
-def add_medication(medication_name, time_hour, dose, medication_type, start_day, end_day, duration, comments):
-    """Add a new medication to the database"""
+@metrics.traced
+def add_medication(user_id, medication_name, time_hour, dose, medication_type, start_day, end_day, duration, comments):
+    """Add a new medication to the user's list"""
     connection = create_connection()
     if connection:
         try:
             cursor = connection.cursor()
             cursor.execute("""
-            INSERT INTO medications (medication_name, time_hour, dose, medication_type, start_day, end_day, duration, comments)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (medication_name, time_hour, dose, medication_type, start_day, end_day, duration, comments))
+            INSERT INTO medications (user_id, medication_name, time_hour, dose, medication_type, start_day, end_day, duration, comments)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (user_id, medication_name, time_hour, dose, medication_type, start_day, end_day, duration, comments))
 
             connection.commit()
+            reminder_scheduler.add((cursor.lastrowid, user_id, medication_name, time_hour, dose, start_day, end_day))
             cursor.close()
-            connection.close()
             return True
         except Error as e:
             st.error(f"Error adding medication: {e}")
             return False
+        finally:
+            connection.close()
     return False
 
 
-def get_all_medications():
-    """Retrieve all medications from the database"""
+@metrics.traced
+def get_medications(user_id, after=None, limit=PAGE_SIZE):
+    """One page of the user's medications, newest first, as (medications, next_after).
+
+    after is the (created_at, id) of the previous page's last row; next_after
+    is the value for the following page, or None on the last one.
+    """
     connection = create_connection()
     if connection:
         try:
-            cursor = connection.cursor(dictionary=True)
-            select_query = "SELECT * FROM medications ORDER BY created_at DESC"
-            cursor.execute(select_query)
-            medications = cursor.fetchall()
-            cursor.close()
-            connection.close()
-            return medications
+            # Keyset pagination: a range scan on (user_id, created_at) however deep the page
+            if after is None:
+                medications = named_queries.fetchall(connection, 'medications_first_page', (user_id, limit + 1),
+                                                     dictionary=True)
+            else:
+                created_at, last_id = after
+                medications = named_queries.fetchall(connection, 'medications_next_page',
+                                                     (user_id, created_at, created_at, last_id, limit + 1), dictionary=True)
+            if len(medications) <= limit:
+                return medications, None
+            medications = medications[:limit]
+            return medications, (medications[-1]['created_at'], medications[-1]['id'])
         except Error as e:
             st.error(f"Error retrieving medications: {e}")
-            return []
-    return []
+            return [], None
+        finally:
+            connection.close()
+    return [], None
+
+
+@metrics.traced
+def count_medications(user_id):
+    """Number of medications on the user's list"""
+    connection = create_connection()
+    if connection:
+        try:
+            return named_queries.fetchone(connection, 'medications_count', (user_id,))[0]
+        except Error as e:
+            st.error(f"Error counting medications: {e}")
+            return 0
+        finally:
+            connection.close()
+    return 0
 
 
-def delete_medication(medication_id):
-    """Delete a medication from the database"""
+@metrics.traced
+def delete_medication(user_id, medication_id):
+    """Delete one of the user's medications"""
     connection = create_connection()
     if connection:
         try:
             cursor = connection.cursor()
-            delete_query = "DELETE FROM medications WHERE id = %s"
-            cursor.execute(delete_query, (medication_id,))
+            delete_query = "DELETE FROM medications WHERE id = %s AND user_id = %s"
+            cursor.execute(delete_query, (medication_id, user_id))
             connection.commit()
+            if cursor.rowcount:
+                reminder_scheduler.remove(medication_id)
             cursor.close()
-            connection.close()
             return True
         except Error as e:
             st.error(f"Error deleting medication: {e}")
             return False
+        finally:
+            connection.close()
     return False
 
 
-def load_med_css():
-    """Load custom CSS for medications page"""
-    """Load custom CSS for dashboard"""
-    st.markdown("""
-    <style>
-    /* Main dashboard background */
-    .stApp {
-        background: #f8fafc !important;
-    }
-    
-    /* Global heading colors - make all black */
-    h1, h2, h3, h4, h5, h6,
-    .stSubheader,
-    [data-testid="stSubheader"] {
-        color: black !important;
-    }
-                
-      
-                
-    /* Make input labels black */
-    .stTextInput label,
-    .stNumberInput label,
-    .stSelectbox label,
-    label {
-        color: black !important;
-        font-weight: 500 !important;
-    }
-
-    /* Also target the label text specifically */
-    .stTextInput > label > div,
-    .stNumberInput > label > div,
-    .stSelectbox > label > div {
-        color: black !important;
-    }
-
-    /* Target Streamlit's label spans */
-    [data-testid="stWidgetLabel"] {
-        color: black !important;
-    }
-
-    /* Make sure placeholder text is visible but lighter */
-    .stTextInput input::placeholder,
-    .stNumberInput input::placeholder {
-        color: #64748b !important;
-    }
-                
-    /* Sidebar styling */
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #07635b 0%, #0a4d47 100%) !important;
-    }
-    
-    [data-testid="stSidebar"] * {
-        color: white !important;
-    }
-    
-    /* Sidebar buttons */
-    [data-testid="stSidebar"] .stButton > button {
-        background: rgba(255, 255, 255, 0.1) !important;
-        color: white !important;
-        border: 1px solid rgba(255, 255, 255, 0.2) !important;
-        border-radius: 50px !important;
-        padding: 12px 20px !important;
-        font-size: 1rem !important;
-        font-weight: 500 !important;
-        width: 100% !important;
-        transition: all 0.3s ease !important;
-        margin: 5px 0 !important;
-    }
-    
-    [data-testid="stSidebar"] .stButton > button:hover {
-        background: rgba(255, 255, 255, 0.2) !important;
-        transform: translateX(5px) !important;
-    }
-    
-    /* Main content buttons - Dashboard, Heart, Medications pages */
-    .main .stButton > button {
-        background: linear-gradient(135deg, #17a2b8, #138496) !important;
-        color: white !important;
-        border: none !important;
-        padding: 12px 24px !important;
-        border-radius: 25px !important;
-        font-size: 0.95rem !important;
-        font-weight: 600 !important;
-        transition: all 0.3s ease !important;
-        box-shadow: 0 2px 8px rgba(23, 162, 184, 0.3) !important;
-    }
-    
-    .main .stButton > button:hover {
-        background: linear-gradient(135deg, #138496, #117a8b) !important;
-        transform: translateY(-2px) !important;
-        box-shadow: 0 4px 12px rgba(23, 162, 184, 0.4) !important;
-    }
-    
-    /* Deploy Bar Color */
-    .est0q592 {
-        background: #17a2b8 !important;
-    }
-    
-    
-    
-    /* Metrics cards */
-    .metric-card {
-        background: white !important;
-        border-radius: 16px !important;
-        padding: 1.5rem !important;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1) !important;
-        border: 1px solid #e2e8f0 !important;
-        transition: transform 0.2s ease, box-shadow 0.2s ease !important;
-        margin-bottom: 20px !important;
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15) !important;
-    }
-    
-    
-    .metric-card.medication-card {
-        border-left: 4px solid #3b82f6 !important;
-    }
-                
-    .metric-header {
-        display: flex;
-        align-items: center;
-        margin-bottom: 0.5rem;
-    }
-    
-    .metric-icon {
-        font-size: 1.5rem;
-        margin-right: 8px;
-    }
-    
-    .metric-title {
-        color: #64748b !important;
-        font-size: 0.875rem !important;
-        font-weight: 500 !important;
-        margin: 0 !important;
-    }
-    
-    .metric-value {
-        font-size: 1.75rem !important;
-        font-weight: 600 !important;
-        color: #1e293b !important;
-        margin: 0.25rem 0 !important;
-    }
-
-    .metric-subtitle {
-        color: #64748b !important;
-        font-size: 0.8rem !important;
-        margin: 0 !important;
-    }
-    
-    
-    
-    .metric-detail {
-        color: #64748b !important;
-        font-size: 0.875rem !important;
-        margin: 0.25rem 0 !important;
-    }
-    
-    .divider-line {
-        height: 1px;   
-        background: #64748b;  
-        margin: 0.5rem 0;        
-    }
-    
-
-    
-    /* Medications/Heart headers */
-    .med-header, .medications-header, .form-header {
-        background: white !important;
-        border-radius: 16px !important;
-        padding: 2rem !important;
-        margin-bottom: 2rem !important;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1) !important;
-        border: 1px solid #e2e8f0 !important;
-    }
-    
-    .med-section, .medications-section, .form-section {
-        display: flex;
-        justify-content: space-between;
-        align-items: flex-start;
-    }
-    
-    .med-text h1, .medications-text h3, .form-text h3 {
-        color: #1e293b !important;
-        font-size: 2rem !important;
-        font-weight: 600 !important;
-        margin: 0 0 0.5rem 0 !important;
-    }
-    
-    .med-text p, .medications-text p {
-        color: #64748b !important;
-        font-size: 1rem !important;
-        margin: 0 0 1rem 0 !important;
-    }
-    
-    /* Input fields styling */
-    .stTextInput > div > div > input,
-    .stNumberInput > div > div > input,
-    .stSelectbox > div > div > select {
-        border-radius: 8px !important;
-        border: 1px solid #e2e8f0 !important;
-        padding: 10px 12px !important;
-    }
-    
-    .stTextInput > div > div > input:focus,
-    .stNumberInput > div > div > input:focus,
-    .stSelectbox > div > div > select:focus {
-        border-color: #17a2b8 !important;
-        box-shadow: 0 0 0 3px rgba(23, 162, 184, 0.1) !important;
-    }
-    
-    /* Tab/Navigation buttons in Heart page */
-    div[data-testid="column"] > div > div > div > div > button {
-        background: #f8fafc !important;
-        color: #64748b !important;
-        border: 1px solid #e2e8f0 !important;
-        border-radius: 25px !important;
-        padding: 12px 24px !important;
-        font-weight: 500 !important;
-        transition: all 0.2s ease !important;
-    }
-    
-    div[data-testid="column"] > div > div > div > div > button:hover {
-        background: #17a2b8 !important;
-        color: white !important;
-        border-color: #17a2b8 !important;
-    }
-    
-    /* Mobile responsive */
-    @media (max-width: 768px) {
-        .main-content {
-            padding: 0 1rem;
-        }
-        
-        .metrics-grid {
-            grid-template-columns: 1fr;
-        }
-    }
-    
-
-    </style>
-    """, unsafe_allow_html=True)
-
-
 def display_medication_cards(medications):
     """Display medication cards in the sidebar"""
     if not medications:
@@ -399,17 +151,74 @@ def display_medication_cards(medications):
         
         # Add delete button
         if st.button(f"🗑️ Delete", key=f"delete_{med['id']}", help="Delete this medication"):
-            if delete_medication(med['id']):
+            if delete_medication(st.session_state.user_id, med['id']):
+                st.session_state.med_page_starts = [None]
                 st.success("Medication deleted successfully!")
-                st.rerun()
+                fragments.rerun()
+
+
+def display_upcoming_doses(doses):
+    """Doses due in the next day, soonest first"""
+    if not doses:
+        return
+    now = datetime.now()
+    lines = []
+    for dose in doses:
+        when = "now" if dose['due'] <= now else dose['due'].strftime("%H:%M" if dose['due'].date() == now.date() else "tomorrow %H:%M")
+        lines.append(f"- **{when}** — {dose['medication_name']} ({dose['dose']})")
+    st.markdown("**⏰ Next 24 hours**\n\n" + "\n".join(lines))
 
 
+def show_page_buttons(next_after):
+    """Previous/next buttons over the medication pages"""
+    starts = st.session_state.med_page_starts
+    if len(starts) == 1 and next_after is None:
+        return
+    col_prev, col_page, col_next = st.columns([1, 1, 1])
+    with col_prev:
+        if st.button("← Newer", key="med_page_prev", disabled=len(starts) == 1):
+            starts.pop()
+            fragments.rerun()
+    with col_page:
+        st.caption(f"Page {len(starts)}")
+    with col_next:
+        if st.button("Older →", key="med_page_next", disabled=next_after is None):
+            starts.append(next_after)
+            fragments.rerun()
+
+
+@st.fragment
+@metrics.rerun_entry
+def medication_list(user_id):
+    """Upcoming doses and one page of medication cards; paging and deletes rerun only this list"""
+    data = fetch_all(
+        page=(get_medications, user_id, st.session_state.med_page_starts[-1]),
+        total=(count_medications, user_id),
+        doses=(upcoming_doses, user_id),
+    )
+
+    st.subheader("Current Medications")
+    medications, next_after = data['page']
+    display_upcoming_doses(data['doses'])
+    display_medication_cards(medications)
+    show_page_buttons(next_after)
+    
+    # Show total count
+    st.info(f"Total Medications: {data['total']}")
+
+
+@metrics.traced
 def run_med_page():
-    # Load CSS
-    load_med_css()
-    
-    # Create table if it doesn't exist
-    create_medications_table()
+    # Style bundle is sent once per session, not on every rerun
+    styles.inject('medications')
+
+    if 'user_id' not in st.session_state:
+        st.error("Please log in to see your medications")
+        return
+    user_id = st.session_state.user_id
+    # Start of each page visited so far; the last one is on screen
+    if 'med_page_starts' not in st.session_state:
+        st.session_state.med_page_starts = [None]
     
     st.markdown(f"""
     <div class="med-header">
@@ -428,12 +237,7 @@ def run_med_page():
     
     
     with col1:
-        st.subheader("Current Medications")
-        medications = get_all_medications()
-        display_medication_cards(medications)
-        
-        # Show total count
-        st.info(f"Total Medications: {len(medications)}")
+        medication_list(user_id)
     
     
     with col2:
@@ -476,6 +280,7 @@ def run_med_page():
                 else:
                     # Add medication to database
                     success = add_medication(
+                        user_id=user_id,
                         medication_name=medication_name,
                         time_hour=time_hour,
                         dose=dose,
@@ -487,6 +292,7 @@ def run_med_page():
                     )
                     
                     if success:
+                        st.session_state.med_page_starts = [None]
                         st.success("Medication added successfully!")
                         st.rerun()  # Refresh the page to show the new medication
                     else:
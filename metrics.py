@@ -0,0 +1,351 @@
+"""Per-rerun cost of rendering a page: queries, DB time, rows, connections.
+
+Entry points of a run (login.main, and each @st.fragment that can rerun
+on its own) are wrapped in @rerun_entry; page and data functions below
+them in @traced. While an entry point runs, every statement the pooled
+cursors execute is charged to the run and to each traced function on the
+call stack, so a page that issues one query per row shows up as a high
+query count on that page's function.
+
+    VITAL_DEBUG_PANEL=1          show the numbers in the sidebar
+    VITAL_METRICS_FILE=path      keep a Prometheus text file of process totals
+    VITAL_METRICS_BYTES=1        also estimate the bytes fetched (sizes every value)
+
+The file is rewritten at most every VITAL_METRICS_INTERVAL seconds, in
+place, for node_exporter's textfile collector or any scraper that reads it.
+Outside an entry point (scripts, contract.py) the wrappers only call
+through.
+"""
+import streamlit as st #type: ignore
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+
+DEBUG_PANEL = os.environ.get('VITAL_DEBUG_PANEL', '') not in ('', '0')
+METRICS_FILE = os.environ.get('VITAL_METRICS_FILE')
+METRICS_INTERVAL = float(os.environ.get('VITAL_METRICS_INTERVAL', '15'))
+MEASURE_BYTES = os.environ.get('VITAL_METRICS_BYTES', '') not in ('', '0')
+
+# Counters charged to a run and to the traced functions running at the time
+COUNTERS = ('queries', 'db_seconds', 'rows_fetched', 'bytes_fetched', 'connections')
+# Recent runs kept in session state for the debug panel
+RECENT_RUNS = 10
+RECENT_RUNS_KEY = 'rerun_metrics'
+
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+# (Rerun, stats dicts of the traced functions on the stack) in the running script
+_active = contextvars.ContextVar('vital_rerun', default=None)
+
+
+class Rerun:
+    """Counters of one script or fragment run, shared by the fetch threads it starts"""
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        self.functions = {}  # function name -> calls, seconds and COUNTERS
+        self.lock = threading.Lock()
+
+    def function_stats(self, name):
+        with self.lock:
+            stats = self.functions.get(name)
+            if stats is None:
+                stats = self.functions[name] = {'calls': 0, 'seconds': 0.0, **dict.fromkeys(COUNTERS, 0)}
+            return stats
+
+    def summary(self):
+        """Plain-dict copy for session state and the debug panel"""
+        with self.lock:
+            return {
+                'entry': self.entry,
+                'seconds': self.seconds,
+                **self.totals,
+                'functions': {name: dict(stats) for name, stats in self.functions.items()},
+            }
+
+
+def record(**amounts):
+    """Add to COUNTERS of the current run, if one is being recorded"""
+    state = _active.get()
+    if state is None:
+        return
+    rerun, stack = state
+    with rerun.lock:
+        for name, amount in amounts.items():
+            rerun.totals[name] += amount
+            for stats in stack:
+                stats[name] += amount
+
+def record_rows(rows, seconds):
+    """record() rows just fetched and the time it took, sizing them if MEASURE_BYTES is set"""
+    if _active.get() is None:
+        return
+    if MEASURE_BYTES:
+        record(rows_fetched=len(rows), db_seconds=seconds, bytes_fetched=sum(map(row_size, rows)))
+    else:
+        record(rows_fetched=len(rows), db_seconds=seconds)
+
+def row_size(row):
+    """Rough bytes a row takes on the wire: text and binary by length, NULL as 0, anything else as 8"""
+    values = row.values() if isinstance(row, dict) else row
+    return sum(len(value) if isinstance(value, (str, bytes, bytearray)) else 0 if value is None else 8
+               for value in values)
+
+def configure(measure_bytes=None):
+    """Change settings read from the environment at import"""
+    global MEASURE_BYTES
+    if measure_bytes is not None:
+        MEASURE_BYTES = measure_bytes
+
+def current():
+    """Summary of the run in progress, or None outside an entry point"""
+    state = _active.get()
+    return state[0].summary() if state else None
+
+def traced(function):
+    """Charge a function's calls, time and queries to the current run"""
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        state = _active.get()
+        if state is None:
+            return function(*args, **kwargs)
+        return _call(state, name, function, args, kwargs)
+    return wrapper
+
+def rerun_entry(function):
+    """traced, and records a new run when called outside one (a full run or a fragment rerun)"""
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        state = _active.get()
+        if state is not None:
+            return _call(state, name, function, args, kwargs)
+        rerun = Rerun(name)
+        token = _active.set((rerun, ()))
+        try:
+            return _call((rerun, ()), name, function, args, kwargs)
+        finally:
+            _active.reset(token)
+            rerun.seconds = time.perf_counter() - rerun.started
+            _finish(rerun)
+    return wrapper
+
+def _call(state, name, function, args, kwargs):
+    rerun, stack = state
+    stats = rerun.function_stats(name)
+    token = _active.set((rerun, stack + (stats,)))
+    started = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        _active.reset(token)
+        with rerun.lock:
+            stats['calls'] += 1
+            stats['seconds'] += elapsed
+
+
+class ProcessMetrics:
+    """Totals over every recorded run in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}    # entry -> runs, COUNTERS and histogram counts
+        self._functions = {}  # function name -> calls, seconds and COUNTERS
+        self._written = 0.0
+
+    def add(self, rerun):
+        summary = rerun.summary()
+        with self._lock:
+            entry = self._entries.get(rerun.entry)
+            if entry is None:
+                entry = self._entries[rerun.entry] = {
+                    'runs': 0, 'seconds': 0.0, **dict.fromkeys(COUNTERS, 0),
+                    'seconds_buckets': [0] * len(SECONDS_BUCKETS),
+                    'query_buckets': [0] * len(QUERY_BUCKETS),
+                }
+            entry['runs'] += 1
+            entry['seconds'] += summary['seconds']
+            for name in COUNTERS:
+                entry[name] += summary[name]
+            _observe(entry['seconds_buckets'], SECONDS_BUCKETS, summary['seconds'])
+            _observe(entry['query_buckets'], QUERY_BUCKETS, summary['queries'])
+
+            for name, stats in summary['functions'].items():
+                totals = self._functions.setdefault(name, {'calls': 0, 'seconds': 0.0, **dict.fromkeys(COUNTERS, 0)})
+                for key, value in stats.items():
+                    totals[key] += value
+
+    def snapshot(self):
+        with self._lock:
+            entries = {name: {key: list(value) if isinstance(value, list) else value for key, value in stats.items()}
+                       for name, stats in self._entries.items()}
+            functions = {name: dict(stats) for name, stats in self._functions.items()}
+        return entries, functions
+
+    def export_due(self, now):
+        """Whether the metrics file is due for a rewrite; claims the slot if it is"""
+        with self._lock:
+            if now - self._written < METRICS_INTERVAL:
+                return False
+            self._written = now
+            return True
+
+
+process_metrics = ProcessMetrics()
+
+
+def _observe(buckets, bounds, value):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            buckets[index] += 1
+
+def _finish(rerun):
+    process_metrics.add(rerun)
+    try:
+        recent = st.session_state.setdefault(RECENT_RUNS_KEY, deque(maxlen=RECENT_RUNS))
+        recent.append(rerun.summary())
+    except Exception:
+        pass  # no session outside a Streamlit run
+    if METRICS_FILE and process_metrics.export_due(time.monotonic()):
+        try:
+            write_prometheus(METRICS_FILE)
+        except OSError as e:
+            st.warning(f"Could not write metrics file: {e}")
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _family(lines, name, kind, help_text, samples):
+    """Append one metric family; samples are (suffix, {label: value}, value)"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for suffix, labels, value in samples:
+        rendered = ','.join(f'{key}="{_label(label)}"' for key, label in labels.items())
+        lines.append(f"{name}{suffix}{{{rendered}}} {value}" if rendered else f"{name}{suffix} {value}")
+
+def _histogram(entry, label, buckets, bounds, total):
+    samples = [('_bucket', {'entry': label, 'le': bound}, count) for bound, count in zip(bounds, buckets)]
+    samples.append(('_bucket', {'entry': label, 'le': '+Inf'}, entry['runs']))
+    samples.append(('_sum', {'entry': label}, total))
+    samples.append(('_count', {'entry': label}, entry['runs']))
+    return samples
+
+def prometheus_text():
+    """Process totals in the Prometheus text exposition format"""
+    from cache import vitals_cache
+    from db import pool_stats, query_stats
+    from passwords import password_engine
+    from queries import named_queries
+
+    entries, functions = process_metrics.snapshot()
+    lines = []
+    _family(lines, 'vital_rerun_seconds', 'histogram', "Time to run a page or fragment",
+            [sample for entry, stats in entries.items()
+             for sample in _histogram(stats, entry, stats['seconds_buckets'], SECONDS_BUCKETS, stats['seconds'])])
+    _family(lines, 'vital_rerun_queries', 'histogram', "Statements executed per page or fragment run",
+            [sample for entry, stats in entries.items()
+             for sample in _histogram(stats, entry, stats['query_buckets'], QUERY_BUCKETS, stats['queries'])])
+    for name, help_text in (('db_seconds', "Time spent in database calls during runs"),
+                            ('rows_fetched', "Rows fetched during runs"),
+                            ('bytes_fetched', "Estimated bytes fetched during runs, if VITAL_METRICS_BYTES is set"),
+                            ('connections', "Pooled connections checked out during runs")):
+        _family(lines, f'vital_rerun_{name}_total', 'counter', help_text,
+                [('', {'entry': entry}, stats[name]) for entry, stats in entries.items()])
+
+    for name, help_text in (('calls', "Calls of a traced function"),
+                            ('seconds', "Time spent in a traced function, including its callees"),
+                            ('queries', "Statements executed by a traced function and its callees"),
+                            ('rows_fetched', "Rows fetched by a traced function and its callees")):
+        _family(lines, f'vital_function_{name}_total', 'counter', help_text,
+                [('', {'function': function}, stats[name]) for function, stats in sorted(functions.items())])
+
+    named = named_queries.stats()
+    for name, help_text in (('executions', "Executions of a named query"),
+                            ('rows', "Rows returned by a named query"),
+                            ('seconds', "Time spent in a named query")):
+        _family(lines, f'vital_named_query_{name}_total', 'counter', help_text,
+                [('', {'query': query}, stats[name]) for query, stats in sorted(named.items())])
+
+    queries = query_stats.snapshot()
+    _family(lines, 'vital_db_queries_total', 'counter', "Statements executed by this process",
+            [('', {}, queries['queries'])])
+    _family(lines, 'vital_db_rows_fetched_total', 'counter', "Rows fetched by this process",
+            [('', {}, queries['rows_fetched'])])
+    pool = pool_stats()
+    for name in ('in_use', 'idle', 'size'):
+        _family(lines, f'vital_pool_{name}', 'gauge', f"Connection pool {name.replace('_', ' ')}",
+                [('', {}, pool[name])])
+    for name in ('checkouts', 'waits', 'timeouts', 'created', 'discarded'):
+        _family(lines, f'vital_pool_{name}_total', 'counter', f"Connection pool {name}",
+                [('', {}, pool[name])])
+    cache = vitals_cache.stats()
+    for name in ('hits', 'misses', 'evictions'):
+        _family(lines, f'vital_cache_{name}_total', 'counter', f"Query cache {name}", [('', {}, cache[name])])
+    _family(lines, 'vital_cache_entries', 'gauge', "Query cache entries", [('', {}, cache['entries'])])
+    passwords = password_engine.stats()
+    for name, help_text in (('verifications', "Password verifications"),
+                            ('legacy_verifications', "Password verifications against legacy SHA-256 hashes"),
+                            ('failures', "Password verifications that did not match")):
+        _family(lines, f'vital_password_{name}_total', 'counter', help_text, [('', {}, passwords[name])])
+    _family(lines, 'vital_password_verifications_per_second', 'gauge', "Password verifications per second, recent window",
+            [('', {}, passwords['verifications_per_sec'])])
+    return '\n'.join(lines) + '\n'
+
+def write_prometheus(path):
+    """Replace the file at path with prometheus_text(); readers never see a partial file"""
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, 'w') as f:
+        f.write(prometheus_text())
+    os.replace(temp, path)
+
+
+def debug_panel():
+    """Sidebar breakdown of recent runs, when VITAL_DEBUG_PANEL is set"""
+    if not DEBUG_PANEL:
+        return
+    import pandas as pd #type: ignore
+
+    from passwords import RATE_WINDOW, password_engine
+
+    with st.sidebar.expander("Render metrics", expanded=False):
+        passwords = password_engine.stats()
+        st.caption(f"Password checks: {passwords['verifications']:,} ({passwords['legacy_verifications']:,} legacy, "
+                   f"{passwords['failures']:,} failed), {passwords['verifications_per_sec']:.2f}/s over {RATE_WINDOW:g} s")
+        # This run is still going; everything above the panel is in it
+        runs = list(st.session_state.get(RECENT_RUNS_KEY, ()))
+        now = current()
+        if now:
+            now['seconds'] = time.perf_counter() - _active.get()[0].started
+            runs.append(now)
+        if not runs:
+            st.caption("No runs recorded yet.")
+            return
+        latest = runs[-1]
+        size = f" ({latest['bytes_fetched']:,} bytes)" if MEASURE_BYTES else ""
+        st.caption(f"{latest['entry']}: {latest['seconds'] * 1000:.0f} ms, {latest['queries']} queries, "
+                   f"{latest['db_seconds'] * 1000:.0f} ms in the database, {latest['rows_fetched']} rows{size}, "
+                   f"{latest['connections']} connections")
+        functions = pd.DataFrame([{'function': name, 'calls': stats['calls'], 'ms': stats['seconds'] * 1000,
+                                   'queries': stats['queries'], 'rows': stats['rows_fetched']}
+                                  for name, stats in latest['functions'].items()])
+        if len(functions):
+            st.dataframe(functions.sort_values('ms', ascending=False), hide_index=True, width="stretch")
+        st.caption("Recent runs")
+        st.dataframe(pd.DataFrame([{'entry': run['entry'].rsplit('.', 1)[-1], 'ms': run['seconds'] * 1000,
+                                    'queries': run['queries'], 'rows': run['rows_fetched'],
+                                    'connections': run['connections']} for run in reversed(runs)]),
+                     hide_index=True, width="stretch")
@@ -0,0 +1,296 @@
+import streamlit as st #type: ignore
+
+import threading
+
+from db import create_connection, get_backend, Error
+from queries import VITALS_COLUMNS, VITALS_KEY
+import rollups
+
+
+def _merge_daily_vitals(cursor):
+    """Fold each user's several readings of a day into the newest one.
+
+    A field the newest reading left empty takes the latest earlier value
+    for it. The merged days' rollups are rebuilt in the same transaction.
+    """
+    fields = [column for column in VITALS_COLUMNS if column not in VITALS_KEY]
+    cursor.execute(f"""
+    SELECT v.id, v.user_id, v.date_recorded, {', '.join('v.' + field for field in fields)}
+    FROM vital_results v
+    JOIN (SELECT user_id, date_recorded FROM vital_results
+          GROUP BY user_id, date_recorded HAVING COUNT(*) > 1) repeated
+        ON repeated.user_id = v.user_id AND repeated.date_recorded = v.date_recorded
+    ORDER BY v.user_id, v.date_recorded, v.id DESC
+    """)
+    days = {}
+    for row in cursor.fetchall():
+        days.setdefault((row[1], row[2]), []).append(row)
+
+    updates, doomed, spans = [], [], {}
+    for (user_id, day), rows in days.items():
+        newest = rows[0]
+        merged = [next((row[3 + i] for row in rows if row[3 + i] is not None), None) for i in range(len(fields))]
+        updates.append((*merged, newest[0]))
+        doomed += [(row[0],) for row in rows[1:]]
+        first_day, last_day = spans.get(user_id, (day, day))
+        spans[user_id] = (min(first_day, day), max(last_day, day))
+
+    if updates:
+        cursor.executemany(f"UPDATE vital_results SET {', '.join(field + ' = %s' for field in fields)} WHERE id = %s",
+                           updates)
+        cursor.executemany("DELETE FROM vital_results WHERE id = %s", doomed)
+        rollups.refresh_spans(cursor, spans)
+
+
+# Numbered schema changes. Append new entries; never edit one that has shipped.
+# A statement is portable SQL, a {backend name: SQL} dict, or a function
+# taking the cursor, for data changes SQL cannot say the same way on both.
+MIGRATIONS = [
+    (1, "create users table", [
+        {
+            'mysql': """
+            CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(100) NOT NULL,
+                email VARCHAR(100) UNIQUE NOT NULL,
+                password VARCHAR(255) NOT NULL,
+                age INT,
+                weight FLOAT,
+                height FLOAT,
+                blood_type VARCHAR(5),
+                allergies TEXT,
+                diseases TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            'sqlite': """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username VARCHAR(100) NOT NULL,
+                email VARCHAR(100) UNIQUE NOT NULL,
+                password VARCHAR(255) NOT NULL,
+                age INT,
+                weight FLOAT,
+                height FLOAT,
+                blood_type VARCHAR(5),
+                allergies TEXT,
+                diseases TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        },
+    ]),
+    (2, "create vital_results table", [
+        {
+            'mysql': """
+            CREATE TABLE IF NOT EXISTS vital_results (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                date_recorded DATE NOT NULL,
+                systolic_bp INT,
+                diastolic_bp INT,
+                heart_rate INT,
+                temperature DECIMAL(4,1),
+                glucose_level INT,
+                blood_status VARCHAR(20),
+                water_balance INT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            """,
+            'sqlite': """
+            CREATE TABLE IF NOT EXISTS vital_results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INT NOT NULL,
+                date_recorded DATE NOT NULL,
+                systolic_bp INT,
+                diastolic_bp INT,
+                heart_rate INT,
+                temperature DECIMAL(4,1),
+                glucose_level INT,
+                blood_status VARCHAR(20),
+                water_balance INT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            """,
+        },
+    ]),
+    (3, "create medications table", [
+        {
+            'mysql': """
+            CREATE TABLE IF NOT EXISTS medications (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                medication_name VARCHAR(255) NOT NULL,
+                time_hour INT NOT NULL,
+                dose DECIMAL(10,2) NOT NULL,
+                medication_type VARCHAR(100),
+                start_day VARCHAR(50),
+                end_day VARCHAR(50),
+                duration VARCHAR(100),
+                comments VARCHAR(200),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+            """,
+            'sqlite': """
+            CREATE TABLE IF NOT EXISTS medications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                medication_name VARCHAR(255) NOT NULL,
+                time_hour INT NOT NULL,
+                dose DECIMAL(10,2) NOT NULL,
+                medication_type VARCHAR(100),
+                start_day VARCHAR(50),
+                end_day VARCHAR(50),
+                duration VARCHAR(100),
+                comments VARCHAR(200),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        },
+        {
+            # SQLite has no ON UPDATE CURRENT_TIMESTAMP
+            'sqlite': """
+            CREATE TRIGGER IF NOT EXISTS medications_updated_at
+            AFTER UPDATE ON medications FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+            BEGIN
+                UPDATE medications SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            END
+            """,
+        },
+    ]),
+    (4, "index vital_results by user and date", [
+        "CREATE INDEX idx_vital_results_user_date ON vital_results (user_id, date_recorded)",
+    ]),
+    (5, "index medications by creation time", [
+        "CREATE INDEX idx_medications_created_at ON medications (created_at)",
+    ]),
+    # Fill for existing readings with: python rollups.py --backfill
+    (6, "create vital_rollups table", [
+        """
+        CREATE TABLE IF NOT EXISTS vital_rollups (
+            user_id INT NOT NULL,
+            bucket VARCHAR(5) NOT NULL,
+            bucket_start DATE NOT NULL,
+            metric VARCHAR(20) NOT NULL,
+            n INT NOT NULL,
+            min_value DOUBLE NOT NULL,
+            max_value DOUBLE NOT NULL,
+            sum_value DOUBLE NOT NULL,
+            sumsq_value DOUBLE NOT NULL,
+            PRIMARY KEY (user_id, bucket, bucket_start, metric),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    # Rows from before this have no owner and are no longer shown to anyone
+    (7, "scope medications to their owner", [
+        {
+            'mysql': "ALTER TABLE medications ADD COLUMN user_id INT NULL AFTER id",
+            'sqlite': "ALTER TABLE medications ADD COLUMN user_id INT REFERENCES users(id) ON DELETE CASCADE",
+        },
+        # Created before the foreign key so MySQL reuses it instead of adding its own
+        "CREATE INDEX idx_medications_user_created ON medications (user_id, created_at)",
+        {
+            'mysql': """
+            ALTER TABLE medications ADD CONSTRAINT fk_medications_user
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            """,
+        },
+    ]),
+    (8, "one vital reading per user per day", [
+        _merge_daily_vitals,
+        "CREATE UNIQUE INDEX idx_vital_results_user_day ON vital_results (user_id, date_recorded)",
+        # Same columns as the unique index, which now serves its lookups
+        {
+            'mysql': "DROP INDEX idx_vital_results_user_date ON vital_results",
+            'sqlite': "DROP INDEX idx_vital_results_user_date",
+        },
+    ]),
+]
+
+# Serializes runners from several app processes starting at once
+MIGRATION_LOCK_NAME = 'vital_signs_schema_migrations'
+MIGRATION_LOCK_TIMEOUT = 60
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def get_schema_version(cursor):
+    """Get the highest applied migration number"""
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+def statement_for(statement, backend_name):
+    """Resolve a migration statement for a backend; None if it does not apply there, a function as is"""
+    if isinstance(statement, dict):
+        return statement.get(backend_name)
+    return statement
+
+def run_migrations(connection):
+    """Apply every migration newer than the recorded schema version; returns the versions applied"""
+    backend = get_backend()
+    applied = []
+    with backend.migration_lock(connection, MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT):
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            current = get_schema_version(cursor)
+
+            for version, description, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    sql = statement_for(statement, backend.name)
+                    if callable(sql):
+                        sql(cursor)
+                    elif sql:
+                        cursor.execute(sql)
+                cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                               (version, description))
+                if not backend.transactional_ddl:
+                    connection.commit()
+                applied.append(version)
+            connection.commit()
+        finally:
+            cursor.close()
+    return applied
+
+def ensure_schema():
+    """Bring the schema up to date once per process"""
+    global _schema_ready
+    if _schema_ready:
+        return True
+
+    with _schema_lock:
+        if _schema_ready:
+            return True
+        connection = create_connection()
+        if not connection:
+            return False
+        try:
+            run_migrations(connection)
+            _schema_ready = True
+        except Error as e:
+            st.error(f"Error migrating database schema: {e}")
+        finally:
+            connection.close()
+    return _schema_ready
+
+
+if __name__ == "__main__":
+    connection = create_connection()
+    if connection:
+        try:
+            applied = run_migrations(connection)
+            print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+        finally:
+            connection.close()
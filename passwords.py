@@ -0,0 +1,180 @@
+"""Password hashing with salted scrypt, tuned to a per-login latency budget.
+
+Hashes are stored as scrypt$<log2 n>$<r>$<p>$<salt>$<key> (base64 salt and
+key), so each one carries the cost it was made with. Accounts created
+before this module hold bare SHA-256 hex digests; those still verify and
+are replaced on the owner's next successful login.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Time one verification should take on this host; the scrypt cost is tuned to fit
+LOGIN_BUDGET_MS = float(os.environ.get('VITAL_PASSWORD_BUDGET_MS', '100'))
+# Pin the cost instead of tuning, e.g. to keep several hosts identical
+PINNED_LOG_N = os.environ.get('VITAL_SCRYPT_LOG_N')
+# KDF runs at once; each holds 128 * n * r bytes, so this bounds memory during login bursts
+KDF_WORKERS = int(os.environ.get('VITAL_KDF_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+MIN_LOG_N = 14  # 16 MiB at r=8; tuning never goes below this
+MAX_LOG_N = 20
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+# Window for the verifications-per-second figure
+RATE_WINDOW = 60.0
+
+
+def _scrypt(password, salt, log_n, r, p):
+    n = 1 << log_n
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * r * (n + p) + (1 << 20), dklen=KEY_BYTES)
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+def is_legacy_hash(stored):
+    """True for the unsalted SHA-256 hex digests the app used to store"""
+    return len(stored) == 64 and all(c in '0123456789abcdef' for c in stored)
+
+
+class PasswordEngine:
+    """Hashes and verifies passwords on a bounded worker pool, with throughput counters"""
+
+    def __init__(self, budget_ms=LOGIN_BUDGET_MS, workers=KDF_WORKERS, log_n=PINNED_LOG_N):
+        self.budget_ms = budget_ms
+        self.workers = workers
+        self._log_n = int(log_n) if log_n else None
+        self._tune_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kdf')
+        self._lock = threading.Lock()
+        self._recent = deque()  # finish times of verifications inside RATE_WINDOW
+        self._dummy = None
+        self._stats = {
+            'hashes': 0,
+            'verifications': 0,
+            'failures': 0,
+            'legacy_verifications': 0,
+            'kdf_seconds': 0.0,
+            'queue_seconds': 0.0,
+        }
+
+    @property
+    def log_n(self):
+        """scrypt cost for new hashes, measured on first use"""
+        if self._log_n is None:
+            with self._tune_lock:
+                if self._log_n is None:
+                    self._log_n = self._tune()
+        return self._log_n
+
+    def _tune(self):
+        """Largest cost whose single run still fits the latency budget"""
+        salt = os.urandom(SALT_BYTES)
+        log_n = MIN_LOG_N
+        while log_n < MAX_LOG_N:
+            started = time.perf_counter()
+            _scrypt("tuning", salt, log_n, SCRYPT_R, SCRYPT_P)
+            # One step up doubles the work
+            if (time.perf_counter() - started) * 2000 > self.budget_ms:
+                break
+            log_n += 1
+        return log_n
+
+    def _run(self, function, *args):
+        """Run KDF work on the pool, recording queue wait and compute time"""
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                with self._lock:
+                    self._stats['queue_seconds'] += started - submitted
+                    self._stats['kdf_seconds'] += time.perf_counter() - started
+
+        return self._executor.submit(timed).result()
+
+    def hash(self, password):
+        """Salted scrypt hash for storage"""
+        log_n, salt = self.log_n, os.urandom(SALT_BYTES)
+        key = self._run(_scrypt, password, salt, log_n, SCRYPT_R, SCRYPT_P)
+        with self._lock:
+            self._stats['hashes'] += 1
+        return f"scrypt${log_n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+    def verify(self, stored, password):
+        """Check a password against a stored hash.
+
+        Pass stored=None for an unknown account: the same KDF work is done
+        against a throwaway hash so response time does not reveal which
+        emails exist.
+        """
+        if stored is None:
+            if self._dummy is None:
+                self._dummy = self.hash(os.urandom(16).hex())
+            self._verify(self._dummy, password)
+            return False
+        return self._verify(stored, password)
+
+    def _verify(self, stored, password):
+        if is_legacy_hash(stored):
+            ok = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+            legacy = True
+        else:
+            try:
+                scheme, log_n, r, p, salt, key = stored.split('$')
+                if scheme != 'scrypt':
+                    raise ValueError(scheme)
+                expected = base64.b64decode(key)
+                actual = self._run(_scrypt, password, base64.b64decode(salt), int(log_n), int(r), int(p))
+                ok = hmac.compare_digest(actual, expected)
+            except ValueError:
+                ok = False
+            legacy = False
+
+        now = time.monotonic()
+        with self._lock:
+            self._stats['verifications'] += 1
+            self._stats['legacy_verifications'] += legacy
+            self._stats['failures'] += not ok
+            self._recent.append(now)
+            while self._recent and self._recent[0] < now - RATE_WINDOW:
+                self._recent.popleft()
+        return ok
+
+    def needs_rehash(self, stored):
+        """True for legacy hashes and scrypt hashes made at a lower cost than today's"""
+        if is_legacy_hash(stored):
+            return True
+        try:
+            scheme, log_n, r, p, _, _ = stored.split('$')
+            return scheme != 'scrypt' or (int(log_n), int(r), int(p)) < (self.log_n, SCRYPT_R, SCRYPT_P)
+        except ValueError:
+            return True
+
+    def stats(self):
+        """Counters plus verifications/sec over the last RATE_WINDOW seconds"""
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and self._recent[0] < now - RATE_WINDOW:
+                self._recent.popleft()
+            stats = dict(self._stats)
+            stats['verifications_per_sec'] = len(self._recent) / RATE_WINDOW
+        kdf_runs = stats['hashes'] + stats['verifications'] - stats['legacy_verifications']
+        stats['avg_kdf_ms'] = stats['kdf_seconds'] / kdf_runs * 1000 if kdf_runs else 0.0
+        stats['avg_queue_ms'] = stats['queue_seconds'] / kdf_runs * 1000 if kdf_runs else 0.0
+        stats['log_n'] = self._log_n
+        stats['workers'] = self.workers
+        return stats
+
+
+password_engine = PasswordEngine()
@@ -0,0 +1,146 @@
+"""Named read queries, prepared once per pooled connection.
+
+    rows = named_queries.fetchall(connection, 'vital_series', (user_id, start, end))
+
+Each name maps to SQL, or to a {backend name: SQL} dict as in
+migrations.py. On MySQL every name gets its own cursor(prepared=True) on
+each pooled connection, kept across checkouts, so a statement is parsed
+once per connection and later calls send only parameters. sqlite3
+already reuses parsed statements from its per-connection cache.
+Executions, rows and time are counted per name; see stats().
+
+The vitals insert and per-day upsert every writer shares live here too.
+"""
+import threading
+import time
+
+from db import get_backend
+
+
+_VITAL_RECORD_COLUMNS = """id, blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level,
+    water_balance, temperature, date_recorded"""
+_MEDICATION_COLUMNS = """id, medication_name, time_hour, dose, medication_type, start_day, end_day,
+    duration, comments, created_at"""
+
+QUERIES = {
+    'login_by_email': "SELECT id, username, password FROM users WHERE email = %s",
+    'user_profile': """
+        SELECT username, email, age, weight, height, blood_type, allergies, diseases, created_at
+        FROM users WHERE id = %s
+        """,
+    'latest_vitals': """
+        SELECT systolic_bp, diastolic_bp, heart_rate, temperature, glucose_level, blood_status, water_balance
+        FROM vital_results WHERE user_id = %s ORDER BY date_recorded DESC LIMIT 1
+        """,
+    'latest_heart_results': """
+        SELECT blood_status, heart_rate, systolic_bp, diastolic_bp, glucose_level, date_recorded
+        FROM vital_results WHERE user_id = %s ORDER BY date_recorded DESC LIMIT 1
+        """,
+    'bp_history': """
+        SELECT date_recorded, systolic_bp, diastolic_bp
+        FROM vital_results
+        WHERE user_id = %s AND date_recorded >= %s
+        ORDER BY date_recorded ASC
+        """,
+    'vital_history_first_page': f"""
+        SELECT {_VITAL_RECORD_COLUMNS}
+        FROM vital_results
+        WHERE user_id = %s
+        ORDER BY date_recorded DESC, id DESC LIMIT %s
+        """,
+    'vital_history_next_page': f"""
+        SELECT {_VITAL_RECORD_COLUMNS}
+        FROM vital_results
+        WHERE user_id = %s AND (date_recorded < %s OR (date_recorded = %s AND id < %s))
+        ORDER BY date_recorded DESC, id DESC LIMIT %s
+        """,
+    'vital_series': """
+        SELECT date_recorded, systolic_bp, diastolic_bp, heart_rate, glucose_level, temperature, water_balance
+        FROM vital_results
+        WHERE user_id = %s AND date_recorded BETWEEN %s AND %s
+        ORDER BY date_recorded ASC, id ASC
+        """,
+    'rollups': """
+        SELECT bucket_start, metric, n, min_value, max_value, sum_value, sumsq_value
+        FROM vital_rollups
+        WHERE user_id = %s AND bucket = %s AND bucket_start BETWEEN %s AND %s
+        ORDER BY bucket_start, metric
+        """,
+    'medications_first_page': f"""
+        SELECT {_MEDICATION_COLUMNS} FROM medications
+        WHERE user_id = %s
+        ORDER BY created_at DESC, id DESC LIMIT %s
+        """,
+    'medications_next_page': f"""
+        SELECT {_MEDICATION_COLUMNS} FROM medications
+        WHERE user_id = %s AND (created_at < %s OR (created_at = %s AND id < %s))
+        ORDER BY created_at DESC, id DESC LIMIT %s
+        """,
+    'medications_count': "SELECT COUNT(*) FROM medications WHERE user_id = %s",
+}
+
+
+# The vitals write shared by the seeder, the importer and the heart page
+VITALS_INSERT = """
+INSERT INTO vital_results (user_id, date_recorded, systolic_bp, diastolic_bp, heart_rate,
+temperature, glucose_level, blood_status, water_balance)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# VITALS_INSERT's columns; (user_id, date_recorded) is unique, one reading per day
+VITALS_COLUMNS = ('user_id', 'date_recorded', 'systolic_bp', 'diastolic_bp', 'heart_rate',
+                  'temperature', 'glucose_level', 'blood_status', 'water_balance')
+VITALS_KEY = ('user_id', 'date_recorded')
+
+def vitals_upsert():
+    """VITALS_INSERT for the configured backend that replaces the day's reading if there is one"""
+    return get_backend().upsert('vital_results', VITALS_COLUMNS, VITALS_KEY)
+
+
+class QueryRegistry:
+    """Runs named queries on prepared cursors and counts them per name"""
+
+    def __init__(self, queries):
+        self._queries = queries
+        self._lock = threading.Lock()
+        self._stats = {name: {'executions': 0, 'rows': 0, 'seconds': 0.0} for name in queries}
+
+    def sql(self, name):
+        """SQL for a query name on the configured backend"""
+        statement = self._queries[name]
+        if isinstance(statement, dict):
+            return statement[get_backend().name]
+        return statement
+
+    def fetchall(self, connection, name, params=(), dictionary=False):
+        """Rows of a named query; dicts keyed by column name if dictionary is set"""
+        started = time.perf_counter()
+        cursor = connection.prepared_cursor(name)
+        cursor.execute(self.sql(name), params)
+        rows = cursor.fetchall()
+        if dictionary:
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in rows]
+        self._count(name, len(rows), time.perf_counter() - started)
+        return rows
+
+    def fetchone(self, connection, name, params=(), dictionary=False):
+        """First row of a named query, or None"""
+        # Reading every row leaves the prepared cursor ready for its next execute
+        rows = self.fetchall(connection, name, params, dictionary)
+        return rows[0] if rows else None
+
+    def _count(self, name, rows, seconds):
+        with self._lock:
+            stats = self._stats[name]
+            stats['executions'] += 1
+            stats['rows'] += rows
+            stats['seconds'] += seconds
+
+    def stats(self):
+        """Per-name executions, rows and total seconds, for names that have run"""
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items() if stats['executions']}
+
+
+named_queries = QueryRegistry(QUERIES)
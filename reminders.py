@@ -0,0 +1,256 @@
+"""In-process medication reminders.
+
+Every medication with an owner is taken daily at time_hour:00. The
+scheduler keeps each one's next dose in a min-heap keyed on its time, so
+"what is due now" and "what is due in the next N hours" walk only the
+doses in that window (O(log n) per step) instead of scanning the table.
+
+The table is read once, on first use. After that add_medication,
+delete_medication and delete_user keep the heap current; deletes are
+lazy, and the heap is rebuilt once deleted entries make up half of it.
+Changes written by other processes are picked up on restart.
+
+start_day and end_day are free text. When they parse as ISO dates they
+bound the doses; otherwise the medication runs indefinitely.
+"""
+import streamlit as st #type: ignore
+
+import heapq
+import threading
+from datetime import date, datetime, time, timedelta
+
+from db import connect, Error
+import metrics
+
+
+# A dose stays due from its hour until the hour is over
+DOSE_WINDOW = timedelta(hours=1)
+# Rebuild the heap once deleted entries are this share of it
+COMPACT_RATIO = 0.5
+_TICK = timedelta(microseconds=1)
+
+
+def parse_day(text):
+    """Date from a start/end field, or None if it is not an ISO date"""
+    try:
+        return date.fromisoformat(text.strip()) if text else None
+    except (TypeError, ValueError):
+        return None
+
+def reminder_from_row(row):
+    """Reminder dict from an (id, user_id, medication_name, time_hour, dose, start_day, end_day) row"""
+    medication_id, user_id, name, time_hour, dose, start_day, end_day = row
+    return {
+        'medication_id': medication_id,
+        'user_id': user_id,
+        'medication_name': name,
+        'time_hour': int(time_hour),
+        'dose': dose,
+        'start': parse_day(start_day),
+        'end': parse_day(end_day),
+    }
+
+def next_dose(reminder, after):
+    """First dose time at or after `after` within the medication's days, or None once it has ended"""
+    day = after.date()
+    if reminder['start'] and reminder['start'] > day:
+        day = reminder['start']
+    due = datetime.combine(day, time(reminder['time_hour']))
+    if due < after:
+        due = datetime.combine(day + timedelta(days=1), time(reminder['time_hour']))
+    if reminder['end'] and due.date() > reminder['end']:
+        return None
+    return due
+
+
+class ReminderScheduler:
+    """Min-heap of (next dose, medication id) over every active medication"""
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}         # medication id -> due time of its live heap entry
+        self._reminders = {}   # medication id -> reminder
+        self._by_user = {}     # user id -> set of medication ids
+        self._stale = 0        # heap entries left behind by deletes
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self):
+        """Build the heap from the medications table on first use"""
+        if self._loaded:
+            return
+        with self._lock:
+            # Writers wait here, so nothing committed during the scan is missed
+            if not self._loaded:
+                self._load(_fetch_schedule())
+
+    def load(self, rows, now=None):
+        """Replace every reminder with those for these medication rows"""
+        with self._lock:
+            self._load(rows, now)
+
+    def _load(self, rows, now=None):
+        now = now or datetime.now()
+        self._heap, self._due, self._reminders, self._by_user, self._stale = [], {}, {}, {}, 0
+        for row in rows:
+            reminder = reminder_from_row(row)
+            due = next_dose(reminder, now - DOSE_WINDOW + _TICK)
+            if due is not None:
+                self._remember(reminder, due)
+                self._heap.append((due, reminder['medication_id']))
+        heapq.heapify(self._heap)
+        self._loaded = True
+
+    def add(self, row, now=None):
+        """Schedule a newly added medication"""
+        reminder = reminder_from_row(row)
+        with self._lock:
+            # Before the first load the scan will find it; during one it may already have
+            if not self._loaded or reminder['medication_id'] in self._reminders:
+                return
+            due = next_dose(reminder, (now or datetime.now()) - DOSE_WINDOW + _TICK)
+            if due is not None:
+                self._remember(reminder, due)
+                heapq.heappush(self._heap, (due, reminder['medication_id']))
+
+    def remove(self, medication_id):
+        with self._lock:
+            self._forget(medication_id)
+            self._maybe_compact()
+
+    def remove_user(self, user_id):
+        """Drop every reminder of a deleted account"""
+        with self._lock:
+            for medication_id in list(self._by_user.get(user_id, ())):
+                self._forget(medication_id)
+            self._maybe_compact()
+
+    def due(self, now=None):
+        """Doses whose hour is under way, across every user, soonest first"""
+        now = now or datetime.now()
+        with self._lock:
+            self._advance(now)
+            return [self._dose(medication_id, due) for due, medication_id in self._window(now + _TICK)]
+
+    def upcoming(self, hours, now=None):
+        """Doses due now or starting within `hours`, across every user, soonest first"""
+        now = now or datetime.now()
+        until = now + timedelta(hours=hours)
+        with self._lock:
+            self._advance(now)
+            doses = []
+            for due, medication_id in self._window(until):
+                doses += self._repeats(medication_id, due, until)
+        return sorted(doses, key=lambda dose: (dose['due'], dose['medication_id']))
+
+    def for_user(self, user_id, hours=24, now=None):
+        """One user's doses due now or starting within `hours`, soonest first"""
+        now = now or datetime.now()
+        until = now + timedelta(hours=hours)
+        with self._lock:
+            self._advance(now)
+            doses = []
+            for medication_id in self._by_user.get(user_id, ()):
+                if self._due[medication_id] < until:
+                    doses += self._repeats(medication_id, self._due[medication_id], until)
+        return sorted(doses, key=lambda dose: (dose['due'], dose['medication_id']))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'reminders': len(self._reminders),
+                'users': len(self._by_user),
+                'heap_entries': len(self._heap),
+                'stale_entries': self._stale,
+            }
+
+    def _remember(self, reminder, due):
+        medication_id = reminder['medication_id']
+        self._reminders[medication_id] = reminder
+        self._due[medication_id] = due
+        self._by_user.setdefault(reminder['user_id'], set()).add(medication_id)
+
+    def _forget(self, medication_id):
+        reminder = self._reminders.pop(medication_id, None)
+        if reminder is None:
+            return
+        del self._due[medication_id]
+        self._stale += 1
+        ids = self._by_user.get(reminder['user_id'])
+        ids.discard(medication_id)
+        if not ids:
+            del self._by_user[reminder['user_id']]
+
+    def _maybe_compact(self):
+        if self._stale > len(self._heap) * COMPACT_RATIO:
+            self._heap = [(due, medication_id) for medication_id, due in self._due.items()]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _advance(self, now):
+        """Move every dose whose hour has passed on to its next day"""
+        while self._heap and self._heap[0][0] + DOSE_WINDOW <= now:
+            due, medication_id = heapq.heappop(self._heap)
+            if self._due.get(medication_id) != due:
+                self._stale -= 1
+                continue
+            following = next_dose(self._reminders[medication_id], now - DOSE_WINDOW + _TICK)
+            if following is None:
+                self._stale -= 1  # _forget counts the entry just popped
+                self._forget(medication_id)
+            else:
+                self._due[medication_id] = following
+                heapq.heappush(self._heap, (following, medication_id))
+
+    def _window(self, until):
+        """Live entries due before `until`, soonest first, found by walking the heap without popping"""
+        found = []
+        frontier = [(self._heap[0], 0)] if self._heap else []
+        while frontier:
+            (due, medication_id), index = heapq.heappop(frontier)
+            if due >= until:
+                continue
+            if self._due.get(medication_id) == due:
+                found.append((due, medication_id))
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(self._heap):
+                    heapq.heappush(frontier, (self._heap[child], child))
+        return found
+
+    def _repeats(self, medication_id, due, until):
+        """A dose and its following days' doses before `until`"""
+        doses = []
+        while due is not None and due < until:
+            doses.append(self._dose(medication_id, due))
+            due = next_dose(self._reminders[medication_id], due + _TICK)
+        return doses
+
+    def _dose(self, medication_id, due):
+        return dict(self._reminders[medication_id], due=due)
+
+
+reminder_scheduler = ReminderScheduler()
+
+
+@metrics.traced
+def upcoming_doses(user_id, hours=24):
+    """The user's doses due now or in the next `hours`, soonest first"""
+    try:
+        reminder_scheduler.ensure_loaded()
+    except Error as e:
+        st.error(f"Error loading medication reminders: {e}")
+        return []
+    return reminder_scheduler.for_user(user_id, hours)
+
+def _fetch_schedule():
+    connection = connect()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+        SELECT id, user_id, medication_name, time_hour, dose, start_day, end_day
+        FROM medications WHERE user_id IS NOT NULL
+        """)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
@@ -0,0 +1,210 @@
+"""Per-user daily, weekly and monthly summaries of every vital metric.
+
+vital_rollups holds one row per (user, bucket, bucket start, metric) with
+the count, min, max, sum and sum of squares of the readings in it, so
+means and standard deviations over any run of buckets come from a few
+hundred rows instead of every raw reading.
+
+Writers call refresh_range() inside their own transaction; it recomputes
+each bucket touching the changed dates from the raw rows, which keeps
+min/max right after edits and deletes. Existing data is summarised with
+
+    python rollups.py --backfill
+"""
+import streamlit as st #type: ignore
+import numpy as np #type: ignore
+import pandas as pd #type: ignore
+
+import argparse
+import time
+from datetime import date, timedelta
+
+from db import connect, Error
+from cache import vitals_cache
+from queries import named_queries
+from vital_series import VITAL_BOUNDS
+import metrics
+
+
+BUCKETS = ('day', 'week', 'month')
+METRIC_COLUMNS = list(VITAL_BOUNDS)
+# Users whose raw rows are loaded at once while recomputing
+USER_BATCH = 200
+
+ROLLUP_INSERT = """
+INSERT INTO vital_rollups (user_id, bucket, bucket_start, metric, n, min_value, max_value, sum_value, sumsq_value)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+def bucket_start(bucket, day):
+    """First day of the bucket holding a date; weeks start on Monday"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+def bucket_end(bucket, day):
+    """Last day of the bucket holding a date"""
+    if bucket == 'week':
+        return bucket_start('week', day) + timedelta(days=6)
+    if bucket == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return day
+
+def aggregate(rows):
+    """Rollup rows for every bucket found in raw (user_id, date_recorded, *METRIC_COLUMNS) rows"""
+    frame = pd.DataFrame(rows, columns=['user_id', 'date_recorded', *METRIC_COLUMNS])
+    if frame.empty:
+        return pd.DataFrame(columns=['user_id', 'bucket', 'bucket_start', 'metric', 'n',
+                                     'min_value', 'max_value', 'sum_value', 'sumsq_value'])
+    long = frame.melt(id_vars=['user_id', 'date_recorded'], value_vars=METRIC_COLUMNS,
+                      var_name='metric', value_name='value')
+    long['value'] = pd.to_numeric(long['value'], errors='coerce')
+    long = long.dropna(subset=['value'])
+    long['square'] = long['value'] ** 2
+    dates = pd.to_datetime(long['date_recorded'])
+
+    starts = {
+        'day': dates,
+        'week': dates - pd.to_timedelta(dates.dt.weekday, unit='D'),
+        'month': dates.dt.to_period('M').dt.start_time,
+    }
+    parts = []
+    for bucket in BUCKETS:
+        grouped = long.assign(bucket_start=starts[bucket]).groupby(['user_id', 'bucket_start', 'metric'])
+        part = grouped.agg(n=('value', 'count'), min_value=('value', 'min'), max_value=('value', 'max'),
+                           sum_value=('value', 'sum'), sumsq_value=('square', 'sum')).reset_index()
+        part.insert(1, 'bucket', bucket)
+        parts.append(part)
+    result = pd.concat(parts, ignore_index=True)
+    result['bucket_start'] = result['bucket_start'].dt.date
+    return result
+
+def refresh_range(cursor, user_ids, first_day, last_day):
+    """Recompute every bucket overlapping [first_day, last_day] for these users; runs in the caller's transaction"""
+    user_ids = sorted({int(u) for u in user_ids})
+    if not user_ids:
+        return
+    # Raw rows must cover whole weeks and months at both ends
+    span_start = min(bucket_start('week', first_day), bucket_start('month', first_day))
+    span_end = max(bucket_end('week', last_day), bucket_end('month', last_day))
+    affected = {bucket: (bucket_start(bucket, first_day), bucket_start(bucket, last_day)) for bucket in BUCKETS}
+
+    for start in range(0, len(user_ids), USER_BATCH):
+        batch = user_ids[start:start + USER_BATCH]
+        placeholders = ', '.join(['%s'] * len(batch))
+        cursor.execute(f"""
+        SELECT user_id, date_recorded, {', '.join(METRIC_COLUMNS)}
+        FROM vital_results
+        WHERE user_id IN ({placeholders}) AND date_recorded BETWEEN %s AND %s
+        """, (*batch, span_start, span_end))
+        summary = aggregate(cursor.fetchall())
+
+        keep = np.zeros(len(summary), dtype=bool)
+        for bucket, (low, high) in affected.items():
+            keep |= ((summary['bucket'] == bucket) & (summary['bucket_start'] >= low) & (summary['bucket_start'] <= high)).to_numpy()
+        summary = summary[keep]
+
+        cursor.execute(f"""
+        DELETE FROM vital_rollups
+        WHERE user_id IN ({placeholders}) AND (
+            (bucket = 'day' AND bucket_start BETWEEN %s AND %s) OR
+            (bucket = 'week' AND bucket_start BETWEEN %s AND %s) OR
+            (bucket = 'month' AND bucket_start BETWEEN %s AND %s))
+        """, (*batch, *affected['day'], *affected['week'], *affected['month']))
+        if len(summary):
+            cursor.executemany(ROLLUP_INSERT, list(zip(
+                summary['user_id'].astype(int).tolist(),
+                summary['bucket'].tolist(),
+                summary['bucket_start'].tolist(),
+                summary['metric'].tolist(),
+                summary['n'].astype(int).tolist(),
+                summary['min_value'].tolist(),
+                summary['max_value'].tolist(),
+                summary['sum_value'].tolist(),
+                summary['sumsq_value'].tolist(),
+            )))
+
+def refresh_spans(cursor, spans):
+    """Recompute each user's buckets over their own {user_id: (first_day, last_day)}; runs in the caller's transaction"""
+    by_span = {}
+    for user_id, span in spans.items():
+        by_span.setdefault(span, []).append(user_id)
+    # Users sent the same dates, as in one device export, share a pass
+    for (first_day, last_day), user_ids in by_span.items():
+        refresh_range(cursor, user_ids, first_day, last_day)
+
+def refresh_dates(cursor, user_id, *days):
+    """Recompute the buckets holding these dates for one user"""
+    days = [d for d in days if d is not None]
+    if days:
+        refresh_range(cursor, [user_id], min(days), max(days))
+
+def backfill(connection, user_ids=None, progress=None):
+    """Rebuild all rollups for these users (everyone by default), committing per batch"""
+    cursor = connection.cursor()
+    try:
+        if user_ids is None:
+            cursor.execute("SELECT id FROM users ORDER BY id")
+            user_ids = [row[0] for row in cursor.fetchall()]
+        done = 0
+        for start in range(0, len(user_ids), USER_BATCH):
+            batch = user_ids[start:start + USER_BATCH]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f"DELETE FROM vital_rollups WHERE user_id IN ({placeholders})", batch)
+            cursor.execute(f"SELECT MIN(date_recorded), MAX(date_recorded) FROM vital_results WHERE user_id IN ({placeholders})", batch)
+            first_day, last_day = cursor.fetchone()
+            if isinstance(first_day, str):  # SQLite drops the DATE type on aggregates
+                first_day, last_day = date.fromisoformat(first_day), date.fromisoformat(last_day)
+            if first_day is not None:
+                refresh_range(cursor, batch, first_day, last_day)
+            connection.commit()
+            done += len(batch)
+            if progress:
+                progress(done, len(user_ids))
+    finally:
+        cursor.close()
+    for user_id in user_ids:
+        vitals_cache.invalidate_user(user_id)
+    return len(user_ids)
+
+
+@metrics.traced
+def get_rollups(user_id, bucket, start_date, end_date=None):
+    """(bucket_start, metric, n, min, max, sum, sumsq) rows for a user, oldest first"""
+    try:
+        return vitals_cache.get_or_load(_fetch_rollups, user_id, bucket, start_date, end_date or date.today())
+    except Error as e:
+        st.error(f"Error fetching vital trends: {e}")
+    return []
+
+def _fetch_rollups(user_id, bucket, start_date, end_date):
+    connection = connect()
+    try:
+        return named_queries.fetchall(connection, 'rollups', (user_id, bucket, bucket_start(bucket, start_date), end_date))
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the vital rollup tables from raw readings")
+    parser.add_argument("--backfill", action="store_true", required=True, help="recompute every user's rollups")
+    parser.add_argument("--user-id", type=int, nargs="+", help="only these users")
+    args = parser.parse_args()
+
+    def show(done, total):
+        print(f"\r  {done:,}/{total:,} users", end="", flush=True)
+
+    connection = connect()
+    try:
+        started = time.perf_counter()
+        users = backfill(connection, args.user_id, show)
+    finally:
+        connection.close()
+    print(f"\nRebuilt rollups for {users:,} users in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
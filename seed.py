@@ -0,0 +1,191 @@
+"""Bulk synthetic data for demos and load testing.
+
+    python seed.py --users 1000 --days 365 --medications 5
+"""
+import numpy as np #type: ignore
+
+import argparse
+import time
+from datetime import date, timedelta
+
+from db import connect
+from queries import VITALS_INSERT
+from passwords import password_engine
+from vital_series import VITAL_BOUNDS
+import rollups
+
+
+# Generated values are clipped to the bounds the diagnosis form accepts
+SYSTOLIC_RANGE = VITAL_BOUNDS['systolic_bp']
+DIASTOLIC_RANGE = VITAL_BOUNDS['diastolic_bp']
+HEART_RATE_RANGE = VITAL_BOUNDS['heart_rate']
+GLUCOSE_RANGE = VITAL_BOUNDS['glucose_level']
+TEMPERATURE_RANGE = VITAL_BOUNDS['temperature']
+WATER_BALANCE_RANGE = VITAL_BOUNDS['water_balance']
+
+# Day-to-day noise of systolic, diastolic, heart rate and glucose around a
+# person's baseline; blood pressure components move together
+NOISE_SD = np.array([8.0, 6.0, 7.0, 12.0])
+NOISE_CORRELATION = np.array([
+    [1.0, 0.7, 0.2, 0.1],
+    [0.7, 1.0, 0.2, 0.1],
+    [0.2, 0.2, 1.0, 0.15],
+    [0.1, 0.1, 0.15, 1.0],
+])
+
+MEDICATION_NAMES = ["Metformin", "Lisinopril", "Atorvastatin", "Amlodipine", "Metoprolol",
+                    "Omeprazole", "Losartan", "Albuterol", "Insulin glargine", "Levothyroxine"]
+MEDICATION_TYPES = ["Tablet", "Capsule", "Liquid", "Injection", "Inhaler"]
+
+def generate_vitals(rng, n_users, days, end_date=None):
+    """Generate one reading per user per day as a dict of (n_users, days) arrays"""
+    end_date = end_date or date.today()
+    dates = np.arange(np.datetime64(end_date - timedelta(days=days - 1)),
+                      np.datetime64(end_date + timedelta(days=1)), dtype='datetime64[D]')
+
+    # Per-person baselines: some people run high, and their pulse and sugar tend to follow
+    baseline_systolic = rng.normal(122, 12, n_users)
+    baseline = np.stack([
+        baseline_systolic,
+        0.55 * baseline_systolic + rng.normal(12, 5, n_users),
+        rng.normal(74, 9, n_users) + 0.1 * (baseline_systolic - 122),
+        rng.normal(100, 15, n_users) + 0.2 * (baseline_systolic - 122),
+    ], axis=-1)
+
+    covariance = NOISE_CORRELATION * np.outer(NOISE_SD, NOISE_SD)
+    noise = rng.multivariate_normal(np.zeros(4), covariance, size=(n_users, days))
+    values = baseline[:, None, :] + noise
+
+    systolic = np.clip(np.rint(values[..., 0]), *SYSTOLIC_RANGE).astype(np.int64)
+    diastolic = np.clip(np.rint(values[..., 1]), *DIASTOLIC_RANGE).astype(np.int64)
+    # Keep a plausible pulse pressure
+    diastolic = np.maximum(np.minimum(diastolic, systolic - 20), DIASTOLIC_RANGE[0])
+    return {
+        'date_recorded': np.broadcast_to(dates, (n_users, days)),
+        'systolic_bp': systolic,
+        'diastolic_bp': diastolic,
+        'heart_rate': np.clip(np.rint(values[..., 2]), *HEART_RATE_RANGE).astype(np.int64),
+        'glucose_level': np.clip(np.rint(values[..., 3]), *GLUCOSE_RANGE).astype(np.int64),
+        'temperature': np.round(np.clip(rng.normal(36.8, 0.3, (n_users, days)), *TEMPERATURE_RANGE), 1),
+        'water_balance': np.clip(rng.poisson(6, (n_users, days)), *WATER_BALANCE_RANGE).astype(np.int64),
+    }
+
+def vital_rows(user_ids, vitals):
+    """Flatten generated vitals into INSERT parameter tuples"""
+    n_users, days = vitals['systolic_bp'].shape
+    systolic = vitals['systolic_bp'].ravel()
+    diastolic = vitals['diastolic_bp'].ravel()
+    blood_status = np.char.add(np.char.add(systolic.astype(str), '/'), diastolic.astype(str))
+    return list(zip(
+        np.repeat(np.asarray(user_ids), days).tolist(),
+        vitals['date_recorded'].ravel().tolist(),
+        systolic.tolist(),
+        diastolic.tolist(),
+        vitals['heart_rate'].ravel().tolist(),
+        vitals['temperature'].ravel().tolist(),
+        vitals['glucose_level'].ravel().tolist(),
+        blood_status.tolist(),
+        vitals['water_balance'].ravel().tolist(),
+    ))
+
+def seed_demo_vitals(cursor, user_id, days=7, rng=None):
+    """Give a new account a week of readings; runs in the caller's transaction"""
+    rng = rng or np.random.default_rng()
+    cursor.executemany(VITALS_INSERT, vital_rows([user_id], generate_vitals(rng, 1, days)))
+    rollups.refresh_range(cursor, [user_id], date.today() - timedelta(days=days - 1), date.today())
+
+def seed_users(connection, rng, count, batch_size):
+    """Insert synthetic users and return their ids"""
+    cursor = connection.cursor()
+    run_tag = f"{int(time.time())}-{rng.integers(1 << 30)}"
+    # Everyone gets the password "password"; one hash shared by the batch keeps seeding fast
+    password = password_engine.hash("password")
+    blood_types = np.array(["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"])
+    ages = rng.integers(18, 95, count).tolist()
+    weights = np.round(rng.normal(78, 15, count).clip(40, 200), 1).tolist()
+    heights = np.round(rng.normal(170, 10, count).clip(140, 210), 1).tolist()
+    blood = blood_types[rng.integers(0, len(blood_types), count)].tolist()
+
+    try:
+        for start in range(0, count, batch_size):
+            rows = [(f"Seed User {i}", f"seed-{run_tag}-{i}@example.com", password,
+                     ages[i], weights[i], heights[i], blood[i], None, None)
+                    for i in range(start, min(start + batch_size, count))]
+            cursor.executemany("""
+            INSERT INTO users (username, email, password, age, weight, height, blood_type, allergies, diseases)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+            connection.commit()
+        cursor.execute("SELECT id FROM users WHERE email LIKE %s ORDER BY id", (f"seed-{run_tag}-%",))
+        user_ids = [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+    return user_ids
+
+def seed_vitals(connection, rng, user_ids, days, batch_size):
+    """Insert `days` daily readings for each user in batched multi-row inserts"""
+    cursor = connection.cursor()
+    users_per_batch = max(1, batch_size // days)
+    inserted = 0
+    try:
+        for start in range(0, len(user_ids), users_per_batch):
+            chunk = user_ids[start:start + users_per_batch]
+            rows = vital_rows(chunk, generate_vitals(rng, len(chunk), days))
+            cursor.executemany(VITALS_INSERT, rows)
+            rollups.refresh_range(cursor, chunk, date.today() - timedelta(days=days - 1), date.today())
+            connection.commit()
+            inserted += len(rows)
+    finally:
+        cursor.close()
+    return inserted
+
+def seed_medications(connection, rng, user_ids, per_user, batch_size):
+    """Insert per_user synthetic medications for each account"""
+    cursor = connection.cursor()
+    owners = np.repeat(np.asarray(user_ids, dtype=np.int64), per_user).tolist()
+    count = len(owners)
+    names = np.array(MEDICATION_NAMES)[rng.integers(0, len(MEDICATION_NAMES), count)].tolist()
+    types = np.array(MEDICATION_TYPES)[rng.integers(0, len(MEDICATION_TYPES), count)].tolist()
+    hours = rng.integers(0, 24, count).tolist()
+    doses = np.round(rng.choice([0.5, 1.0, 2.0, 5.0, 10.0, 20.0], count), 2).tolist()
+    try:
+        for start in range(0, count, batch_size):
+            rows = [(owners[i], names[i], hours[i], doses[i], types[i], None, None, "30 days", "None")
+                    for i in range(start, min(start + batch_size, count))]
+            cursor.executemany("""
+            INSERT INTO medications (user_id, medication_name, time_hour, dose, medication_type, start_day, end_day, duration, comments)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+            connection.commit()
+    finally:
+        cursor.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Populate the database with synthetic users, vitals and medications")
+    parser.add_argument("--users", type=int, default=100, help="accounts to create")
+    parser.add_argument("--days", type=int, default=365, help="daily readings per account")
+    parser.add_argument("--medications", type=int, default=3, help="medications per account")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per multi-row insert and commit")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible data")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    connection = connect()
+    try:
+        started = time.perf_counter()
+        user_ids = seed_users(connection, rng, args.users, args.batch_size)
+        vitals = seed_vitals(connection, rng, user_ids, args.days, args.batch_size)
+        medications = seed_medications(connection, rng, user_ids, args.medications, args.batch_size)
+        elapsed = time.perf_counter() - started
+    finally:
+        connection.close()
+
+    total = len(user_ids) + vitals + medications
+    print(f"Inserted {len(user_ids)} users, {vitals} vital readings and {medications} medications "
+          f"in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
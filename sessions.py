@@ -0,0 +1,248 @@
+"""Server-side sessions that survive browser refreshes, reconnects and restarts.
+
+A logged-in browser keeps a signed token in a SameSite cookie, set from the
+page since Streamlit has no response to put a Set-Cookie header on. When a
+fresh Streamlit session arrives with a valid token, the login and
+navigation state saved under it is put back into st.session_state, and
+the profile and latest vitals it last showed are put back into the query
+cache where it has nothing newer, so the page renders without a login or a
+refetch. A write to the user's data since the save voids that snapshot.
+Changing the password or deleting the account ends the user's other sessions.
+
+Records live in an in-memory LRU. Set VITAL_SESSION_SPILL to a file path
+to also keep them in SQLite, which holds what the LRU evicts and what a
+restart would lose. That file holds session data and, unless
+VITAL_SESSION_SECRET is set, the signing key; keep it as private as the
+database.
+"""
+import streamlit as st #type: ignore
+
+import hashlib
+import hmac
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from cache import vitals_cache
+
+
+SESSION_MAX_ENTRIES = int(os.environ.get('VITAL_SESSION_MAX_ENTRIES', '10000'))
+# Sessions unused for this long must log in again
+SESSION_TTL = float(os.environ.get('VITAL_SESSION_TTL', str(12 * 3600)))
+SESSION_SPILL = os.environ.get('VITAL_SESSION_SPILL')
+SESSION_SECRET = os.environ.get('VITAL_SESSION_SECRET')
+
+COOKIE_NAME = 'vital_sid'
+# Session state worth restoring; per-browser things like style_bundle are not
+PERSISTED_KEYS = ('logged_in', 'user_id', 'username', 'dashboard_page', 'heart_tab')
+
+
+class SessionStore:
+    """LRU of session records with idle expiry and an optional SQLite spill file"""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL, spill_path=SESSION_SPILL, secret=SESSION_SECRET):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # session id -> (last_seen, record)
+        self._lock = threading.Lock()
+        self._spill = None
+        if spill_path:
+            self._spill = sqlite3.connect(spill_path, check_same_thread=False)
+            self._spill.execute("PRAGMA journal_mode=WAL")
+            self._spill.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, record BLOB NOT NULL, last_seen REAL NOT NULL, user_id INTEGER)")
+            columns = [row[1] for row in self._spill.execute("PRAGMA table_info(sessions)")]
+            if 'user_id' not in columns:
+                # A file from before sessions were revocable: index the records it holds
+                self._spill.execute("ALTER TABLE sessions ADD COLUMN user_id INTEGER")
+                for session_id, record in self._spill.execute("SELECT id, record FROM sessions").fetchall():
+                    self._spill.execute("UPDATE sessions SET user_id = ? WHERE id = ?",
+                                        (pickle.loads(record)['state'].get('user_id'), session_id))
+            self._spill.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)")
+            self._spill.execute("CREATE TABLE IF NOT EXISTS session_meta (name TEXT PRIMARY KEY, value BLOB NOT NULL)")
+            self._spill.commit()
+        self._secret = secret.encode() if secret else self._load_secret()
+
+    def _load_secret(self):
+        """Random signing key, kept in the spill file so tokens outlive a restart"""
+        if not self._spill:
+            return secrets.token_bytes(32)
+        with self._lock:
+            self._spill.execute("INSERT OR IGNORE INTO session_meta (name, value) VALUES ('secret', ?)",
+                                (secrets.token_bytes(32),))
+            self._spill.commit()
+            return self._spill.execute("SELECT value FROM session_meta WHERE name = 'secret'").fetchone()[0]
+
+    def sign(self, session_id):
+        signature = hmac.new(self._secret, session_id.encode(), hashlib.sha256).hexdigest()[:32]
+        return f"{session_id}.{signature}"
+
+    def unsign(self, token):
+        """Session id from a token, or None if the signature does not match"""
+        session_id, _, signature = (token or '').partition('.')
+        if session_id and hmac.compare_digest(self.sign(session_id), token):
+            return session_id
+        return None
+
+    def new_token(self):
+        return self.sign(secrets.token_urlsafe(18))
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None and self._spill:
+                row = self._spill.execute("SELECT last_seen, record FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                if row:
+                    entry = (row[0], pickle.loads(row[1]))
+            if entry is None:
+                return None
+            if entry[0] < now - self.ttl:
+                self._delete(session_id)
+                return None
+            self._remember(session_id, (now, entry[1]))
+            return entry[1]
+
+    def put(self, session_id, record):
+        now = time.time()
+        with self._lock:
+            self._remember(session_id, (now, record))
+            if self._spill:
+                self._spill.execute("INSERT OR REPLACE INTO sessions (id, record, last_seen, user_id) VALUES (?, ?, ?, ?)",
+                                    (session_id, pickle.dumps(record), now, record['state'].get('user_id')))
+                self._spill.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.ttl,))
+                self._spill.commit()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._delete(session_id)
+
+    def delete_user(self, user_id, keep=None):
+        """Drop every session of a user except keep; returns how many went"""
+        with self._lock:
+            doomed = [session_id for session_id, (_, record) in self._entries.items()
+                      if record['state'].get('user_id') == user_id and session_id != keep]
+            for session_id in doomed:
+                del self._entries[session_id]
+            if self._spill:
+                # The spill file also holds sessions the LRU has evicted
+                deleted = self._spill.execute("DELETE FROM sessions WHERE user_id = ? AND id IS NOT ?", (user_id, keep)).rowcount
+                self._spill.commit()
+                return deleted
+        return len(doomed)
+
+    def _remember(self, session_id, entry):
+        self._entries[session_id] = entry
+        self._entries.move_to_end(session_id)
+        # The spill file already holds everything evicted here
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _delete(self, session_id):
+        self._entries.pop(session_id, None)
+        if self._spill:
+            self._spill.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._spill.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = {'entries': len(self._entries)}
+            if self._spill:
+                stats['spilled'] = self._spill.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return stats
+
+
+session_store = SessionStore()
+
+
+def _warm_queries(user_id):
+    """Cached reads the first page after a restore needs: (loader, args) pairs"""
+    import dashboard
+    return {
+        'profile': (dashboard._fetch_user_profile, (user_id,)),
+        'latest_vitals': (dashboard._fetch_latest_vital_results, (user_id,)),
+    }
+
+def _cookie_token():
+    token = st.context.cookies.get(COOKIE_NAME)
+    # Under AppTest there is no browser, and the stand-in client answers with mocks
+    return token if isinstance(token, str) else None
+
+def _write_cookie(token, max_age):
+    """Set the browser's session cookie; max_age 0 removes it"""
+    st.html(f"""
+    <script>
+    document.cookie = '{COOKIE_NAME}={token}; Path=/; Max-Age={max_age}; SameSite=Strict'
+        + (location.protocol === 'https:' ? '; Secure' : '');
+    </script>
+    """, unsafe_allow_javascript=True)
+
+def revoke_user(user_id, keep_current=False):
+    """End the user's saved sessions, e.g. after a password change; keep_current spares this browser's"""
+    keep = st.session_state.get('session_id') if keep_current else None
+    return session_store.delete_user(user_id, keep=keep)
+
+def restore():
+    """Bring back a saved session in a fresh browser session; True if one was restored"""
+    if 'session_id' in st.session_state:
+        return False
+    st.session_state.session_id = None
+
+    token = _cookie_token()
+    session_id = session_store.unsign(token)
+    record = session_store.get(session_id) if session_id else None
+    if not record:
+        if token:
+            _write_cookie('', 0)
+        return False
+
+    st.session_state.session_id = session_id
+    st.session_state.session_saved = record
+    for key, value in record['state'].items():
+        st.session_state[key] = value
+    # Only while the snapshot is as fresh as the cache would keep it anyway, and
+    # never over what this process has loaded since or after a write to the user
+    if record.get('version') and time.time() - record['saved_at'] < vitals_cache.ttl:
+        for name, (loader, args) in _warm_queries(record['state']['user_id']).items():
+            if record['warm'].get(name) is not None:
+                vitals_cache.prime(loader, record['warm'][name], *args, version=record.get('version'))
+    return True
+
+def save():
+    """Record the session's state at the end of a run; writes only when it changed"""
+    if not st.session_state.get('logged_in'):
+        return
+    state = {key: st.session_state[key] for key in PERSISTED_KEYS if key in st.session_state}
+    # Taken before the reads, so a write between the two makes the snapshot unusable rather than stale
+    version = vitals_cache.version(state['user_id'])
+    warm = {name: vitals_cache.peek(loader, *args) for name, (loader, args) in _warm_queries(state['user_id']).items()}
+
+    session_id = st.session_state.get('session_id')
+    saved = st.session_state.get('session_saved')
+    if session_id and saved and saved['state'] == state and saved['warm'] == warm and saved.get('version') == version:
+        return
+
+    if session_id and session_store.get(session_id) is None:
+        # Revoked from another browser, or idle past the TTL: log this one out too
+        end()
+        for key in list(st.session_state.keys()):
+            del st.session_state[key]
+        st.rerun()
+    if not session_id:
+        session_id = session_store.unsign(session_store.new_token())
+        st.session_state.session_id = session_id
+    record = {'state': state, 'warm': warm, 'version': version, 'saved_at': time.time()}
+    session_store.put(session_id, record)
+    st.session_state.session_saved = record
+    # Renewed with each save, so the cookie lasts about as long as the server keeps the session
+    _write_cookie(session_store.sign(session_id), int(session_store.ttl))
+
+def end():
+    """Forget the server-side session; call on logout"""
+    session_id = st.session_state.get('session_id')
+    if session_id:
+        session_store.delete(session_id)
+        _write_cookie('', 0)
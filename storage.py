@@ -0,0 +1,196 @@
+"""Storage backends: MySQL over the network, or an embedded SQLite file in WAL mode.
+
+Both hand out connections with the mysql.connector surface the data
+functions use: cursor(dictionary=...), %s placeholders, commit/rollback,
+in_transaction and ping().
+"""
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime
+
+try:
+    import mysql.connector #type: ignore
+except ImportError:  # SQLite-only deployments do not need the MySQL driver
+    mysql = None
+
+
+class DatabaseError(Exception):
+    """Raised by the data layer itself (pool exhaustion, migration locking)"""
+
+
+# Every error a data function may need to catch, whichever backend is active
+DRIVER_ERRORS = (DatabaseError, sqlite3.Error) + ((mysql.connector.Error,) if mysql else ())
+
+
+class MySQLBackend:
+    name = 'mysql'
+    # MySQL commits implicitly around DDL, so migrations commit one at a time
+    transactional_ddl = False
+
+    def __init__(self, config):
+        if mysql is None:
+            raise DatabaseError("The mysql backend needs mysql-connector-python installed")
+        self.config = config
+
+    def connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def upsert(self, table, columns, keys):
+        """INSERT that overwrites the other columns of the row already holding its unique key"""
+        # ON DUPLICATE KEY matches any unique key, so `keys` only picks the columns left alone.
+        # The row alias (MySQL 8.0.19+) replaces VALUES(column), deprecated since 8.0.20.
+        updates = ', '.join(f"{column} = new.{column}" for column in columns if column not in keys)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) AS new "
+                f"ON DUPLICATE KEY UPDATE {updates}")
+
+    @contextmanager
+    def migration_lock(self, connection, name, timeout):
+        """Serialize migration runners across processes with a named server lock"""
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, %s)", (name, timeout))
+            if cursor.fetchone()[0] != 1:
+                raise DatabaseError("Timed out waiting for another process to finish migrating")
+            try:
+                yield
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+                cursor.fetchone()
+        finally:
+            cursor.close()
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    # The whole migration run is one transaction, held under BEGIN IMMEDIATE
+    transactional_ddl = True
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+
+    def connect(self):
+        return SQLiteConnection(self.path, self.timeout)
+
+    def upsert(self, table, columns, keys):
+        """INSERT that overwrites the other columns of the row already holding its unique key"""
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column not in keys)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}")
+
+    @contextmanager
+    def migration_lock(self, connection, name, timeout):
+        """Take the database write lock; the runner's final commit releases it"""
+        connection.begin_immediate()
+        try:
+            yield
+        except BaseException:
+            connection.rollback()
+            raise
+
+
+def _adapt_date(value):
+    return value.isoformat()
+
+def _adapt_datetime(value):
+    return value.isoformat(' ')
+
+def _convert_date(value):
+    return date.fromisoformat(value.decode())
+
+def _convert_timestamp(value):
+    return datetime.fromisoformat(value.decode())
+
+# Explicit (the sqlite3 defaults are deprecated): DATE columns come back as
+# datetime.date and TIMESTAMP columns as datetime, as they do from MySQL
+sqlite3.register_adapter(date, _adapt_date)
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter('DATE', _convert_date)
+sqlite3.register_converter('TIMESTAMP', _convert_timestamp)
+
+
+def _qmark(operation):
+    """Rewrite mysql.connector's %s placeholders (and %% escapes) for sqlite3"""
+    return operation.replace('%%', '\0').replace('%s', '?').replace('\0', '%')
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        if dictionary:
+            cursor.row_factory = _dict_row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, operation, params=None):
+        self._cursor.execute(_qmark(operation), params or ())
+
+    def executemany(self, operation, seq_params):
+        self._cursor.executemany(_qmark(operation), seq_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path, timeout):
+        # Pooled connections move between script threads, one at a time
+        self._connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False,
+                                           detect_types=sqlite3.PARSE_DECLTYPES)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._connection.cursor(), dictionary=dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def begin_immediate(self):
+        self._connection.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def ping(self, reconnect=False):
+        self._connection.execute("SELECT 1").fetchone()
+
+    def is_connected(self):
+        try:
+            self.ping()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._connection.close()
+
+
+def create_backend(name, mysql_config, sqlite_path):
+    """Build the backend selected by configuration"""
+    if name == 'mysql':
+        return MySQLBackend(mysql_config)
+    if name == 'sqlite':
+        return SQLiteBackend(sqlite_path)
+    raise DatabaseError(f"Unknown database backend {name!r}; expected 'mysql' or 'sqlite'")
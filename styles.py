@@ -0,0 +1,94 @@
+import streamlit as st #type: ignore
+
+import hashlib
+import json
+import os
+import re
+
+
+STYLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'styles')
+
+# Page -> stylesheets, in cascade order. Each bundle styles its page completely.
+BUNDLE_SHEETS = {
+    'login': ['login.css'],
+    'dashboard': ['dashboard.css'],
+    'heart': ['dashboard.css', 'heart.css'],
+    'medications': ['dashboard.css', 'medications.css'],
+}
+
+
+def minify(css):
+    """Strip comments and whitespace that CSS does not need"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    # Only drop spaces *after* colons: a space before one is a descendant selector
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+def split_rules(css):
+    """Split minified CSS into top-level rules (an @media block counts as one)"""
+    rules, depth, start = [], 0, 0
+    for i, char in enumerate(css):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                rules.append(css[start:i + 1])
+                start = i + 1
+    return rules
+
+def build_bundle(sheets):
+    """Merge and minify stylesheets, dropping rules repeated verbatim later on"""
+    css = []
+    for sheet in sheets:
+        with open(os.path.join(STYLES_DIR, sheet), encoding='utf-8') as f:
+            css.append(f.read())
+    rules = split_rules(minify('\n'.join(css)))
+
+    # An identical later copy wins the cascade anyway, so keep only the last one
+    seen, kept = set(), []
+    for rule in reversed(rules):
+        if rule not in seen:
+            seen.add(rule)
+            kept.append(rule)
+    bundle = ''.join(reversed(kept))
+    return bundle, hashlib.sha256(bundle.encode()).hexdigest()[:12]
+
+
+# Built once per process
+BUNDLES = {name: build_bundle(sheets) for name, sheets in BUNDLE_SHEETS.items()}
+
+
+def inject(name):
+    """Install a page's style bundle unless this session already has it.
+
+    The bundle goes into a <style> element in the page <head>, which outlives
+    reruns, so it is only sent again after a page change or a new session.
+    """
+    css, digest = BUNDLES[name]
+    if st.session_state.get('style_bundle') == digest:
+        return
+
+    # '</' must not appear inside the inline script
+    payload = json.dumps(css).replace('</', '<\\/')
+    # st.html runs the script in the app's own document, where every run shares
+    # one global scope, so it keeps its names inside a block
+    st.html(f"""
+    <script>
+    {{
+        let style = document.getElementById('vital-style-bundle');
+        if (!style) {{
+            style = document.createElement('style');
+            style.id = 'vital-style-bundle';
+            document.head.appendChild(style);
+        }}
+        if (style.dataset.hash !== '{digest}') {{
+            style.textContent = {payload};
+            style.dataset.hash = '{digest}';
+        }}
+    }}
+    </script>
+    """, unsafe_allow_javascript=True)
+    st.session_state.style_bundle = digest
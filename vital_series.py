@@ -0,0 +1,193 @@
+import streamlit as st #type: ignore
+import numpy as np #type: ignore
+
+from datetime import date
+
+from db import connect, Error
+from cache import vitals_cache
+from queries import named_queries
+import metrics
+
+
+# Metric name -> vital_results column
+METRICS = {
+    'systolic': 'systolic_bp',
+    'diastolic': 'diastolic_bp',
+    'heart_rate': 'heart_rate',
+    'glucose': 'glucose_level',
+    'temperature': 'temperature',
+    'water_balance': 'water_balance',
+}
+
+# vital_results column -> (min, max) accepted; the diagnosis form, seeding and imports share these
+VITAL_BOUNDS = {
+    'systolic_bp': (80, 200),
+    'diastolic_bp': (40, 120),
+    'heart_rate': (40, 200),
+    'glucose_level': (50, 300),
+    'temperature': (30.0, 45.0),
+    'water_balance': (1, 50),
+}
+
+
+class VitalSeries:
+    """A user's vital readings as contiguous NumPy columns, oldest first.
+
+    Dates are datetime64[D]; every metric is float64 with NaN for missing
+    values, so statistics skip gaps instead of failing on them.
+    """
+
+    def __init__(self, dates, **metrics):
+        self.dates = np.ascontiguousarray(dates, dtype='datetime64[D]')
+        for name in METRICS:
+            values = metrics.get(name)
+            if values is None:
+                values = np.full(len(self.dates), np.nan)
+            setattr(self, name, np.ascontiguousarray(values, dtype=np.float64))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (date_recorded, <METRICS columns in order>) tuples sorted by date"""
+        if not rows:
+            return cls(np.empty(0, dtype='datetime64[D]'))
+        columns = list(zip(*rows))
+        # np.array maps None to NaN and Decimal to float for float64
+        metrics = {name: np.array(values, dtype=np.float64)
+                   for name, values in zip(METRICS, columns[1:])}
+        return cls(np.array(columns[0], dtype='datetime64[D]'), **metrics)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def column(self, metric):
+        """Get the values array for one metric"""
+        if metric not in METRICS:
+            raise KeyError(f"Unknown metric {metric!r}; expected one of {', '.join(METRICS)}")
+        return getattr(self, metric)
+
+    def rolling_mean(self, metric, window):
+        """Trailing mean over `window` readings; NaN until the window fills or if it holds no values"""
+        values = self.column(metric)
+        result = np.full(len(values), np.nan)
+        if window < 1 or len(values) < window:
+            return result
+        present = ~np.isnan(values)
+        sums = np.cumsum(np.where(present, values, 0.0))
+        counts = np.cumsum(present)
+        window_sums = sums[window - 1:] - np.concatenate(([0.0], sums[:-window]))
+        window_counts = counts[window - 1:] - np.concatenate(([0], counts[:-window]))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[window - 1:] = np.where(window_counts > 0, window_sums / window_counts, np.nan)
+        return result
+
+    def min(self, metric):
+        values = self._present(metric)
+        return float(values.min()) if len(values) else float('nan')
+
+    def max(self, metric):
+        values = self._present(metric)
+        return float(values.max()) if len(values) else float('nan')
+
+    def mean(self, metric):
+        values = self._present(metric)
+        return float(values.mean()) if len(values) else float('nan')
+
+    def percentile(self, metric, q):
+        """Percentile(s) of a metric; q is a number or sequence in [0, 100]"""
+        values = self._present(metric)
+        if not len(values):
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else float('nan')
+        return np.percentile(values, q)
+
+    def daily_means(self, metric):
+        """Mean per recorded day as (days, means)"""
+        values = self.column(metric)
+        days, inverse = np.unique(self.dates, return_inverse=True)
+        present = ~np.isnan(values)
+        sums = np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=len(days))
+        counts = np.bincount(inverse, weights=present, minlength=len(days))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, sums / counts, np.nan)
+        return days, means
+
+    def day_over_day_deltas(self, metric):
+        """Change in the daily mean between consecutive recorded days as (days, deltas, gap_days)"""
+        days, means = self.daily_means(metric)
+        if len(days) < 2:
+            return days[:0], np.empty(0), np.empty(0, dtype=np.int64)
+        return days[1:], np.diff(means), np.diff(days).astype(np.int64)
+
+    def summary(self):
+        """Count, mean, min, max and median per metric"""
+        stats = {}
+        for metric in METRICS:
+            values = self._present(metric)
+            stats[metric] = {
+                'count': int(len(values)),
+                'mean': float(values.mean()) if len(values) else None,
+                'min': float(values.min()) if len(values) else None,
+                'max': float(values.max()) if len(values) else None,
+                'median': float(np.median(values)) if len(values) else None,
+            }
+        return stats
+
+    def _present(self, metric):
+        values = self.column(metric)
+        return values[~np.isnan(values)]
+
+
+def lttb(x, y, threshold):
+    """Indices of at most `threshold` points that keep a line's shape (Largest-Triangle-Three-Buckets).
+
+    x must be ascending and y free of NaN. The first and last points are
+    always kept; every bucket in between keeps the point forming the
+    largest triangle with the previous pick and the next bucket's average.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets share the points between the first and last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[stop:edges[i + 2]].mean(), y[stop:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs((x[a] - next_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (next_y - y[a]))
+        a = start + int(areas.argmax())
+        picked[i + 1] = a
+    return picked
+
+def downsample(dates, values, threshold):
+    """(dates, values) with gaps dropped, reduced to at most `threshold` points by lttb"""
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    dates, values = dates[present], values[present]
+    keep = lttb(dates.astype(np.int64), values, threshold)
+    return dates[keep], values[keep]
+
+
+@metrics.traced
+def load_vital_series(user_id, start_date, end_date=None):
+    """Load a user's readings between two dates into a VitalSeries"""
+    try:
+        return vitals_cache.get_or_load(_fetch_vital_series, user_id, start_date, end_date or date.today())
+    except Error as e:
+        st.error(f"Error loading vital series: {e}")
+    return VitalSeries.from_rows([])
+
+def _fetch_vital_series(user_id, start_date, end_date):
+    connection = connect()
+    try:
+        # Selects date_recorded then the METRICS columns, in order
+        return VitalSeries.from_rows(named_queries.fetchall(connection, 'vital_series', (user_id, start_date, end_date)))
+    finally:
+        connection.close()